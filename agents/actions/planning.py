@@ -1,124 +1,221 @@
 from langchain.schema.messages import SystemMessage, AIMessage
 from rich.console import Console
 from agents.actions.playwright_execution import PlaywrightAgent
-from agents.utils.initializer import get_llm
+from agents.utils.budget import RunBudget
+from agents.utils.element_index import DEFAULT_TOP_K, ElementIndex
+from agents.utils.initializer import get_dotenv_value, get_router
+from agents.utils.log import Timer, get_logger, payload
 from agents.utils.models import AgentState, EmailDetails, PlannerDecision, DecisionAction
 from agents.utils.prompts import planner_prompt
+from agents.utils.speculation import Speculator, inputs_fingerprint
+from typing import Optional
 import json
-import traceback
 
 console = Console()
-llm = get_llm()
+logger = get_logger("planner")
+router = get_router()
+PLANNER_TOP_K = int(get_dotenv_value("EMAILBOT_PLANNER_TOP_K") or DEFAULT_TOP_K)
 
-async def generate_planner_decision(state: AgentState, playwright_agent: PlaywrightAgent) -> AgentState:
+DELIVERY_INSTRUCTIONS = {
+    "send": "send the email (click Send with expect sent_toast).",
+    "draft": "prepare a draft only. Fill recipient, subject, body and attachments but NEVER click Send; "
+             "use 'finalize' once every field is filled. The draft is saved and sent later.",
+}
+
+PAGE_LOAD_QUESTION = "The email client page failed to load. Please ensure you're logged in and try again."
+
+def _page_load_failure(error_message: str) -> dict:
+    return {
+        "error_message": error_message,
+        "status": "error",
+        "question_to_ask": PAGE_LOAD_QUESTION,
+        "need_user_input": True,
+    }
+
+def _budget_abort(diagnosis: str) -> dict:
+    return {
+        "error_message": diagnosis,
+        "result": diagnosis,
+        "status": "error",
+        "done": True,
+    }
+
+async def _escalate(reason: str, budget: RunBudget, playwright_agent: PlaywrightAgent) -> dict:
+    """Apply the next escalation for a tripped loop detector: switch model, refresh the page, then abort"""
+    action = budget.escalate()
+    console.print(f"[bold yellow]⚠️ Run budget: {reason}; escalating ({action})[/bold yellow]")
+    if action == "abort":
+        return _budget_abort(budget.diagnosis(reason))
+    updates = {"messages": [AIMessage(content=f"Budget warning: {reason}. Escalated with {action}; try a different approach.")]}
+    if action == "refresh":
+        try:
+            await playwright_agent.executor.refresh()
+            updates["dom_ref"] = playwright_agent.dom_store.put(await playwright_agent.executor.get_dom())
+        except Exception as e:
+            # A page that cannot even be reloaded will not recover on the next step either
+            logger.warning("Refresh escalation failed: %s", e)
+            return _budget_abort(budget.diagnosis(f"{reason}; page refresh failed ({e})"))
+    return updates
+
+def _page_for_prompt(current_dom: str, email_details: EmailDetails, state: AgentState) -> str:
+    """Page summary plus the most relevant elements; the raw snapshot if it cannot be indexed"""
+    index = ElementIndex.from_snapshot(current_dom)
+    if index is None:
+        return current_dom
+    executed = state.get("executed_steps") or []
+    attachments_pending = bool(state.get("attachment_handles")) and not any(
+        step.get("type") == "upload" for step in executed
+    )
+    return index.render(email_details, executed[-1] if executed else None, attachments_pending, PLANNER_TOP_K)
+
+def _planner_messages(state: AgentState, current_dom: str, extra_messages=()) -> list:
+    """Everything the planner LLM is sent: the formatted prompt plus the conversation so far"""
+    email_details = state.get("email_details")
+
+    # Convert email_details to EmailDetails object if it's a dict, handle None case
+    if isinstance(email_details, dict):
+        email_details = EmailDetails(**email_details)
+    elif email_details is None:
+        email_details = EmailDetails()
+
+    objective_json = email_details.model_dump_json() if email_details else "{}"
+
+    # Convert previous_steps to a string
+    previous_steps = state.get("current_plan") or []
+    previous_steps_str = json.dumps(previous_steps) if previous_steps else "[]"
+
+    handles = state.get("attachment_handles") or []
+    attachments_str = ", ".join(h.name for h in handles) or "none"
+
+    page_str = _page_for_prompt(current_dom, email_details, state)
+
+    logger.debug("objective: %s", payload(objective_json, "objective"))
+    logger.debug("current_dom: %s (%d of %d chars)", payload(page_str, "page"), len(page_str), len(current_dom))
+    logger.debug("previous_steps: %s", payload(previous_steps_str, "steps"))
+
+    # Format the prompt
+    prompt_content = planner_prompt.format(
+        objective=objective_json,
+        attachments=attachments_str,
+        current_dom=page_str,
+        previous_steps=previous_steps_str,
+        delivery=DELIVERY_INSTRUCTIONS[state.get("delivery") or "send"],
+    )
+    return [SystemMessage(content=prompt_content)] + list(state["messages"]) + list(extra_messages)
+
+def speculative_planner_call(state: AgentState, playwright_agent: PlaywrightAgent, budget: RunBudget):
+    """(inputs fingerprint, planner call) for a predicted state, for the Speculator; None without a snapshot"""
+    current_dom = playwright_agent.dom_store.get(state["dom_ref"])
+    if current_dom is None or budget.check()[0]:
+        return None
+    route = budget.planner_route
+    messages = _planner_messages(state, current_dom)
+    return inputs_fingerprint(route, messages), router.ainvoke_structured(route, PlannerDecision, messages)
+
+async def generate_planner_decision(
+    state: AgentState, playwright_agent: PlaywrightAgent, budget: RunBudget, speculator: Optional[Speculator] = None
+) -> dict:
     """Planner: Generate next step based on objective and current state."""
     if state["exit_requested"] or not state["ready_for_planner"]:
-        return state
-    
+        return {}
+
     # Ensure Playwright is initialized
     if not playwright_agent.initialized:
         try:
             if not await playwright_agent.initialize():
-                console.print("[bold red]❌ Failed to initialize PlaywrightAgent[/bold red]")
-                state["error_message"] = "Failed to initialize PlaywrightAgent"
-                state["status"] = "error"
-                state["question_to_ask"] = "The email client page failed to load. Please ensure you're logged in and try again."
-                state["need_user_input"] = True
-                return state
+                logger.error("Failed to initialize PlaywrightAgent")
+                return _page_load_failure("Failed to initialize PlaywrightAgent")
         except Exception as e:
-            console.print(f"[bold red]❌ Playwright initialization error: {e}[/bold red]")
-            state["error_message"] = f"Playwright initialization error: {str(e)}"
-            state["status"] = "error"
-            state["question_to_ask"] = "The email client page failed to load. Please ensure you're logged in and try again."
-            state["need_user_input"] = True
-            return state
+            logger.error("Playwright initialization error: %s", e)
+            return _page_load_failure(f"Playwright initialization error: {str(e)}")
+
+    updates = {}
 
     # Ensure we have a DOM snapshot
-    if not state["current_dom"]:
+    current_dom = playwright_agent.dom_store.get(state["dom_ref"])
+    if current_dom is None:
         try:
-            state["current_dom"] = await playwright_agent.executor.get_dom()
-            if state["current_dom"].startswith("Error:"):
-                console.print(f"[bold red]❌ DOM fetch error: {state['current_dom']}[/bold red]")
-                state["error_message"] = state["current_dom"]
-                state["status"] = "error"
-                state["question_to_ask"] = "The email client page failed to load. Please ensure you're logged in and try again."
-                state["need_user_input"] = True
-                return state
+            current_dom = await playwright_agent.executor.get_dom()
+            if current_dom.startswith(("Error:", "DOM capture failed")):
+                logger.error("DOM fetch error: %s", current_dom)
+                return _page_load_failure(current_dom)
+            updates["dom_ref"] = playwright_agent.dom_store.put(current_dom)
         except Exception as e:
-            console.print(f"[bold red]❌ Failed to fetch DOM snapshot: {e}[/bold red]")
-            state["error_message"] = f"Failed to fetch DOM snapshot: {str(e)}"
-            state["status"] = "error"
-            state["question_to_ask"] = "The email client page failed to load. Please ensure you're logged in and try again."
-            state["need_user_input"] = True
-            return state
+            logger.error("Failed to fetch DOM snapshot: %s", e)
+            return _page_load_failure(f"Failed to fetch DOM snapshot: {str(e)}")
+
+    # Stop spinning before spending another LLM call
+    budget.start()
+    reason, hard = budget.check()
+    if reason:
+        if hard:
+            console.print(f"[bold red]❌ Run budget: {reason}[/bold red]")
+            return {**updates, **_budget_abort(budget.diagnosis(reason))}
+        escalation = await _escalate(reason, budget, playwright_agent)
+        if escalation.get("done"):
+            return {**updates, **escalation}
+        updates.update(escalation)
+        current_dom = playwright_agent.dom_store.get(updates.get("dom_ref", state["dom_ref"])) or current_dom
 
-    console.print(f"🧠 Planning with current DOM: {state['current_dom'][:100] if state['current_dom'] else 'None'}...", style="bold magenta")
+    logger.info("Planning with current DOM %s", payload(current_dom, "dom"))
 
     try:
-        planner_structured_llm = llm.with_structured_output(PlannerDecision)
-        email_details = state.get("email_details")
-
-        # Convert email_details to EmailDetails object if it's a dict, handle None case
-        if isinstance(email_details, dict):
-            email_details = EmailDetails(**email_details)
-        elif email_details is None:
-            email_details = EmailDetails()
-
-        objective_json = email_details.model_dump_json() if email_details else "{}"
-        
-        # Convert previous_steps to a string
-        previous_steps = state.get("current_plan", []) or []
-        previous_steps_str = json.dumps(previous_steps) if previous_steps else "[]"
-
-        # Debug: Log prompt inputs
-        console.print(f"[debug] objective: {objective_json[:100]}...")
-        console.print(f"[debug] current_dom: {state['current_dom'][:100]}...")
-        console.print(f"[debug] previous_steps: {previous_steps_str[:100]}...")
-
-        # Format the prompt
-        prompt_content = planner_prompt.format(
-            objective=objective_json,
-            current_dom=state["current_dom"],
-            previous_steps=previous_steps_str
-        )
+        route = budget.planner_route
+        planner_messages = _planner_messages(state, current_dom, updates.get("messages", []))
+
+        timer = Timer()
+        decision = await speculator.take(inputs_fingerprint(route, planner_messages)) if speculator else None
+        speculated = decision is not None
+        if decision is None:
+            decision = await router.ainvoke_structured(route, PlannerDecision, planner_messages)
+        budget.record_planner_call()
 
-        decision = planner_structured_llm.invoke([
-            SystemMessage(content=prompt_content)
-        ] + state["messages"])
-        
         console.print(f"📝 Planner Decision: {decision.action} - {decision.message}", style="bold magenta")
-        
-        state["messages"].append(AIMessage(content=decision.message))
-        
+        logger.debug(
+            "Planner decision %s in %.0f ms", decision.action.value, timer.ms,
+            extra={"fields": {
+                "action": decision.action.value, "ms": timer.ms, "route": route,
+                "prompt_chars": len(planner_messages[0].content), "speculated": speculated,
+            }},
+        )
+
+        updates["messages"] = updates.get("messages", []) + [AIMessage(content=decision.message)]
+
+        if decision.action == DecisionAction.PROCEED and decision.instruction:
+            repeat = budget.record_action(updates.get("dom_ref", state["dom_ref"]), decision.instruction.model_dump())
+            if repeat:
+                # Don't execute the repeated action; escalate and plan again
+                escalation = await _escalate(repeat, budget, playwright_agent)
+                escalation["messages"] = updates["messages"] + escalation.get("messages", [])
+                return {**updates, **escalation, "status": escalation.get("status", "planning")}
+
         if decision.action == DecisionAction.PROCEED:
-            state["current_instruction"] = decision.instruction.dict() if decision.instruction else None
-            state["status"] = "executing"
+            updates["current_instruction"] = decision.instruction.model_dump() if decision.instruction else None
+            updates["status"] = "executing"
             if decision.instruction:
-                state["current_plan"] = state["current_plan"] or []
-                state["current_plan"].append(decision.instruction.json())
+                updates["current_plan"] = [decision.instruction.model_dump_json()]
         elif decision.action == DecisionAction.ASK_USER:
-            state["question_to_ask"] = decision.message
-            state["need_user_input"] = True
-            state["status"] = "collecting"
+            updates["question_to_ask"] = decision.message
+            updates["need_user_input"] = True
+            updates["status"] = "collecting"
         elif decision.action == DecisionAction.FINALIZE:
-            state["status"] = "done"
-            state["done"] = True
-            state["result"] = decision.message
+            updates["status"] = "done"
+            updates["done"] = True
+            updates["result"] = decision.message
         else:
-            state["status"] = "error"
-            state["error_message"] = decision.message
-        
-        return state
-    
+            updates["status"] = "error"
+            updates["error_message"] = decision.message
+
+        return updates
+
     except Exception as e:
-        console.print(f"[bold red]❌ Error in planner: {e}[/bold red]")
-        console.print("[bold red]>>> Exception details:[/bold red]")
-        console.print(f"[red]Exception type: {type(e)}[/red]")
-        console.print(f"[red]Exception message: {str(e)}[/red]")
-        console.print("[red]Stack trace:[/red]")
-        traceback.print_exc()
-        console.print("[bold red]>>> End of exception details[/bold red]")
-        
-        state["error_message"] = f"Planner error: {str(e)}"
-        state["status"] = "error"
-        return state
\ No newline at end of file
+        logger.exception("Error in planner: %s", e)
+        budget.record_planner_call(failed=True)
+        updates["error_message"] = f"Planner error: {str(e)}"
+        updates["status"] = "error"
+        reason, hard = budget.check()
+        if hard:
+            # Stop here rather than loop back into the same failing call
+            console.print(f"[bold red]❌ Run budget: {reason}[/bold red]")
+            return {**updates, **_budget_abort(budget.diagnosis(f"{reason}; last error: {e}"))}
+        return updates
@@ -1,15 +1,32 @@
-from typing import Dict, Any
+from pathlib import Path
+from typing import Optional
+
 from rich.console import Console
 from agents.utils.models import AgentState
 from langchain.schema.messages import AIMessage
 
-from agents.utils.tools import PlaywrightExecutor
+from agents.utils.budget import RunBudget
+from agents.utils.dom_store import DomStore
+from agents.utils.plan_replay import templatize_steps
+from agents.utils.speculation import Speculator, predict_after_action
+from agents.utils.tools import PlaywrightExecutor, keeps_snapshot
 
 console = Console()
 
 class PlaywrightAgent:
-    def __init__(self, provider: str = "gmail"):
-        self.executor = PlaywrightExecutor(provider)
+    def __init__(
+        self,
+        provider: str = "gmail",
+        account: Optional[str] = None,
+        headless: bool = False,
+        use_daemon: bool = True,
+        har_mode: Optional[str] = None,
+        har_path: Optional[Path] = None,
+    ):
+        self.executor = PlaywrightExecutor(
+            provider, headless=headless, use_daemon=use_daemon, account=account, har_mode=har_mode, har_path=har_path
+        )
+        self.dom_store = DomStore()
         self.initialized = False
 
     async def initialize(self):
@@ -22,10 +39,12 @@ class PlaywrightAgent:
         """Clean up the Playwright executor"""
         await self.executor.cleanup()
 
-async def execute_playwright_action(state: AgentState, playwright_agent: PlaywrightAgent) -> AgentState:
-    """Execute Playwright action asynchronously"""
+async def execute_playwright_action(
+    state: AgentState, playwright_agent: PlaywrightAgent, budget: RunBudget, speculator: Optional[Speculator] = None
+) -> dict:
+    """Execute Playwright action asynchronously; with a speculator, the next planner call runs alongside it"""
     if state["exit_requested"] or not state["current_instruction"]:
-        return state
+        return {}
 
     console.print(f"⚙️ Executing instruction: {state['current_instruction']}", style="bold blue")
 
@@ -33,31 +52,110 @@ async def execute_playwright_action(state: AgentState, playwright_agent: Playwri
         # Ensure Playwright is initialized
         if not playwright_agent.initialized:
             if not await playwright_agent.initialize():
-                state["error_message"] = "Failed to initialize Playwright"
-                state["status"] = "error"
-                return state
+                return {"error_message": "Failed to initialize Playwright", "status": "error"}
+
+        instruction = dict(state["current_instruction"])
+        if instruction.get("type") == "upload":
+            # Only the attachments validated and hashed before planning are uploaded, all in one call;
+            # paths the planner put in the instruction are ignored
+            instruction["files"] = [h.path for h in state.get("attachment_handles") or []]
+
+        if state.get("template_plan") and playwright_agent.executor.is_send(instruction):
+            # Checked before Send: a plan that cannot be reused must not cost the planning email
+            try:
+                templatize_steps(state.get("executed_steps") or [], state["email_details"])
+            except ValueError as e:
+                if speculator:
+                    speculator.discard()
+                message = f"Not sent: the steps cannot be reused as a plan. {e}"
+                return {"error_message": message, "result": message, "status": "error", "done": True, "current_instruction": None}
+
+        if state.get("delivery") == "draft" and playwright_agent.executor.is_send(instruction):
+            # Drafts are sent later by the scheduler; composing is finished at this point
+            if speculator:
+                speculator.discard()
+            return {
+                "status": "done",
+                "done": True,
+                "result": "Draft composed; Send was not clicked (draft delivery).",
+                "messages": [AIMessage(content="Send skipped: this run only prepares a draft")],
+                "current_instruction": None,
+            }
+
+        if speculator:
+            speculator.speculate(predict_after_action(state, instruction))
 
         # Execute action
-        result = await playwright_agent.executor.execute_action(state["current_instruction"])
+        result = await playwright_agent.executor.execute_action(instruction)
         
         if result["success"]:
+            executor = playwright_agent.executor
+            postcondition = instruction.get("expect") or {}
+            if hasattr(postcondition, "model_dump"):
+                postcondition = postcondition.model_dump()
+
+            # Sending is confirmed here, not by another planner call
+            sending = executor.is_send(instruction)
+            if sending and await executor.confirm_sent():
+                console.print("📬 Send confirmed by the mail client", style="bold green")
+                return {
+                    "execution_result": result["action"],
+                    "executed_steps": [instruction],
+                    "status": "done",
+                    "done": True,
+                    "sent_confirmed": True,
+                    "result": "Email sent successfully (confirmed by the mail client).",
+                    "messages": [AIMessage(content=f"Executed: {result['action']}; send confirmed")],
+                    "current_instruction": None,
+                }
+
+            summary = f"Executed: {result['action']}"
+            if sending:
+                summary += "; the mail client did NOT confirm the send"
+                if getattr(postcondition.get("kind"), "value", postcondition.get("kind")) == "sent_toast":
+                    postcondition = {}  # confirm_sent has just waited for it
+            updates = {
+                "execution_result": result["action"],
+                "executed_steps": [instruction],
+                "status": "planning",
+                "current_instruction": None,
+            }
+            if postcondition:
+                holds, description = await executor.check_postcondition(postcondition)
+                summary += f"; verified {description}" if holds else f"; expected {description} did NOT hold"
+                if holds and keeps_snapshot(instruction):
+                    # Only a field's value changed, so the previous snapshot plus this step is enough for the planner
+                    budget.record_result(state["dom_ref"], None, verified=True)
+                    updates["messages"] = [AIMessage(content=summary)]
+                    return updates
+
+            # The page may have changed, so a call planned on the old snapshot is of no use
+            if speculator:
+                speculator.discard()
+
             # Update DOM after action
-            new_dom = await playwright_agent.executor.get_dom()
-            state["current_dom"] = new_dom
-            state["execution_result"] = result["action"]
-            state["status"] = "planning"
-            state["messages"].append(AIMessage(content=f"Executed: {result['action']}"))
-        else:
-            state["error_message"] = result["error"]
-            state["status"] = "error"
-            state["messages"].append(AIMessage(content=f"Execution failed: {result['error']}"))
-        
-        state["current_instruction"] = None
-        return state
+            new_dom = await executor.get_dom()
+            updates["dom_ref"] = playwright_agent.dom_store.put(new_dom)
+            budget.record_result(state["dom_ref"], updates["dom_ref"])
+            if updates["dom_ref"] == state["dom_ref"]:
+                summary += "; the page did not change"
+            updates["messages"] = [AIMessage(content=summary)]
+            return updates
+        if speculator:
+            speculator.discard()
+        return {
+            "error_message": result["error"],
+            "status": "error",
+            "messages": [AIMessage(content=f"Execution failed: {result['error']}")],
+            "current_instruction": None,
+        }
     
     except Exception as e:
         console.print(f"❌ Error in Playwright execution: {e}", style="bold red")
-        state["error_message"] = str(e)
-        state["status"] = "error"
-        state["messages"].append(AIMessage(content=f"Execution failed: {str(e)}"))
-        return state
\ No newline at end of file
+        if speculator:
+            speculator.discard()
+        return {
+            "error_message": str(e),
+            "status": "error",
+            "messages": [AIMessage(content=f"Execution failed: {str(e)}")],
+        }
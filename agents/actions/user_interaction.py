@@ -1,37 +1,92 @@
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+from pydantic import BaseModel, Field, create_model
 from langchain.schema.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
 from rich.console import Console
 from rich.prompt import Prompt
 
-from agents.utils.initializer import get_llm
+from agents.utils.attachments import prepare_attachments
+from agents.utils.initializer import get_router
 from agents.utils.models import AgentState, DecisionAction, EmailDetails, UserAgentDecision
 from agents.utils.prompts import user_agent_prompt
 
 console = Console()
 
-llm = get_llm()
-
-def initialize_state(state: AgentState) -> AgentState:
-    """Initialize the agent state."""
-    state["messages"] = []
-    state["email_details"] = None
-    state["status"] = "collecting"
-    state["question_to_ask"] = None
-    state["current_plan"] = None
-    state["current_step"] = None
-    state["current_dom"] = None
-    state["current_instruction"] = None
-    state["execution_result"] = None
-    state["ready_for_planner"] = False
-    state["need_user_input"] = False
-    state["done"] = False
-    state["exit_requested"] = False
-    state["result"] = None
-    state["error_message"] = None
-    return state
-
-def process_user_input(state: AgentState) -> AgentState:
+router = get_router()
+
+REQUIRED_EMAIL_FIELDS = ("recipient", "subject", "body")
+
+# Non-interactive runs answer at most this many questions automatically before failing
+MAX_AUTO_ANSWERS = 2
+
+# Built once; the same system prompt is reused for every triage call
+decision_prompt = f"""
+{user_agent_prompt}
+
+Current conversation context: The user wants help with email tasks.
+
+Based on the messages, decide what to do:
+1. "ask_user" - Need more information from user
+2. "proceed" - Have enough info to proceed 
+3. "finalize" - Task is complete
+
+When you choose "proceed", also fill `email_details` with the recipient, subject, body,
+any attachment file paths and the priority taken from the conversation. Leave unknown fields null.
+
+Keep your message simple and clear without special formatting.
+"""
+
+def initialize_state(state: AgentState) -> dict:
+    """Initialize the agent state, keeping any task, details or run options passed in."""
+    email_details = state.get("email_details")
+    return {
+        "messages": [],
+        "email_details": email_details,
+        "attachment_handles": state.get("attachment_handles"),
+        "status": "planning" if email_details else "collecting",
+        "question_to_ask": None,
+        "current_plan": [],
+        "executed_steps": [],
+        "current_step": None,
+        "dom_ref": None,
+        "current_instruction": None,
+        "execution_result": None,
+        "ready_for_planner": email_details is not None,
+        "need_user_input": False,
+        "done": False,
+        "sent_confirmed": False,
+        "exit_requested": False,
+        "result": None,
+        "error_message": None,
+        "interactive": state.get("interactive", True),
+        "auto_answer": state.get("auto_answer"),
+        "delivery": state.get("delivery") or "send",
+        "template_plan": state.get("template_plan", False),
+    }
+
+def answer_without_prompt(state: AgentState) -> dict:
+    """Non-interactive input: continue with the given task, auto-answer, or fail fast on a question."""
+    question = state["question_to_ask"]
+    if not question:
+        if state["ready_for_planner"] or (state["messages"] and state["messages"][-1].type == "human"):
+            return {}
+        return {"exit_requested": True, "status": "error", "error_message": "No task given for non-interactive run"}
+
+    answered = sum(1 for m in state["messages"] if m.type == "human" and m.content == state["auto_answer"])
+    if state["auto_answer"] and answered < MAX_AUTO_ANSWERS:
+        console.print(f"🤖 Auto-answering: {question}", style="bold yellow")
+        return {
+            "messages": [HumanMessage(content=state["auto_answer"])],
+            "question_to_ask": None,
+            "need_user_input": False,
+        }
+    return {"exit_requested": True, "status": "needs_input", "error_message": f"Input required: {question}"}
+
+def process_user_input(state: AgentState) -> dict:
     """Process user input and add it to the messages."""
+    if not state["interactive"]:
+        return answer_without_prompt(state)
+
     try:
         # Determine prompt
         if state["question_to_ask"]:
@@ -44,58 +99,39 @@ def process_user_input(state: AgentState) -> AgentState:
 
         # Check for exit command
         if user_input.lower() in ["exit", "quit", "bye"]:
-            state["exit_requested"] = True
-            return state
+            return {"exit_requested": True}
+
+        # Clear the question after use
+        updates = {"question_to_ask": None, "need_user_input": False}
 
         # Add user message to the conversation history (only for non-commands)
         if user_input.strip():  # Ensure we don't add empty messages
-            state["messages"].append(HumanMessage(content=user_input))
-
-        # Clear the question after use
-        state["question_to_ask"] = None
-        state["need_user_input"] = False
+            updates["messages"] = [HumanMessage(content=user_input)]
 
-        return state
+        return updates
 
     except KeyboardInterrupt:
-        state["exit_requested"] = True
-        return state
+        return {"exit_requested": True}
     except Exception as e:
         console.print(f"❌ Error processing input: {e}", style="bold red")
-        return state
+        return {}
 
-def generate_user_agent_decision(state: AgentState) -> AgentState:
+async def generate_user_agent_decision(state: AgentState) -> dict:
     """Generate user agent decision using the LLM."""
     # Skip if exit requested or no messages
     if state["exit_requested"] or not state["messages"]:
-        return state
+        return {}
 
     # Also skip if the last message is not from user
     if state["messages"][-1].type != "human":
-        return state
+        return {}
 
     console.print(f"📨 Processing messages: {len(state['messages'])} total", style="bold yellow")
     console.print(f"📊 Current status: {state['status']}", style="bold yellow")
 
     try:
-        # Create a simple, clean prompt for structured output
-        decision_prompt = f"""
-{user_agent_prompt}
-
-Current conversation context: The user wants help with email tasks.
-
-Based on the messages, decide what to do:
-1. "ask_user" - Need more information from user
-2. "proceed" - Have enough info to proceed 
-3. "finalize" - Task is complete
-
-Keep your message simple and clear without special formatting.
-"""
-
-        # Get decision from LLM
-        structured_llm = llm.with_structured_output(UserAgentDecision)
-        
-        decision = structured_llm.invoke([
+        # One call decides the next step and, when proceeding, extracts the email details
+        decision = await router.ainvoke_structured("triage", UserAgentDecision, [
             SystemMessage(content=decision_prompt)
         ] + state["messages"])
         
@@ -104,76 +140,102 @@ Keep your message simple and clear without special formatting.
         # Handle different actions
         if decision.action == DecisionAction.ASK_USER:
             # Set question to ask user
-            state["question_to_ask"] = decision.message
-            state["messages"].append(AIMessage(content=decision.message))
-            state["status"] = "collecting"
-            state["need_user_input"] = True
-            return state
+            return {
+                "question_to_ask": decision.message,
+                "messages": [AIMessage(content=decision.message)],
+                "status": "collecting",
+                "need_user_input": True,
+            }
         
         elif decision.action == DecisionAction.PROCEED:
-            # Extract email details from the conversation
-            email_details = extract_email_details_from_messages(state["messages"])
+            email_details = decision.email_details or EmailDetails()
+            missing = missing_email_fields(email_details)
+            if missing:
+                # Only re-ask the model for the fields the combined call left empty
+                email_details = await fill_missing_email_fields(state["messages"], email_details, missing)
+                missing = missing_email_fields(email_details)
+            if missing:
+                question = f"Could you tell me the {', '.join(missing)} for this email?"
+                return {
+                    "question_to_ask": question,
+                    "messages": [AIMessage(content=question)],
+                    "status": "collecting",
+                    "need_user_input": True,
+                }
             
             console.print(f"✅ Extracted email details: {email_details}", style="bold green")
             
-            state["messages"].append(AIMessage(content="Great! I have the information needed. Ready to proceed with planning."))
-            state["email_details"] = email_details
-            state["status"] = "planning"
-            state["ready_for_planner"] = True
-            state["done"] = False
-            return state
+            # Validate and hash attachments before any browser work starts
+            try:
+                attachment_handles = prepare_attachments(email_details.attachments)
+            except ValueError as e:
+                question = f"There is a problem with the attachments: {e}. Please provide valid file paths."
+                return {
+                    "question_to_ask": question,
+                    "messages": [AIMessage(content=question)],
+                    "status": "collecting",
+                    "need_user_input": True,
+                }
+            
+            return {
+                "messages": [AIMessage(content="Great! I have the information needed. Ready to proceed with planning.")],
+                "email_details": email_details,
+                "attachment_handles": attachment_handles,
+                "status": "planning",
+                "ready_for_planner": True,
+                "done": False,
+            }
             
         elif decision.action == DecisionAction.FINALIZE:
-            state["messages"].append(AIMessage(content=decision.message))
-            state["status"] = "done"
-            state["done"] = True
-            state["result"] = "Task completed successfully"
-            return state
+            return {
+                "messages": [AIMessage(content=decision.message)],
+                "status": "done",
+                "done": True,
+                "result": "Task completed successfully",
+            }
         
         else:  # ERROR case
-            state["messages"].append(AIMessage(content="I encountered an error processing your request."))
-            state["status"] = "error"
-            state["done"] = True
-            state["error_message"] = decision.message
-            return state
+            return {
+                "messages": [AIMessage(content="I encountered an error processing your request.")],
+                "status": "error",
+                "done": True,
+                "error_message": decision.message,
+            }
             
     except Exception as e:
         console.print(f"❌ Error in generate_user_agent_decision: {e}", style="bold red")
-        state["question_to_ask"] = "I had trouble understanding your request. Could you please clarify what you'd like to do with email?"
-        state["status"] = "collecting"
-        state["need_user_input"] = True
-        state["error_message"] = str(e)
-        return state
-
-def extract_email_details_from_messages(messages: List[BaseMessage]) -> EmailDetails:
-    """
-    Extract email details from the conversation messages.
-    This could use an LLM or simple parsing.
-    """
-    
-    # Simple approach: use LLM to extract structured info
+        return {
+            "question_to_ask": "I had trouble understanding your request. Could you please clarify what you'd like to do with email?",
+            "status": "collecting",
+            "need_user_input": True,
+            "error_message": str(e),
+        }
+
+def missing_email_fields(email_details: EmailDetails) -> List[str]:
+    """Required fields the extraction left empty"""
+    return [name for name in REQUIRED_EMAIL_FIELDS if not getattr(email_details, name)]
+
+@lru_cache(maxsize=None)
+def _missing_fields_model(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    # One schema (and so one cached structured-output runnable) per combination of missing fields
+    return create_model(
+        "MissingEmailFields",
+        **{name: (Optional[str], Field(None, description=f"The email {name}, or null if not mentioned")) for name in fields},
+    )
+
+async def fill_missing_email_fields(messages: List[BaseMessage], email_details: EmailDetails, missing: List[str]) -> EmailDetails:
+    """Re-ask the extraction route for just the missing EmailDetails fields."""
     try:
-        extractor_llm = llm.with_structured_output(EmailDetails)
-        
-        extraction_prompt = """
-Extract email details from this conversation.
-Look for:
-- Recipient name/email
-- Subject line
-- Message body/content  
-- Any attachments mentioned
-- Priority level
-
-If information is not mentioned, leave fields as null.
+        extraction_prompt = f"""
+Extract only these email fields from the conversation: {", ".join(missing)}.
+If a field is not mentioned, leave it null.
 """
-        
-        email_details = extractor_llm.invoke([
+        found = await router.ainvoke_structured("extraction", _missing_fields_model(tuple(missing)), [
             SystemMessage(content=extraction_prompt)
         ] + messages)
-        
-        return email_details
+        updates = {name: value for name, value in found.model_dump().items() if value}
+        return email_details.model_copy(update=updates)
         
     except Exception as e:
-        console.print(f"⚠️ Could not extract email details: {e}", style="bold yellow")
-        # Return empty details if extraction fails
-        return EmailDetails()
+        console.print(f"⚠️ Could not extract missing email fields: {e}", style="bold yellow")
+        return email_details
@@ -1,34 +1,39 @@
-import asyncio
 from langgraph.graph import StateGraph, END, START
 from agents.actions.playwright_execution import execute_playwright_action, PlaywrightAgent
-from agents.actions.planning import generate_planner_decision
+from agents.actions.planning import generate_planner_decision, speculative_planner_call
 from agents.actions.user_interaction import initialize_state, process_user_input, generate_user_agent_decision
+from agents.utils.budget import BudgetLimits, RunBudget
+from agents.utils.initializer import get_dotenv_value, get_router
 from agents.utils.conditionals import decide_after_planner, decide_after_playwright, decide_after_user_agent_decision, decide_after_user_input
-from agents.utils.models import AgentState, PlannerState
+from agents.utils.attachments import prepare_attachments
+from agents.utils.models import AgentState, AgentStateModel, EmailDetails, PlannerDecision, UserAgentDecision
+from agents.utils.speculation import Speculator, speculation_enabled
+from langchain.schema.messages import HumanMessage
 from rich.console import Console
+from pathlib import Path
+from typing import Optional
 
 console = Console()
 
-def sync_generate_planner_decision(state: dict, playwright_agent: PlaywrightAgent):
-    try:
-        # Validate the state
-        validated_state = PlannerState.model_validate(state)
-        print("State validated successfully.")
-        print("Validated State:", validated_state)
-    except Exception as e:
-        print("State validation failed:", e)
-        raise
-
-    return asyncio.run(generate_planner_decision(validated_state.model_dump(), playwright_agent))
-
-def sync_execute_playwright_action(state, playwright_agent):
-    return asyncio.run(execute_playwright_action(state, playwright_agent))
-
-def create_email_agent(provider: str = "gmail"):
+def create_email_agent(provider: str = "gmail", playwright_agent: Optional[PlaywrightAgent] = None):
     """Create the full email agent graph."""
     # Initialize PlaywrightAgent
-    playwright_agent = PlaywrightAgent(provider)
+    playwright_agent = playwright_agent or PlaywrightAgent(provider)
+    router = get_router()
+    router.prepare([("triage", UserAgentDecision), ("planner", PlannerDecision)])
+    budget = RunBudget(BudgetLimits.from_env(get_dotenv_value), router.total_tokens)
+    # EMAILBOT_SPECULATE: plan the next step while the current action runs
+    speculator = None
+    if speculation_enabled(get_dotenv_value):
+        speculator = Speculator(lambda predicted: speculative_planner_call(predicted, playwright_agent, budget))
     
+    # Playwright nodes run on the graph's own event loop so the browser objects stay on one loop
+    async def planner_node(state: AgentState) -> dict:
+        return await generate_planner_decision(state, playwright_agent, budget, speculator)
+
+    async def playwright_node(state: AgentState) -> dict:
+        return await execute_playwright_action(state, playwright_agent, budget, speculator)
+
     # Build the graph
     graph = StateGraph(AgentState)
 
@@ -36,8 +41,8 @@ def create_email_agent(provider: str = "gmail"):
     graph.add_node("initialize", initialize_state)
     graph.add_node("user_input", process_user_input)
     graph.add_node("user_agent_decision", generate_user_agent_decision)
-    graph.add_node("planner_decision", lambda state: sync_generate_planner_decision(state, playwright_agent))
-    graph.add_node("playwright_execution", lambda state: sync_execute_playwright_action(state, playwright_agent))
+    graph.add_node("planner_decision", planner_node)
+    graph.add_node("playwright_execution", playwright_node)
 
 
     # Add edges
@@ -87,20 +92,60 @@ def create_email_agent(provider: str = "gmail"):
 
     # Compile the graph with cleanup
     async def cleanup():
+        if speculator:
+            speculator.discard()
         await playwright_agent.cleanup()
 
     app = graph.compile()
     app.cleanup = cleanup  # Attach cleanup method
+    app.recursion_limit = budget.limits.recursion_limit
+    app.speculator = speculator
     return app
 
-async def run_email_agent(provider: str = "gmail"):
-    """Run the email agent with CLI interaction."""
+def build_initial_state(
+    task: Optional[str] = None,
+    details: Optional[EmailDetails] = None,
+    auto_answer: Optional[str] = None,
+    delivery: str = "send",
+    template_plan: bool = False,
+) -> dict:
+    """Graph input: empty for a conversation, or a non-interactive task / pre-filled details"""
+    if not (task or details):
+        return {}
+    initial_state = {"interactive": False, "auto_answer": auto_answer, "delivery": delivery, "template_plan": template_plan}
+    if task:
+        initial_state["messages"] = [HumanMessage(content=task)]
+    if details:
+        # Validated up front so a bad attachment fails before a browser is launched
+        initial_state["email_details"] = details
+        initial_state["attachment_handles"] = prepare_attachments(details.attachments)
+    return initial_state
+
+async def run_email_agent(
+    provider: str = "gmail",
+    task: Optional[str] = None,
+    details: Optional[EmailDetails] = None,
+    auto_answer: Optional[str] = None,
+    har_mode: Optional[str] = None,
+    har_path: Optional[Path] = None,
+) -> Optional[AgentStateModel]:
+    """
+    Run the email agent. With neither `task` nor `details` it is a CLI conversation; otherwise
+    it runs non-interactively, answering planner questions with `auto_answer` or failing fast.
+    `har_mode` records the browser traffic to `har_path`, or replays the UI from it offline.
+    """
     console.print("🤖 Full Email Agent CLI", style="bold blue")
     console.print("=" * 40, style="dim")
     
+    initial_state = build_initial_state(task, details, auto_answer)
+
+    app = None
+    final_state = None
     try:
-        app = create_email_agent(provider)
-        await app.ainvoke({})
+        app = create_email_agent(provider, PlaywrightAgent(provider, har_mode=har_mode, har_path=har_path))
+        # Validate once at the exit edge; nodes exchange partial updates only
+        # The run budget bounds the planner loop; LangGraph's own step limit is a backstop close to it
+        final_state = AgentStateModel.model_validate(await app.ainvoke(initial_state, {"recursion_limit": app.recursion_limit}))
         console.print("\n🏁 Agent execution completed.", style="bold green")
     except KeyboardInterrupt:
         console.print("\n⚠️ Process interrupted by user", style="bold yellow")
@@ -109,4 +154,9 @@ async def run_email_agent(provider: str = "gmail"):
         import traceback
         traceback.print_exc()
     finally:
-        await app.cleanup()
\ No newline at end of file
+        if app:
+            await app.cleanup()
+            if app.speculator:
+                console.print(f"⚡ Speculative planning: {app.speculator.summary()}", style="dim")
+        get_router().report()
+    return final_state
\ No newline at end of file
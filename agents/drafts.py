@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from rich.console import Console
+
+from agents.utils.drafts import MAX_OPEN_ATTEMPTS, DraftStore, StagedDraft
+from agents.utils.log import get_logger
+from agents.utils.tools import PlaywrightExecutor, draft_body_prefix
+from agents.workers import ShardKey, job_details, job_key
+
+console = Console()
+logger = get_logger("drafts")
+
+# The scheduler opens and verifies a draft this long before it is due, so only the Send click is left
+DEFAULT_LEAD_SECONDS = 60.0
+# A draft found later than this after its due time is marked missed instead of being sent
+DEFAULT_MAX_LATE_SECONDS = 15 * 60.0
+
+
+async def stage_drafts(
+    jobs: List[Dict[str, Any]],
+    due_times: List[float],
+    store: DraftStore,
+    default_provider: str = "gmail",
+    headless: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Compose every job ahead of time and save it as a provider draft due at its send time.
+
+    Jobs are grouped by (provider, account); each group is composed like a mail merge, with the
+    LLM planning only the first draft. Results are returned in job order.
+    """
+    from agents.merge import send_emails
+
+    groups: "OrderedDict[ShardKey, List[int]]" = OrderedDict()
+    for index, job in enumerate(jobs):
+        groups.setdefault(job_key(job, default_provider), []).append(index)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+    for (provider, account), indexes in groups.items():
+        emails = [job_details(jobs[i]) for i in indexes]
+        staged = await send_emails(provider, emails, account=account, headless=headless, delivery="draft")
+        for index, email, result in zip(indexes, emails, staged):
+            result.update({"provider": provider, "account": account, "due_at": due_times[index], "draft_id": None})
+            if result["draft_ref"]:
+                draft = store.add(StagedDraft(
+                    provider=provider,
+                    account=account,
+                    draft_ref=result["draft_ref"],
+                    due_at=due_times[index],
+                    recipient=email.recipient,
+                    subject=email.subject,
+                    body_prefix=draft_body_prefix(email.body),
+                    attachments=[Path(a).name for a in email.attachments or []],
+                ))
+                result["draft_id"] = draft.id
+            results[index] = result
+    return results
+
+
+def _missed(draft: StagedDraft, store: DraftStore, max_late_seconds: float) -> Optional[Dict[str, Any]]:
+    """Mark a draft that is too far past its due time as missed; returns its result if so"""
+    late = time.time() - draft.due_at
+    if late <= max_late_seconds:
+        return None
+    error = f"Missed: {late / 60:.0f} min past its due time (limit {max_late_seconds / 60:.0f} min); not sent"
+    store.update(draft.id, state="missed", error=error)
+    return {"id": draft.id, "recipient": draft.recipient, "sent": False, "error": error}
+
+
+async def send_draft(
+    executor: PlaywrightExecutor,
+    draft: StagedDraft,
+    store: DraftStore,
+    max_late_seconds: float = DEFAULT_MAX_LATE_SECONDS,
+) -> Dict[str, Any]:
+    """Open and verify one draft, wait for its due time, then click Send and confirm it"""
+    missed = _missed(draft, store, max_late_seconds)
+    if missed:
+        return missed
+    ok, error = await executor.open_draft(draft.draft_ref, draft.subject, draft.recipient, draft.body_prefix, draft.attachments)
+    if not ok:
+        attempts = draft.attempts + 1
+        state = "failed" if attempts >= MAX_OPEN_ATTEMPTS else "staged"
+        store.update(draft.id, attempts=attempts, error=error, state=state)
+        return {"id": draft.id, "recipient": draft.recipient, "sent": False, "error": error}
+
+    wait = draft.due_at - time.time()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    # Opening may have taken long (slow page, earlier drafts in this session)
+    missed = _missed(draft, store, max_late_seconds)
+    if missed:
+        return missed
+    # Marked before the click: a crash after it must not lead to a second send
+    store.update(draft.id, state="sending", attempts=draft.attempts + 1)
+    config = executor.provider_config.get(executor.provider, executor.provider_config["gmail"])
+    result = await executor.execute_action({"type": "click", "selector": config["send_selector"]})
+    if not result["success"]:
+        store.update(draft.id, state="failed", error=result["error"])
+        return {"id": draft.id, "recipient": draft.recipient, "sent": False, "error": result["error"]}
+    if not await executor.confirm_sent():
+        error = "Send was clicked but not confirmed by the mail client; check the Sent folder"
+        store.update(draft.id, state="failed", error=error)
+        return {"id": draft.id, "recipient": draft.recipient, "sent": False, "error": error}
+    sent_at = time.time()
+    store.update(draft.id, state="sent", sent_at=sent_at, error=None)
+    logger.info(
+        "Sent draft %s to %s, %.1fs after its due time", draft.id, draft.recipient, sent_at - draft.due_at,
+        extra={"fields": {"draft": draft.id, "late_seconds": round(sent_at - draft.due_at, 3)}},
+    )
+    return {"id": draft.id, "recipient": draft.recipient, "sent": True, "error": None}
+
+
+async def send_due_drafts(
+    store: DraftStore,
+    lead_seconds: float = DEFAULT_LEAD_SECONDS,
+    headless: bool = True,
+    max_late_seconds: float = DEFAULT_MAX_LATE_SECONDS,
+) -> List[Dict[str, Any]]:
+    """Send every staged draft due within `lead_seconds`, one browser session per (provider, account)"""
+    results = []
+    groups: "OrderedDict[Tuple[str, Optional[str]], List[StagedDraft]]" = OrderedDict()
+    for draft in store.due(lead_seconds=lead_seconds):
+        missed = _missed(draft, store, max_late_seconds)
+        if missed:
+            console.print(f"⏭️ {draft.recipient} ({draft.id}): {missed['error']}", style="yellow")
+            results.append(missed)
+            continue
+        groups.setdefault((draft.provider, draft.account), []).append(draft)
+
+    for (provider, account), drafts in groups.items():
+        executor = PlaywrightExecutor(provider, headless=headless, account=account)
+        try:
+            if not await executor.setup():
+                error = f"Could not open the {provider} mailbox"
+                for draft in drafts:
+                    attempts = draft.attempts + 1
+                    store.update(draft.id, attempts=attempts, error=error, state="failed" if attempts >= MAX_OPEN_ATTEMPTS else "staged")
+                    results.append({"id": draft.id, "recipient": draft.recipient, "sent": False, "error": error})
+                continue
+            for draft in drafts:
+                outcome = await send_draft(executor, draft, store, max_late_seconds)
+                console.print(
+                    f"{'✅' if outcome['sent'] else '❌'} {draft.recipient} ({draft.id})"
+                    + (f": {outcome['error']}" if outcome["error"] else ""),
+                    style="green" if outcome["sent"] else "red",
+                )
+                results.append(outcome)
+        finally:
+            await executor.cleanup()
+    return results
+
+
+async def run_scheduler(
+    store: DraftStore,
+    watch: bool = False,
+    lead_seconds: float = DEFAULT_LEAD_SECONDS,
+    poll_seconds: float = 30.0,
+    headless: bool = True,
+    max_late_seconds: float = DEFAULT_MAX_LATE_SECONDS,
+) -> List[Dict[str, Any]]:
+    """Send due drafts once, or with `watch` keep waking up for the next due draft until none are left"""
+    results = []
+    while True:
+        results.extend(await send_due_drafts(store, lead_seconds, headless, max_late_seconds))
+        next_due = store.next_due()
+        if not watch or next_due is None:
+            return results
+        # Wake up one lead time before the next draft is due, but re-read the store regularly
+        await asyncio.sleep(min(poll_seconds, max(1.0, next_due - lead_seconds - time.time())))
@@ -0,0 +1,142 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+
+from agents.actions.playwright_execution import PlaywrightAgent
+from agents.agent import build_initial_state, create_email_agent
+from agents.utils.attachments import prepare_attachments
+from agents.utils.mail_merge import MailMergeTemplate
+from agents.utils.models import AgentStateModel, AttachmentHandle, EmailDetails
+from agents.utils.plan_replay import render_steps, replay_steps, templatize_steps
+
+console = Console()
+
+
+async def _save_draft(executor, email: EmailDetails, result: Dict[str, Any], results: List[Dict[str, Any]]) -> bool:
+    # Rows often share a subject: never record a draft id another row already has
+    known = {r["draft_ref"] for r in results if r.get("draft_ref")}
+    result["draft_ref"] = await executor.save_draft(
+        email.subject, email.recipient, known_refs=known, body=email.body, attachments=email.attachments or ()
+    )
+    if result["draft_ref"] is None:
+        result["error"] = "The email was composed but its draft could not be saved and found in Drafts"
+    return result["draft_ref"] is not None
+
+
+async def send_emails(
+    provider: str,
+    emails: List[EmailDetails],
+    account: Optional[str] = None,
+    plan: Optional[List[Dict[str, Any]]] = None,
+    headless: bool = False,
+    use_daemon: bool = True,
+    delivery: str = "send",
+) -> List[Dict[str, Any]]:
+    """
+    Send a batch of emails through one browser session.
+
+    Unless a templatized `plan` is given, the first email goes through the LLM planner and its
+    executed steps become the plan that is replayed for every other email. With
+    `delivery="draft"` nothing is sent: each email is composed, saved to Drafts, and its result
+    carries the provider's `draft_ref`.
+    """
+    drafting = delivery == "draft"
+    handles: List[Optional[List[AttachmentHandle]]] = []
+    results: List[Dict[str, Any]] = []
+    for email in emails:
+        result = {"recipient": email.recipient, "sent": False, "error": None, "seconds": 0.0}
+        if drafting:
+            result["draft_ref"] = None
+        try:
+            handles.append(prepare_attachments(email.attachments))
+        except ValueError as e:
+            handles.append(None)
+            result["error"] = str(e)
+        results.append(result)
+
+    sendable = [i for i, h in enumerate(handles) if h is not None]
+    if not sendable:
+        return results
+
+    playwright_agent = PlaywrightAgent(provider, account=account, headless=headless, use_daemon=use_daemon)
+    try:
+        if plan is None:
+            # Plan on a row with attachments if there is one, so the plan contains the upload step
+            planning_index = next((i for i in sendable if handles[i]), sendable[0])
+            console.print(f"🧠 Planning the template once with {emails[planning_index].recipient}", style="bold magenta")
+            app = create_email_agent(provider, playwright_agent)
+            start = time.perf_counter()
+            state = AgentStateModel.model_validate(await app.ainvoke(
+                build_initial_state(details=emails[planning_index], delivery=delivery, template_plan=True),
+                {"recursion_limit": app.recursion_limit},
+            ))
+            planned = results[planning_index]
+            # A draft run ends before Send; a real send must be confirmed by the mail client
+            done = state.done and state.status == "done" if drafting else state.sent_confirmed
+            if done and drafting:
+                done = await _save_draft(playwright_agent.executor, emails[planning_index], planned, results)
+            else:
+                planned["sent"] = done
+            planned["seconds"] = round(time.perf_counter() - start, 2)
+            if not done:
+                planned["error"] = planned["error"] or state.error_message or state.result or "Planning run did not send"
+                for i in sendable:
+                    if i != planning_index:
+                        results[i]["error"] = "Skipped: the template could not be planned"
+                return results
+            if app.speculator:
+                console.print(f"⚡ Speculative planning: {app.speculator.summary()}", style="dim")
+            sendable.remove(planning_index)
+            try:
+                plan = templatize_steps(state.executed_steps, emails[planning_index])
+            except ValueError as e:
+                # Replaying would send the planning email's own content to everyone else
+                for i in sendable:
+                    results[i]["error"] = f"Skipped: {e}"
+                return results
+            await playwright_agent.executor.lifecycle.after_send()
+        elif not await playwright_agent.initialize():
+            for i in sendable:
+                results[i]["error"] = f"Could not open the {provider} mailbox"
+            return results
+
+        executor = playwright_agent.executor
+        for position, i in enumerate(sendable):
+            start = time.perf_counter()
+            outcome = await replay_steps(executor, render_steps(plan, emails[i], handles[i]), send=not drafting)
+            results[i]["sent"] = outcome["sent"]
+            results[i]["error"] = outcome["error"]
+            done = outcome["error"] is None if drafting else outcome["sent"]
+            if done and drafting:
+                done = await _save_draft(executor, emails[i], results[i], results)
+            results[i]["seconds"] = round(time.perf_counter() - start, 2)
+            label = f"draft {results[i]['draft_ref']} " if drafting and done else ""
+            console.print(
+                f"{'✅' if done else '❌'} {emails[i].recipient} {label}({results[i]['seconds']}s)",
+                style="green" if done else "red",
+            )
+            if not done:
+                # Leave a half-filled compose window behind before the next row
+                try:
+                    await executor.refresh()
+                except Exception as e:
+                    for j in sendable[position + 1:]:
+                        results[j]["error"] = f"Skipped: the mailbox could not be reloaded after a failed row ({e})"
+                    break
+            # Long batches: recycle the page or context when memory or send count limits are hit
+            await executor.lifecycle.after_send()
+        console.print(f"🧹 Browser lifecycle: {executor.lifecycle.summary()}", style="dim")
+        return results
+    finally:
+        await playwright_agent.cleanup()
+
+
+async def run_mail_merge(provider: str, template: MailMergeTemplate, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Send one templated email per recipient row.
+
+    Only the first email goes through the LLM planner; its executed steps become a plan
+    that is replayed for every other row with that row's rendered values.
+    """
+    return await send_emails(provider, template.render_all(rows))
@@ -0,0 +1,68 @@
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from agents.utils.models import AttachmentHandle
+
+# Gmail and Outlook both reject messages over 25 MB of attachments
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+# Handles are keyed on (resolved path, mtime, size) so an unchanged file is hashed only once
+_handle_cache: Dict[Tuple[str, int, int], AttachmentHandle] = {}
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_attachment(path: str) -> AttachmentHandle:
+    """Validate a single attachment and return a (cached) handle for it"""
+    resolved = Path(path).expanduser().resolve()
+    if not resolved.exists():
+        raise ValueError(f"Attachment not found: {path}")
+    if not resolved.is_file():
+        raise ValueError(f"Attachment is not a file: {path}")
+    stat = resolved.stat()
+    key = (str(resolved), stat.st_mtime_ns, stat.st_size)
+    handle = _handle_cache.get(key)
+    if handle is None:
+        handle = AttachmentHandle(
+            path=str(resolved),
+            name=resolved.name,
+            size=stat.st_size,
+            sha256=_hash_file(resolved),
+            mime_type=mimetypes.guess_type(resolved.name)[0] or "application/octet-stream",
+        )
+        _handle_cache[key] = handle
+    return handle
+
+
+def prepare_attachments(paths: Optional[List[str]], max_total_bytes: int = MAX_ATTACHMENT_BYTES) -> List[AttachmentHandle]:
+    """Validate and hash all attachments up front; raises ValueError listing every problem found"""
+    handles: List[AttachmentHandle] = []
+    errors: List[str] = []
+    seen = set()
+    for path in paths or []:
+        try:
+            handle = prepare_attachment(path)
+        except (ValueError, OSError) as e:
+            errors.append(str(e))
+            continue
+        if handle.sha256 in seen:
+            continue
+        seen.add(handle.sha256)
+        handles.append(handle)
+
+    total = sum(h.size for h in handles)
+    if total > max_total_bytes:
+        errors.append(
+            f"Attachments total {total / (1024 * 1024):.1f} MB, over the {max_total_bytes / (1024 * 1024):.0f} MB limit"
+        )
+    if errors:
+        raise ValueError("; ".join(errors))
+    return handles
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agents.utils.log import get_logger
+
+DAEMON_FILE = Path("sessions") / "daemon.json"
+DEFAULT_DAEMON_PORT = 9222
+DEFAULT_PROFILE_DIR = Path("sessions") / "daemon_profile"
+
+logger = get_logger("daemon")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_daemon_endpoint(path: Path = DAEMON_FILE) -> Optional[Dict[str, Any]]:
+    """Endpoint info of a running browser daemon, or None if there is none (stale files are ignored)"""
+    try:
+        info = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(info, dict) or not info.get("endpoint") or not _pid_alive(int(info.get("pid", 0))):
+        return None
+    return info
+
+
+# Sets the saved localStorage items an origin does not have yet, before the page's own scripts run
+SEED_LOCAL_STORAGE_JS = """
+(origins) => {
+    const entry = origins.find((o) => o.origin === location.origin);
+    if (!entry) return;
+    for (const { name, value } of entry.localStorage || []) {
+        if (localStorage.getItem(name) === null) localStorage.setItem(name, value);
+    }
+}
+"""
+
+
+async def seed_storage_state(context, state: Dict[str, Any]):
+    """
+    Load a saved storage state (cookies and localStorage) into an existing context.
+
+    Persistent contexts cannot take `storage_state`; cookies are added directly and
+    localStorage is filled in per origin on the next load, without overwriting newer values.
+    """
+    await context.add_cookies(state.get("cookies") or [])
+    origins = [o for o in state.get("origins") or [] if o.get("localStorage")]
+    if origins:
+        await context.add_init_script(f"({SEED_LOCAL_STORAGE_JS})({json.dumps(origins)})")
+
+
+def _write_endpoint(info: Dict[str, Any], path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(info, indent=2))
+    os.replace(tmp, path)
+
+
+async def _open_mailbox(context, provider: str, config: Dict[str, Any]):
+    page = await context.new_page()
+    await page.goto(config["url"], timeout=60000)
+    try:
+        await page.wait_for_selector(config["compose_selector"], state="visible", timeout=60000)
+        logger.info("%s mailbox ready at %s", provider, page.url)
+    except Exception:
+        logger.warning("%s mailbox did not show %s; the session may need 'start' again", provider, config["compose_selector"])
+    return page
+
+
+async def run_daemon(
+    providers: List[str],
+    port: int = DEFAULT_DAEMON_PORT,
+    headless: bool = False,
+    profile_dir: Path = DEFAULT_PROFILE_DIR,
+    endpoint_file: Path = DAEMON_FILE,
+):
+    """
+    Keep one Chromium running with every provider's mailbox open, until SIGINT/SIGTERM.
+
+    CLI runs attach to it over CDP (see PlaywrightExecutor.setup) instead of launching and
+    navigating a browser of their own.
+    """
+    from playwright.async_api import async_playwright
+
+    from agents.utils.tools import PlaywrightExecutor
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows: Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
+            str(profile_dir),
+            headless=headless,
+            args=[f"--remote-debugging-port={port}"],
+            ignore_https_errors=True,
+            bypass_csp=True,
+        )
+        try:
+            configs = {}
+            for provider in providers:
+                executor = PlaywrightExecutor(provider)
+                configs[provider] = executor.provider_config[provider]
+                status = executor.sessions.status(provider, path=executor.session_file)
+                if status.usable:
+                    # The profile keeps logins across daemon restarts; session files seed a fresh one
+                    await seed_storage_state(context, executor.sessions.load(executor.session_file))
+                elif status.state != "missing":
+                    logger.warning("Not seeding %s from %s: %s", provider, executor.session_file, status.reason)
+            await asyncio.gather(*(_open_mailbox(context, provider, config) for provider, config in configs.items()))
+            # Persistent contexts open with a blank tab; drop it so only mailboxes remain
+            for page in context.pages:
+                if page.url == "about:blank" and len(context.pages) > len(configs):
+                    await page.close()
+
+            _write_endpoint({
+                "endpoint": f"http://127.0.0.1:{port}",
+                "pid": os.getpid(),
+                "providers": providers,
+                "started_at": time.time(),
+            }, endpoint_file)
+            logger.info("Browser daemon listening on http://127.0.0.1:%d (Ctrl+C to stop)", port)
+            await stop.wait()
+        finally:
+            info = read_daemon_endpoint(endpoint_file)
+            if info and info.get("pid") == os.getpid():
+                endpoint_file.unlink(missing_ok=True)
+            await context.close()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Escalation ladder for repeated / no-op steps; hard caps (steps, tokens, time) abort directly
+ESCALATIONS = ("switch_model", "refresh", "abort")
+
+
+@dataclass
+class BudgetLimits:
+    max_steps: int = 25
+    max_tokens: int = 100_000
+    max_seconds: float = 300.0
+    max_repeats: int = 2  # same action issued on the same DOM
+    max_no_progress: int = 3  # consecutive actions that left the DOM unchanged
+    max_planner_errors: int = 3  # consecutive planner calls that raised (bad key, 5xx, ...)
+
+    @classmethod
+    def from_env(cls, get_value) -> "BudgetLimits":
+        limits = cls()
+        for name, cast in (("max_steps", int), ("max_tokens", int), ("max_seconds", float)):
+            value = get_value(f"EMAILBOT_{name.upper()}")
+            if value:
+                setattr(limits, name, cast(value))
+        return limits
+
+    @property
+    def recursion_limit(self) -> int:
+        """LangGraph step limit for one run: a backstop just above what the step budget allows"""
+        return 4 * self.max_steps
+
+
+def fingerprint(value: Any) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:12]
+
+
+class RunBudget:
+    """
+    Tracks one send's planner loop: steps, tokens and wall time, plus fingerprints of every
+    (DOM snapshot, action) pair so repeated and no-op steps are caught before they burn calls.
+
+    Every planner invocation is a step, including failed calls and PROCEEDs without an
+    instruction, so a planner that keeps erroring is stopped by the same caps.
+    """
+
+    def __init__(self, limits: BudgetLimits, token_counter: Callable[[], int]):
+        self.limits = limits
+        self.token_counter = token_counter
+        self.started_at: Optional[float] = None
+        self.tokens_at_start = 0
+        self.steps = 0
+        self.no_progress = 0
+        self.planner_errors = 0
+        self.escalation_level = 0
+        self.planner_route = "planner"
+        self.seen: Dict[Tuple[Optional[str], str], int] = {}
+        self.history: List[str] = []
+
+    def start(self):
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+            self.tokens_at_start = self.token_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at if self.started_at else 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.token_counter() - self.tokens_at_start
+
+    def record_planner_call(self, failed: bool = False):
+        """Count one planner invocation against max_steps; `failed` when it raised"""
+        self.steps += 1
+        self.planner_errors = self.planner_errors + 1 if failed else 0
+
+    def record_action(self, dom_ref: Optional[str], instruction: Dict[str, Any]) -> Optional[str]:
+        """Register a planned action; returns a reason if it repeats an action already tried on this DOM"""
+        action_fp = fingerprint({k: v for k, v in instruction.items() if v not in (None, False)})
+        key = (dom_ref, action_fp)
+        self.seen[key] = self.seen.get(key, 0) + 1
+        self.history.append(f"{instruction.get('type')} {instruction.get('selector') or instruction.get('value') or ''}".strip())
+        if self.seen[key] > self.limits.max_repeats:
+            return f"the same {instruction.get('type')} on {instruction.get('selector')} was planned {self.seen[key]} times on an unchanged page"
+        return None
+
+    def record_result(self, dom_before: Optional[str], dom_after: Optional[str], verified: bool = False):
+        """Count consecutive actions that changed nothing on the page"""
+        if verified or (dom_after is not None and dom_after != dom_before):
+            self.no_progress = 0
+        else:
+            self.no_progress += 1
+
+    def check(self) -> Tuple[Optional[str], bool]:
+        """Return (reason, hard) if a budget has tripped; hard caps cannot be escalated around"""
+        if self.planner_errors >= self.limits.max_planner_errors:
+            return f"{self.planner_errors} consecutive planner calls failed", True
+        if self.steps >= self.limits.max_steps:
+            return f"step budget of {self.limits.max_steps} exhausted", True
+        if self.tokens >= self.limits.max_tokens:
+            return f"token budget of {self.limits.max_tokens} exhausted ({self.tokens} used)", True
+        if self.elapsed >= self.limits.max_seconds:
+            return f"time budget of {self.limits.max_seconds:.0f}s exhausted", True
+        if self.no_progress >= self.limits.max_no_progress:
+            return f"{self.no_progress} consecutive actions had no visible effect", False
+        return None, False
+
+    def escalate(self) -> str:
+        """Move one rung up the escalation ladder and reset the loop detectors"""
+        action = ESCALATIONS[min(self.escalation_level, len(ESCALATIONS) - 1)]
+        self.escalation_level += 1
+        self.seen.clear()
+        self.no_progress = 0
+        if action == "switch_model":
+            self.planner_route = "escalation"
+        return action
+
+    def diagnosis(self, reason: str) -> str:
+        recent = "; ".join(self.history[-5:]) or "none"
+        return (
+            f"Stopped: {reason}. {self.steps} steps, {self.tokens} tokens, {self.elapsed:.0f}s, "
+            f"escalation level {self.escalation_level}. Last actions: {recent}."
+        )
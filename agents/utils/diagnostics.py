@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import stat
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Set
+
+from playwright.async_api import BrowserContext, Page
+
+from agents.utils.initializer import get_dotenv_value
+from agents.utils.log import get_logger
+from agents.utils.sessions import file_lock
+
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+
+logger = get_logger("diagnostics")
+
+
+class DiagnosticsRecorder:
+    """
+    Captures screenshots and optional Playwright traces off the critical path.
+
+    Every run writes into its own folder under `root`; the folders together form a ring
+    buffer capped at `max_bytes` (oldest files are evicted first). Failure-path screenshots are
+    taken in background tasks so they never wait on encoding or disk I/O, and are dropped rather
+    than queued once `max_pending` are in flight. The explicit `screenshot` action waits for its
+    file (capture_now), so it only reports a path that exists.
+    """
+
+    def __init__(
+        self,
+        root: str = "screenshots",
+        run_id: Optional[str] = None,
+        image_format: str = "jpeg",
+        quality: int = 70,
+        clip_to_compose: bool = False,
+        compose_selector: str = 'div[role="dialog"]',
+        max_bytes: int = 50 * 1024 * 1024,
+        max_pending: int = 4,
+        trace: bool = False,
+    ):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+        if image_format == "webp" and importlib.util.find_spec("PIL") is None:
+            # Playwright only encodes PNG/JPEG; without Pillow the files would be JPEG named .webp
+            logger.warning("WebP screenshots need Pillow; saving JPEG instead")
+            image_format = "jpeg"
+        self.root = Path(root)
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.run_dir = self.root / self.run_id
+        self.image_format = image_format
+        self.quality = quality
+        self.clip_to_compose = clip_to_compose
+        self.compose_selector = compose_selector
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.trace = trace
+        self.dropped = 0
+        self._pending: Set[asyncio.Task] = set()
+        self._tracing_context: Optional[BrowserContext] = None
+
+    @classmethod
+    def from_env(cls, **overrides) -> "DiagnosticsRecorder":
+        """Build a recorder from EMAILBOT_DIAGNOSTICS_* environment variables"""
+        options = {
+            "root": get_dotenv_value("EMAILBOT_DIAGNOSTICS_DIR") or "screenshots",
+            "image_format": (get_dotenv_value("EMAILBOT_SCREENSHOT_FORMAT") or "jpeg").lower(),
+            "quality": int(get_dotenv_value("EMAILBOT_SCREENSHOT_QUALITY") or 70),
+            "clip_to_compose": (get_dotenv_value("EMAILBOT_SCREENSHOT_CLIP") or "").lower() in ("1", "true", "yes"),
+            "max_bytes": int(get_dotenv_value("EMAILBOT_DIAGNOSTICS_MAX_MB") or 50) * 1024 * 1024,
+            "trace": (get_dotenv_value("EMAILBOT_TRACE") or "").lower() in ("1", "true", "yes"),
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.image_format == "jpeg" else self.image_format
+
+    async def start(self, context: BrowserContext):
+        """Start a Playwright trace for this run if tracing is enabled"""
+        if not self.trace:
+            return
+        try:
+            await context.tracing.start(screenshots=True, snapshots=True)
+            self._tracing_context = context
+        except Exception as e:
+            logger.warning("Could not start tracing: %s", e)
+
+    def capture(self, page: Page, name: str, clip_to_compose: Optional[bool] = None) -> Optional[Path]:
+        """Schedule a screenshot in the background and return the path it will be written to"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return None
+        path = self.run_dir / f"{name}.{self.extension}"
+        clip = self.clip_to_compose if clip_to_compose is None else clip_to_compose
+        task = asyncio.create_task(self._capture(page, path, clip))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return path
+
+    async def capture_now(self, page: Page, name: str, clip_to_compose: Optional[bool] = None) -> Optional[Path]:
+        """Take a screenshot and wait until it is written; returns its path, or None if it failed"""
+        path = self.run_dir / f"{name}.{self.extension}"
+        clip = self.clip_to_compose if clip_to_compose is None else clip_to_compose
+        return path if await self._capture(page, path, clip) else None
+
+    async def _capture(self, page: Page, path: Path, clip_to_compose: bool) -> bool:
+        try:
+            options = {"type": "png" if self.image_format == "png" else "jpeg"}
+            if options["type"] == "jpeg":
+                options["quality"] = self.quality
+            if clip_to_compose:
+                box = await page.locator(self.compose_selector).first.bounding_box(timeout=500)
+                if box:
+                    options["clip"] = box
+            data = await page.screenshot(**options)
+            await asyncio.to_thread(self._write, path, data)
+            return True
+        except Exception as e:
+            logger.warning("Screenshot %s failed: %s", path.name, e)
+            return False
+
+    def _write(self, path: Path, data: bytes):
+        if self.image_format == "webp":
+            data = self._to_webp(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self._enforce_cap()
+
+    def _to_webp(self, data: bytes) -> bytes:
+        from PIL import Image  # optional; checked in __init__
+
+        out = io.BytesIO()
+        Image.open(io.BytesIO(data)).save(out, format="WEBP", quality=self.quality)
+        return out.getvalue()
+
+    def _enforce_cap(self):
+        """Evict the oldest run files until everything under root fits in max_bytes"""
+        # Writer threads and other runs (merge workers, the draft scheduler) share root
+        with file_lock(self.root / "eviction"):
+            files = []
+            for f in self.root.glob("*/*"):
+                try:
+                    info = f.stat()
+                except FileNotFoundError:
+                    continue  # removed meanwhile, e.g. by hand
+                if stat.S_ISREG(info.st_mode):
+                    files.append((info.st_mtime, info.st_size, f))
+            files.sort(key=lambda entry: entry[0])
+            total = sum(size for _, size, _ in files)
+            for _, size, f in files:
+                if total <= self.max_bytes:
+                    break
+                total -= size
+                f.unlink(missing_ok=True)
+                if f.parent != self.run_dir:
+                    with contextlib.suppress(OSError):  # not empty yet, or already gone
+                        f.parent.rmdir()
+
+    async def close(self, timeout: float = 10.0):
+        """Flush pending screenshots and write the trace, if any"""
+        if self._pending:
+            await asyncio.wait(set(self._pending), timeout=timeout)
+        if self._tracing_context:
+            try:
+                self.run_dir.mkdir(parents=True, exist_ok=True)
+                await self._tracing_context.tracing.stop(path=str(self.run_dir / "trace.zip"))
+                await asyncio.to_thread(self._enforce_cap)
+            except Exception as e:
+                logger.warning("Could not save trace: %s", e)
+            finally:
+                self._tracing_context = None
+        if self.dropped:
+            logger.warning("Diagnostics dropped %d screenshot(s) under load", self.dropped)
@@ -0,0 +1,148 @@
+from typing import Any, Dict, List, Optional
+from playwright.async_api import Page
+
+# Upper bound on elements reported per snapshot; keeps capture time and prompt size flat on large inboxes
+DEFAULT_MAX_ELEMENTS = 150
+
+DEFAULT_COMPOSE_ROOT_SELECTORS = [
+    'div[role="dialog"]',
+    '[data-testid*="compose"]',
+]
+
+DEFAULT_TOOLBAR_SELECTORS = [
+    '[role="toolbar"]',
+    '[role="banner"]',
+    '[role="navigation"]',
+]
+
+# Scoped capture: only the open compose dialog is walked, or the visible toolbars when no
+# dialog is open. Candidates are collected first and their layout is read in a single
+# batched pass (getBoundingClientRect), so the page is laid out at most once per capture.
+DOM_CAPTURE_JS = """
+(opts) => {
+    const maxElements = opts.maxElements;
+    const vw = window.innerWidth || document.documentElement.clientWidth;
+    const vh = window.innerHeight || document.documentElement.clientHeight;
+
+    const snapshot = {
+        url: window.location.href,
+        title: document.title,
+        compose_open: false,
+        scope: 'viewport',
+        truncated: false,
+        clickable_elements: [],
+        input_fields: [],
+        buttons: []
+    };
+
+    const visible = (el) => { const r = el.getBoundingClientRect(); return r.width > 0 && r.height > 0; };
+
+    let roots = [];
+    for (const sel of opts.composeRootSelectors) {
+        // A closed compose window may stay in the DOM, hidden
+        const found = Array.from(document.querySelectorAll(sel)).filter(visible);
+        if (found.length) {
+            roots = found;
+            snapshot.compose_open = true;
+            snapshot.scope = 'compose';
+            break;
+        }
+    }
+    if (!roots.length && opts.toolbarSelectors.length) {
+        roots = Array.from(document.querySelectorAll(opts.toolbarSelectors.join(', ')));
+        if (roots.length) snapshot.scope = 'toolbar';
+    }
+    if (!roots.length) roots = [document.body];
+
+    const inputSel = 'input:not([type="hidden"]), textarea, [contenteditable="true"], [role="textbox"], [role="combobox"]';
+    const clickSel = 'button, [role="button"], a[href], [data-tooltip], [aria-label]';
+
+    // Collect without touching layout; stop scanning well before the whole tree is visited
+    const scanLimit = maxElements * 4;
+    const candidates = [];
+    const seen = new Set();
+    const collect = (sel, kind) => {
+        for (const root of roots) {
+            const matches = root.matches && root.matches(sel) ? [root] : [];
+            for (const el of matches.concat(Array.from(root.querySelectorAll(sel)))) {
+                if (seen.has(el)) continue;
+                if (candidates.length >= scanLimit) { snapshot.truncated = true; return; }
+                seen.add(el);
+                candidates.push({ el, kind });
+            }
+        }
+    };
+    collect(inputSel, 'input');
+    collect(clickSel, 'clickable');
+
+    // Single batched layout read
+    const rects = candidates.map(c => c.el.getBoundingClientRect());
+
+    const esc = (v) => (window.CSS && CSS.escape) ? CSS.escape(v) : v.replace(/["\\\\]/g, '\\\\$&');
+    const selectorFor = (el) => {
+        if (el.id) return `#${esc(el.id)}`;
+        const label = el.getAttribute('aria-label');
+        if (label) return `${el.tagName.toLowerCase()}[aria-label="${label.replace(/"/g, '\\\\"')}"]`;
+        if (el.getAttribute('name')) return `[name="${esc(el.getAttribute('name'))}"]`;
+        const cls = typeof el.className === 'string' ? el.className.trim().split(/\\s+/)[0] : '';
+        return cls ? `.${esc(cls)}` : el.tagName.toLowerCase();
+    };
+
+    let reported = 0;
+    for (let i = 0; i < candidates.length; i++) {
+        if (reported >= maxElements) { snapshot.truncated = true; break; }
+        const { el, kind } = candidates[i];
+        const r = rects[i];
+        const onScreen = r.width > 0 && r.height > 0 && r.bottom > 0 && r.right > 0 && r.top < vh && r.left < vw;
+        // Outside a compose dialog only what the user can actually see is useful to the planner
+        if (!onScreen && snapshot.scope !== 'compose') continue;
+
+        if (kind === 'input') {
+            snapshot.input_fields.push({
+                type: el.type || 'text',
+                placeholder: el.placeholder || '',
+                aria_label: el.getAttribute('aria-label') || '',
+                name: el.name || '',
+                value: (el.value !== undefined ? el.value : el.textContent || '').slice(0, 200),
+                selector: selectorFor(el),
+                visible: onScreen
+            });
+        } else {
+            const text = (el.getAttribute('aria-label') || el.getAttribute('data-tooltip') || el.textContent || '').trim();
+            if (!text.length || text.length >= 100) continue;
+            snapshot.clickable_elements.push({
+                text: text,
+                tag: el.tagName.toLowerCase(),
+                selector: selectorFor(el),
+                visible: onScreen
+            });
+            for (const key of opts.keyButtons) {
+                if (text.toLowerCase().includes(key.toLowerCase()) && !snapshot.buttons.some(b => b.text === key)) {
+                    snapshot.buttons.push({ text: key, selector: selectorFor(el), available: onScreen });
+                }
+            }
+        }
+        reported++;
+    }
+
+    snapshot.element_count = reported;
+    return snapshot;
+}
+"""
+
+
+async def capture_dom(
+    page: Page,
+    compose_root_selectors: Optional[List[str]] = None,
+    toolbar_selectors: Optional[List[str]] = None,
+    max_elements: int = DEFAULT_MAX_ELEMENTS,
+    key_buttons: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Capture a compact snapshot of the compose dialog (or visible toolbars) in one evaluate call"""
+    options = {
+        "composeRootSelectors": compose_root_selectors or DEFAULT_COMPOSE_ROOT_SELECTORS,
+        "toolbarSelectors": toolbar_selectors if toolbar_selectors is not None else DEFAULT_TOOLBAR_SELECTORS,
+        "maxElements": max_elements,
+        "keyButtons": key_buttons or ["Send", "New message", "Compose", "Attach", "To", "Subject"],
+    }
+    return await page.evaluate(DOM_CAPTURE_JS, options)
@@ -0,0 +1,34 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+
+class DomStore:
+    """
+    Holds recent DOM snapshots out of the graph state.
+
+    The state only carries a content hash (`dom_ref`), so checkpointing or copying the state
+    never duplicates multi-KB snapshot strings. Identical snapshots share one entry.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def fingerprint(dom: str) -> str:
+        return hashlib.sha1(dom.encode("utf-8")).hexdigest()[:16]
+
+    def put(self, dom: str) -> str:
+        """Store a snapshot and return its reference"""
+        ref = self.fingerprint(dom)
+        self._snapshots[ref] = dom
+        self._snapshots.move_to_end(ref)
+        while len(self._snapshots) > self.max_entries:
+            self._snapshots.popitem(last=False)
+        return ref
+
+    def get(self, ref: Optional[str]) -> Optional[str]:
+        if not ref:
+            return None
+        return self._snapshots.get(ref)
@@ -0,0 +1,100 @@
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from agents.utils.sessions import atomic_write_json, file_lock
+
+DRAFTS_FILE = Path("drafts") / "drafts.json"
+MAX_OPEN_ATTEMPTS = 3  # a draft that cannot be opened this often is marked failed
+
+
+def parse_due(value: Union[str, float, int]) -> float:
+    """Epoch seconds from an ISO 8601 time (local time when no offset is given) or epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid send time {value!r}; use ISO 8601, e.g. 2026-05-01T09:00:00+02:00") from None
+
+
+@dataclass
+class StagedDraft:
+    provider: str
+    account: Optional[str]
+    draft_ref: str  # the provider's draft id, used to reopen it
+    due_at: float
+    recipient: Optional[str] = None
+    subject: Optional[str] = None
+    body_prefix: Optional[str] = None  # checked with the attachment names when the draft is reopened
+    attachments: List[str] = field(default_factory=list)  # file names
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    state: str = "staged"  # staged | sending | sent | failed | missed
+    error: Optional[str] = None
+    attempts: int = 0
+    staged_at: float = field(default_factory=time.time)
+    sent_at: Optional[float] = None
+
+
+class DraftStore:
+    """
+    Local record of staged drafts and their send times, shared by the stager and the scheduler.
+
+    Every change is a locked read-modify-write with an atomic rename, so both can run at once.
+    """
+
+    def __init__(self, path: Path = DRAFTS_FILE):
+        self.path = Path(path)
+
+    def _read(self) -> List[StagedDraft]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return []
+        return [StagedDraft(**entry) for entry in data.get("drafts", [])]
+
+    def _write(self, drafts: List[StagedDraft]):
+        atomic_write_json(self.path, {"drafts": [asdict(d) for d in drafts]}, indent=2)
+
+    def all(self) -> List[StagedDraft]:
+        return self._read()
+
+    def add(self, draft: StagedDraft) -> StagedDraft:
+        with file_lock(self.path):
+            self._write(self._read() + [draft])
+        return draft
+
+    def update(self, draft_id: str, **changes: Any) -> StagedDraft:
+        with file_lock(self.path):
+            drafts = self._read()
+            draft = next((d for d in drafts if d.id == draft_id), None)
+            if draft is None:
+                raise KeyError(f"No staged draft {draft_id}")
+            for name, value in changes.items():
+                setattr(draft, name, value)
+            self._write(drafts)
+        return draft
+
+    def due(self, now: Optional[float] = None, lead_seconds: float = 0.0) -> List[StagedDraft]:
+        """Staged drafts due within `lead_seconds` of `now`, earliest first"""
+        limit = (time.time() if now is None else now) + lead_seconds
+        return sorted((d for d in self._read() if d.state == "staged" and d.due_at <= limit), key=lambda d: d.due_at)
+
+    def next_due(self) -> Optional[float]:
+        pending = [d.due_at for d in self._read() if d.state == "staged"]
+        return min(pending) if pending else None
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for draft in self._read():
+            counts[draft.state] = counts.get(draft.state, 0) + 1
+        return counts
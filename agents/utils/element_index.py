@@ -0,0 +1,168 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from agents.utils.models import EmailDetails
+
+DEFAULT_TOP_K = 15
+
+# Words that identify the controls each part of the objective needs
+INTENT_KEYWORDS: Dict[str, Set[str]] = {
+    "compose": {"compose", "new", "message", "mail"},
+    "recipient": {"to", "recipient", "recipients", "cc"},
+    "subject": {"subject", "subjectbox", "title"},
+    "body": {"body", "message", "editor", "content"},
+    "attach": {"attach", "attachment", "attachments", "file", "files", "upload"},
+    "send": {"send"},
+}
+
+# Which kind of element an intent is looking for
+INTENT_KINDS = {
+    "compose": "clickable",
+    "recipient": "input",
+    "subject": "input",
+    "body": "input",
+    "attach": None,
+    "send": "clickable",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9@._-]+")
+
+
+def tokenize(*texts: Optional[str]) -> Set[str]:
+    tokens: Set[str] = set()
+    for text in texts:
+        if text:
+            tokens.update(_TOKEN_RE.findall(text.lower()))
+    return tokens
+
+
+@dataclass
+class IndexedElement:
+    kind: str  # input | clickable
+    selector: str
+    text: str = ""
+    aria_label: str = ""
+    tag: str = ""
+    input_type: str = ""
+    placeholder: str = ""
+    value: str = ""
+    visible: bool = True
+    tokens: Set[str] = field(default_factory=set)
+
+    def to_prompt(self) -> Dict[str, Any]:
+        entry = {"kind": self.kind, "selector": self.selector}
+        for key in ("text", "aria_label", "tag", "input_type", "placeholder", "value"):
+            value = getattr(self, key)
+            if value:
+                entry[key] = value[:120]
+        if not self.visible:
+            entry["visible"] = False
+        return entry
+
+
+class ElementIndex:
+    """Searchable view of one DOM snapshot, used to send the planner only the relevant elements."""
+
+    def __init__(self, snapshot: Dict[str, Any]):
+        self.snapshot = snapshot
+        self.elements: List[IndexedElement] = []
+        for field_info in snapshot.get("input_fields", []):
+            aria_label = field_info.get("aria_label", "")
+            self.elements.append(IndexedElement(
+                kind="input",
+                selector=field_info.get("selector", ""),
+                aria_label=aria_label,
+                input_type=field_info.get("type", ""),
+                placeholder=field_info.get("placeholder", ""),
+                value=field_info.get("value", ""),
+                visible=field_info.get("visible", True),
+                tokens=tokenize(aria_label, field_info.get("placeholder"), field_info.get("name"), field_info.get("selector")),
+            ))
+        for clickable in snapshot.get("clickable_elements", []):
+            text = clickable.get("text", "")
+            self.elements.append(IndexedElement(
+                kind="clickable",
+                selector=clickable.get("selector", ""),
+                text=text,
+                tag=clickable.get("tag", ""),
+                visible=clickable.get("visible", True),
+                tokens=tokenize(text, clickable.get("selector")),
+            ))
+
+    @classmethod
+    def from_snapshot(cls, dom: str) -> Optional["ElementIndex"]:
+        try:
+            snapshot = json.loads(dom)
+        except (TypeError, ValueError):
+            return None
+        return cls(snapshot) if isinstance(snapshot, dict) else None
+
+    def pending_intents(self, details: EmailDetails, attachments_pending: bool) -> List[str]:
+        """What the objective still needs, judged from the values already on the page"""
+        page_values = " ".join(e.value for e in self.elements if e.value).lower()
+        if not self.snapshot.get("compose_open"):
+            return ["compose"]
+        intents = []
+        for name in ("recipient", "subject", "body"):
+            value = getattr(details, name)
+            if value and value.strip().lower()[:40] not in page_values:
+                intents.append(name)
+        if attachments_pending:
+            intents.append("attach")
+        intents.append("send")
+        return intents
+
+    def score(self, element: IndexedElement, intents: List[str], details: EmailDetails, last_selector: Optional[str]) -> float:
+        score = 1.0 if element.visible else 0.0
+        for rank, intent in enumerate(intents):
+            if element.tokens & INTENT_KEYWORDS[intent]:
+                wanted_kind = INTENT_KINDS[intent]
+                weight = 6.0 - min(rank, 4)  # the next thing to do matters most
+                score += weight if wanted_kind in (None, element.kind) else weight / 3
+        # e.g. an autocomplete suggestion showing the recipient's address
+        if details.recipient and details.recipient.lower() in (element.text + element.aria_label).lower():
+            score += 3.0
+        if last_selector and element.selector == last_selector:
+            score += 2.0
+        return score
+
+    def top_k(
+        self,
+        details: EmailDetails,
+        last_step: Optional[Dict[str, Any]] = None,
+        attachments_pending: bool = False,
+        k: int = DEFAULT_TOP_K,
+    ) -> List[IndexedElement]:
+        intents = self.pending_intents(details, attachments_pending)
+        last_selector = (last_step or {}).get("selector")
+        ranked = sorted(
+            enumerate(self.elements),
+            key=lambda item: (-self.score(item[1], intents, details, last_selector), item[0]),
+        )
+        return [element for _, element in ranked[:k]]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "url": self.snapshot.get("url"),
+            "title": self.snapshot.get("title"),
+            "compose_open": self.snapshot.get("compose_open"),
+            "scope": self.snapshot.get("scope"),
+            "elements_total": len(self.elements),
+            "key_buttons": [b.get("text") for b in self.snapshot.get("buttons", []) if b.get("available")],
+        }
+
+    def render(
+        self,
+        details: EmailDetails,
+        last_step: Optional[Dict[str, Any]] = None,
+        attachments_pending: bool = False,
+        k: int = DEFAULT_TOP_K,
+    ) -> str:
+        """Compact prompt text: a page summary plus the top-k candidate elements"""
+        candidates = self.top_k(details, last_step, attachments_pending, k)
+        return json.dumps({
+            "page": self.summary(),
+            "candidates": [element.to_prompt() for element in candidates],
+        })
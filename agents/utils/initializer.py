@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 
+from agents.utils.routing import ModelRouter, routes_from_env
+
 load_dotenv()
 
 def get_dotenv_value(val: str):
@@ -9,11 +11,15 @@ def get_dotenv_value(val: str):
 
 
 # LLM Initialization
-llm_instance = None
+router_instance = None
+
+
+def get_router() -> ModelRouter:
+    global router_instance
+    if router_instance is None:
+        router_instance = ModelRouter(routes_from_env(get_dotenv_value), api_key=get_dotenv_value("GROQ_API_KEY"))
+    return router_instance
 
 
-def get_llm():
-    global llm_instance
-    if llm_instance is None:
-        llm_instance = ChatGroq(model="openai/gpt-oss-20b", temperature=2, api_key=get_dotenv_value("GROQ_API_KEY"))
-    return llm_instance
\ No newline at end of file
+def get_llm(route: str = "planner") -> ChatGroq:
+    return get_router().llm(route)
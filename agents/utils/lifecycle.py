@@ -0,0 +1,188 @@
+import os
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from agents.utils.initializer import get_dotenv_value
+from agents.utils.log import get_logger
+
+MB = 1024 * 1024
+
+logger = get_logger("lifecycle")
+
+
+@dataclass
+class LifecycleLimits:
+    max_sends_per_context: int = 50
+    max_js_heap_mb: float = 512.0  # per page; recycles the page
+    max_browser_pss_mb: float = 2048.0  # this executor's Chromium processes; recycles the context
+    sample_every: int = 5  # sends between memory samples; walking /proc and CDP is not free
+
+    @classmethod
+    def from_env(cls, get_value) -> "LifecycleLimits":
+        limits = cls()
+        for name, env, cast in (
+            ("max_sends_per_context", "EMAILBOT_RECYCLE_AFTER_SENDS", int),
+            ("max_js_heap_mb", "EMAILBOT_MAX_JS_HEAP_MB", float),
+            ("max_browser_pss_mb", "EMAILBOT_MAX_BROWSER_PSS_MB", float),
+            ("sample_every", "EMAILBOT_MEMORY_SAMPLE_EVERY", int),
+        ):
+            value = get_value(env)
+            if value:
+                setattr(limits, name, cast(value))
+        return limits
+
+
+@dataclass
+class MemorySample:
+    sends: int
+    python_pss_mb: Optional[float]
+    browser_pss_mb: Optional[float]
+    js_heap_mb: Optional[float]
+
+
+def _proc_field_kb(path: str, field: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _proc_pss_kb(pid: int) -> Optional[int]:
+    """
+    Proportional set size: shared pages are split between the processes that map them.
+
+    Summing RSS over Chromium's processes counts the shared renderer and library pages once per
+    process and overstates the total several times over. Falls back to VmRSS on kernels
+    without smaps_rollup (before 4.14).
+    """
+    pss = _proc_field_kb(f"/proc/{pid}/smaps_rollup", "Pss:")
+    return pss if pss is not None else _proc_field_kb(f"/proc/{pid}/status", "VmRSS:")
+
+
+def python_pss_mb() -> Optional[float]:
+    kb = _proc_pss_kb(os.getpid())
+    return kb / 1024 if kb is not None else None
+
+
+def processes_pss_mb(pids: Iterable[int]) -> Optional[float]:
+    """Total PSS of the given processes; None where /proc is unavailable (not Linux)"""
+    kbs = [kb for kb in (_proc_pss_kb(pid) for pid in pids) if kb is not None]
+    return sum(kbs) / 1024 if kbs else None
+
+
+class LifecycleManager:
+    """
+    Keeps a long-lived executor at steady memory.
+
+    Every `sample_every` sends it samples Python PSS, the PSS of this executor's browser processes
+    (as listed by CDP SystemInfo.getProcessInfo) and the page's JS heap (Performance.getMetrics), and recycles the page or the whole context when a limit
+    is crossed. The sends-per-context limit is checked after every send. Context recycling
+    restores the session from the saved storage state.
+    """
+
+    def __init__(self, executor, limits: Optional[LifecycleLimits] = None):
+        self.executor = executor
+        self.limits = limits or LifecycleLimits.from_env(get_dotenv_value)
+        self.sends_in_context = 0
+        self.total_sends = 0
+        self.recycles: List[Dict[str, Any]] = []
+        self.samples: Deque[MemorySample] = deque(maxlen=100)  # bounded: this runs for days
+        self.peaks: Dict[str, float] = {}
+        self._cdp = None
+        self._cdp_page = None
+        self._browser_cdp = None
+
+    async def js_heap_mb(self) -> Optional[float]:
+        page = self.executor.page
+        if page is None:
+            return None
+        try:
+            if self._cdp is None or self._cdp_page is not page:
+                self._cdp = await page.context.new_cdp_session(page)
+                self._cdp_page = page
+                await self._cdp.send("Performance.enable")
+            metrics = await self._cdp.send("Performance.getMetrics")
+        except Exception:
+            self._cdp = None  # not Chromium, or the page went away
+            return None
+        used = next((m["value"] for m in metrics.get("metrics", []) if m["name"] == "JSHeapUsedSize"), None)
+        return used / MB if used is not None else None
+
+    async def browser_pss_mb(self) -> Optional[float]:
+        """
+        PSS of the Chromium this executor launched: its browser, GPU, utility and renderer processes.
+
+        The pids come from the browser itself, so other executors' browsers in the same process
+        (or a daemon) are never counted. None when attached to the daemon or off Chromium.
+        """
+        browser = self.executor.browser
+        if browser is None or self.executor.attached:
+            return None
+        try:
+            if self._browser_cdp is None:
+                self._browser_cdp = await browser.new_browser_cdp_session()
+            info = await self._browser_cdp.send("SystemInfo.getProcessInfo")
+        except Exception:
+            self._browser_cdp = None
+            return None
+        return processes_pss_mb(process["id"] for process in info.get("processInfo", []))
+
+    async def sample(self) -> MemorySample:
+        sample = MemorySample(
+            sends=self.total_sends,
+            python_pss_mb=python_pss_mb(),
+            browser_pss_mb=await self.browser_pss_mb(),
+            js_heap_mb=await self.js_heap_mb(),
+        )
+        self.samples.append(sample)
+        for name in ("python_pss_mb", "browser_pss_mb", "js_heap_mb"):
+            value = getattr(sample, name)
+            if value is not None:
+                self.peaks[name] = max(value, self.peaks.get(name, 0.0))
+        return sample
+
+    def recycle_reason(self, sample: Optional[MemorySample]) -> Optional[Tuple[str, str]]:
+        """(scope, reason) when the page or context should be replaced; memory limits need a sample"""
+        if sample and sample.browser_pss_mb is not None and sample.browser_pss_mb > self.limits.max_browser_pss_mb:
+            return "context", f"browser PSS {sample.browser_pss_mb:.0f} MB > {self.limits.max_browser_pss_mb:.0f} MB"
+        if self.sends_in_context >= self.limits.max_sends_per_context:
+            return "context", f"{self.sends_in_context} sends in this context"
+        if sample and sample.js_heap_mb is not None and sample.js_heap_mb > self.limits.max_js_heap_mb:
+            return "page", f"JS heap {sample.js_heap_mb:.0f} MB > {self.limits.max_js_heap_mb:.0f} MB"
+        return None
+
+    async def after_send(self) -> Optional[str]:
+        """Record one send attempt and recycle if needed; returns the recycle scope, if any"""
+        self.total_sends += 1
+        self.sends_in_context += 1
+        if self.executor.attached:
+            return None  # the daemon owns that browser
+        sample = await self.sample() if self.total_sends % max(1, self.limits.sample_every) == 0 else None
+        decision = self.recycle_reason(sample)
+        if not decision:
+            return None
+        scope, reason = decision
+        logger.info(
+            "Recycling %s after %d sends: %s", scope, self.total_sends, reason,
+            extra={"fields": {"scope": scope, "sends": self.total_sends, **(asdict(sample) if sample else {})}},
+        )
+        if await self.executor.recycle(scope):
+            self._cdp = None
+            if scope == "context":
+                self.sends_in_context = 0
+            self.recycles.append({"scope": scope, "reason": reason, "sends": self.total_sends})
+            return scope
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "sends": self.total_sends,
+            "recycles": len(self.recycles),
+            **{f"peak_{name}": round(value, 1) for name, value in self.peaks.items()},
+            "last_sample": asdict(self.samples[-1]) if self.samples else None,
+        }
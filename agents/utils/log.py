@@ -0,0 +1,210 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from agents.utils.initializer import get_dotenv_value
+
+ROOT_LOGGER = "emailbot"
+DEFAULT_LOG_FILE = "logs/emailbot.jsonl"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_forward_to: Optional[Any] = None  # multiprocessing queue to the parent, in send-batch workers
+
+
+def _env_flag(name: str) -> bool:
+    return (get_dotenv_value(name) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def log_payloads() -> bool:
+    """EMAILBOT_LOG_PAYLOADS: log DOM snapshots and prompts in full instead of by hash and size"""
+    return _env_flag("EMAILBOT_LOG_PAYLOADS")
+
+
+class Payload:
+    """
+    A large string (DOM snapshot, prompt, state dump) passed as a logging argument.
+
+    Nothing is hashed or copied unless the record is actually emitted; then it renders as
+    `<dom sha1=… 48213 chars>`, or in full when EMAILBOT_LOG_PAYLOADS is set.
+    """
+
+    __slots__ = ("value", "kind")
+
+    def __init__(self, value: Any, kind: str = "payload"):
+        self.value = value
+        self.kind = kind
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, default=str)
+        if log_payloads():
+            return text
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        return f"<{self.kind} sha1={digest} {len(text)} chars>"
+
+
+def payload(value: Any, kind: str = "payload") -> Payload:
+    return Payload(value, kind)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record; structured values go in `extra={"fields": {...}}`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry["fields"] = fields
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records as they are, with msg and args unformatted.
+
+    The stock QueueHandler renders the message in the calling thread; here the listener thread
+    does it, so Payload hashing and JSON encoding stay off the agent's event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class ForwardingHandler(logging.handlers.QueueHandler):
+    """Send rendered, picklable records from a worker process to the parent's log sinks"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = json.loads(json.dumps(fields, default=str))
+        return record
+
+
+class _Relay(logging.Handler):
+    """Parent side of ForwardingHandler: hand worker records to the local emailbot sinks"""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        logging.getLogger(record.name).handle(record)
+        return True
+
+
+def _level(name: str, default: str) -> int:
+    level = logging.getLevelName((get_dotenv_value(name) or default).strip().upper())
+    # getLevelName returns "Level X" for unknown names
+    return level if isinstance(level, int) else logging.getLevelName(default)
+
+
+def setup_logging() -> logging.Logger:
+    """
+    Configure the `emailbot` logger once per process; called by the CLI entry points only.
+
+    Callers only enqueue records (LazyQueueHandler); a background QueueListener formats them and
+    does the console and JSON-lines file writes. Levels come from EMAILBOT_LOG_LEVEL (console,
+    default INFO) and EMAILBOT_LOG_FILE_LEVEL (file, default INFO); EMAILBOT_LOG_FILE="" disables
+    the file. Worker processes forward their records to the parent (see init_worker_logging), or
+    write a per-pid file, so no two processes ever rotate the same file.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return root
+
+    console_level = _level("EMAILBOT_LOG_LEVEL", "INFO")
+    file_level = _level("EMAILBOT_LOG_FILE_LEVEL", "INFO")
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root.addHandler(LazyQueueHandler(records))
+    root.propagate = False
+
+    if _forward_to is not None:
+        # The parent applies the per-sink levels and does the writes
+        root.setLevel(min(console_level, file_level))
+        _listener = logging.handlers.QueueListener(records, ForwardingHandler(_forward_to))
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return root
+
+    # stderr keeps stdout clean for machine-readable output (run --task prints JSON there)
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console]
+    levels = [console_level]
+
+    log_file = get_dotenv_value("EMAILBOT_LOG_FILE")
+    if log_file is None:
+        log_file = DEFAULT_LOG_FILE
+    if log_file:
+        path = Path(log_file)
+        if multiprocessing.parent_process() is not None:
+            # A child process must not rotate the parent's file under it
+            path = path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+        levels.append(file_level)
+
+    # Records below every sink's level are dropped before any formatting happens
+    root.setLevel(min(levels))
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Drain the queue and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger(ROOT_LOGGER).handlers.clear()
+
+
+def init_worker_logging(forward_to: Any):
+    """Worker process initializer: send this process's records to the parent's sinks instead"""
+    global _forward_to
+    _forward_to = forward_to
+    setup_logging()
+    # Runs before multiprocessing closes the queue's feeder thread at worker exit (atexit is too late)
+    multiprocessing.util.Finalize(None, shutdown_logging, exitpriority=100)
+
+
+def start_worker_log_relay(records: Any) -> logging.handlers.QueueListener:
+    """Parent side of init_worker_logging: write worker records through this process's sinks"""
+    listener = logging.handlers.QueueListener(records, _Relay())
+    listener.start()
+    return listener
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A child of the `emailbot` logger; it has no sinks until an entry point calls setup_logging"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class Timer:
+    """Milliseconds since creation, for `fields={"ms": timer.ms}`"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    @property
+    def ms(self) -> float:
+        return round((time.perf_counter() - self.start) * 1000, 1)
@@ -0,0 +1,66 @@
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from jinja2 import Environment, StrictUndefined, TemplateError, meta
+
+from agents.utils.models import EmailDetails
+
+
+class MailMergeTemplate:
+    """Subject and body Jinja2 templates, compiled once and rendered per recipient row."""
+
+    def __init__(self, subject: str, body: str, recipient_field: str = "email", attachments_field: str = "attachments"):
+        env = Environment(undefined=StrictUndefined, autoescape=False, keep_trailing_newline=False)
+        self.recipient_field = recipient_field
+        self.attachments_field = attachments_field
+        self.subject_template = env.from_string(subject)
+        self.body_template = env.from_string(body)
+        self.variables: Set[str] = meta.find_undeclared_variables(env.parse(subject)) | meta.find_undeclared_variables(env.parse(body))
+
+    def missing_columns(self, columns: Set[str]) -> List[str]:
+        """Template variables (and the recipient column) that the recipients file does not provide"""
+        required = self.variables | {self.recipient_field}
+        return sorted(required - columns)
+
+    def render(self, row: Dict[str, Any]) -> EmailDetails:
+        attachments = row.get(self.attachments_field)
+        if isinstance(attachments, str):
+            attachments = [a.strip() for a in attachments.split(";") if a.strip()]
+        return EmailDetails(
+            recipient=str(row[self.recipient_field]).strip(),
+            subject=self.subject_template.render(**row).strip(),
+            body=self.body_template.render(**row),
+            attachments=attachments or None,
+            priority=row.get("priority") or "normal",
+        )
+
+    def render_all(self, rows: List[Dict[str, Any]]) -> List[EmailDetails]:
+        """Render every row up front so a bad row fails before anything is sent"""
+        missing = self.missing_columns(set().union(*(row.keys() for row in rows)) if rows else set())
+        if missing:
+            raise ValueError(f"Recipients file is missing columns: {', '.join(missing)}")
+        rendered = []
+        for number, row in enumerate(rows, start=1):
+            try:
+                rendered.append(self.render(row))
+            except (TemplateError, KeyError) as e:
+                raise ValueError(f"Row {number}: {e}") from e
+        return rendered
+
+
+def load_recipients(path: Path) -> List[Dict[str, Any]]:
+    """Read recipient rows from CSV, JSON (a list of objects) or JSON Lines"""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        # newline="" keeps line breaks inside quoted fields; utf-8-sig drops Excel's BOM
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return [dict(row) for row in csv.DictReader(f)]
+    text = Path(path).read_text(encoding="utf-8-sig")
+    if suffix == ".jsonl":
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("JSON recipients file must contain a list of objects")
+    return rows
@@ -1,5 +1,6 @@
+import operator
 from pydantic import BaseModel, Field
-from typing import TypedDict, Optional, List
+from typing import Annotated, Any, Dict, TypedDict, Optional, List
 from enum import Enum
 
 from langchain.schema.messages import BaseMessage
@@ -12,11 +13,26 @@ class DecisionAction(str, Enum):
     FINALIZE = "finalize"
     ERROR = "error"
 
+class PostconditionKind(str, Enum):
+    VISIBLE = "visible"
+    HIDDEN = "hidden"
+    VALUE_EQUALS = "value_equals"
+    DIALOG_CLOSED = "dialog_closed"
+    SENT_TOAST = "sent_toast"
+
+class Postcondition(BaseModel):
+    kind: PostconditionKind = Field(description="visible, hidden, value_equals, dialog_closed or sent_toast")
+    selector: Optional[str] = Field(None, description="Element to check for visible, hidden and value_equals")
+    value: Optional[str] = Field(None, description="Expected value for value_equals")
+
 class PlaywrightAction(BaseModel):
-    type: str = Field(description="Action type: click, fill, type, press, wait, screenshot")
+    type: str = Field(description="Action type: click, fill, type, press, wait, screenshot, upload")
     selector: Optional[str] = Field(None, description="CSS selector for the element")
     value: Optional[str] = Field(None, description="Value for fill, type, press, or wait actions")
     step: Optional[str] = Field(None, description="Step identifier for screenshots")
+    files: Optional[List[str]] = Field(None, description="File paths for upload; defaults to the validated attachments")
+    expect: Optional[Postcondition] = Field(None, description="Expected result, verified with one targeted check instead of a DOM recapture")
+    recapture: bool = Field(False, description="Capture a fresh DOM snapshot after the action even if the expectation holds")
 
 class PlannerDecision(BaseModel):
     action: DecisionAction = Field(description="Action to take")
@@ -31,45 +47,71 @@ class EmailDetails(BaseModel):
     attachments: Optional[List[str]] = None
     priority: Optional[str] = "normal"
 
+class AttachmentHandle(BaseModel):
+    path: str
+    name: str
+    size: int
+    sha256: str
+    mime_type: str
+
 class UserAgentDecision(BaseModel):
     action: DecisionAction
     message: str
+    email_details: Optional[EmailDetails] = Field(None, description="Email details from the conversation, required for 'proceed'")
 
 # --- Main State ---
+# Nodes return only the keys they change. `messages` and `current_plan` are append-only
+# channels (nodes return just the new items), and the DOM snapshot itself lives in the
+# DomStore: the state only carries its hash in `dom_ref`.
 class AgentState(TypedDict):
-    messages: List[BaseMessage]
+    messages: Annotated[List[BaseMessage], operator.add]
     email_details: Optional[EmailDetails]
+    attachment_handles: Optional[List[AttachmentHandle]]
     status: str  # collecting | planning | executing | done | error
     question_to_ask: Optional[str]
-    current_plan: Optional[List[str]]
+    current_plan: Annotated[List[str], operator.add]
+    executed_steps: Annotated[List[Dict[str, Any]], operator.add]  # successful actions, as executed
     current_step: Optional[str]
-    current_dom: Optional[str]
-    current_instruction: Optional[str]
+    dom_ref: Optional[str]
+    current_instruction: Optional[Dict[str, Any]]
     execution_result: Optional[str]
     ready_for_planner: bool
     need_user_input: bool
     done: bool
+    sent_confirmed: bool  # set only when the mail client confirmed the send
     exit_requested: bool
     result: Optional[str]
     error_message: Optional[str]
+    interactive: bool
+    auto_answer: Optional[str]
+    delivery: str  # send | draft (compose and leave it in Drafts)
+    template_plan: bool  # the executed steps become a mail-merge plan; checked before Send
 
 
-class PlannerState(BaseModel):
+class AgentStateModel(BaseModel):
+    """Validated view of AgentState, checked once at the graph edges rather than per step."""
     messages: List[BaseMessage] = Field(default_factory=list)
     email_details: Optional[EmailDetails] = None
+    attachment_handles: Optional[List[AttachmentHandle]] = None
     status: str = Field(..., description="collecting | planning | executing | done | error")
     question_to_ask: Optional[str] = None
-    current_plan: Optional[List[str]] = Field(default_factory=list)
+    current_plan: List[str] = Field(default_factory=list)
+    executed_steps: List[Dict[str, Any]] = Field(default_factory=list)
     current_step: Optional[str] = None
-    current_dom: Optional[str] = None
-    current_instruction: Optional[str] = None
+    dom_ref: Optional[str] = None
+    current_instruction: Optional[Dict[str, Any]] = None
     execution_result: Optional[str] = None
     ready_for_planner: bool = Field(default=False)
     need_user_input: bool = Field(default=False)
     done: bool = Field(default=False)
+    sent_confirmed: bool = Field(default=False)
     exit_requested: bool = Field(default=False)
     result: Optional[str] = None
     error_message: Optional[str] = None
+    interactive: bool = Field(default=True)
+    auto_answer: Optional[str] = None
+    delivery: str = Field(default="send", description="send | draft")
+    template_plan: bool = Field(default=False)
 
     class Config:
         arbitrary_types_allowed = True  # needed for BaseMessage objects
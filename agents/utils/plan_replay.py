@@ -0,0 +1,133 @@
+from typing import Any, Dict, List, Optional
+
+from agents.utils.models import AttachmentHandle, EmailDetails
+
+TEMPLATE_FIELDS = ("recipient", "subject", "body")
+
+
+def _placeholder(field: str) -> str:
+    return "{{ %s }}" % field
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _field_for(text: Optional[str], details: EmailDetails) -> Optional[str]:
+    """The field a typed value stands for: only an exact (whitespace-normalized) match counts"""
+    if not isinstance(text, str) or not text.strip():
+        return None
+    for field in TEMPLATE_FIELDS:
+        value = getattr(details, field)
+        if value and _normalize(text) == _normalize(value):
+            return field
+    return None
+
+
+def _leftover_literals(step: Dict[str, Any], details: EmailDetails) -> List[str]:
+    """
+    Planning-row values still present in what a templatized step types (they would go to every
+    recipient). Selectors only locate elements, so "Report" in `[aria-label='Report spam']` is fine.
+    """
+    texts = [step.get("value")]
+    if step.get("expect"):
+        texts.append(step["expect"].get("value"))
+    found = []
+    for field in TEMPLATE_FIELDS:
+        value = (getattr(details, field) or "").strip()
+        if len(value) >= 3 and any(isinstance(t, str) and value in t for t in texts):
+            found.append(field)
+    return found
+
+
+def templatize_steps(steps: List[Dict[str, Any]], details: EmailDetails) -> List[Dict[str, Any]]:
+    """
+    Turn the executed steps of one send into a reusable plan with per-email placeholders.
+
+    A fill/type value, or a value_equals expectation, becomes a placeholder only when it is
+    exactly the planning email's recipient, subject or body; replaying then enters the rendered
+    value for each email. Raises ValueError when a recipient, subject or body field was never
+    entered verbatim or a planning-row value is left in a typed or expected value.
+    """
+    template = []
+    placed = set()
+    for index, step in enumerate(steps, start=1):
+        step = dict(step)
+        if step.get("type") in ("fill", "type"):
+            field = _field_for(step.get("value"), details)
+            if field:
+                step["value"] = _placeholder(field)
+                placed.add(field)
+        if step.get("expect"):
+            expect = dict(step["expect"])
+            field = _field_for(expect.get("value"), details)
+            if field:
+                expect["value"] = _placeholder(field)
+            step["expect"] = expect
+        if step.get("type") == "upload":
+            step["files"] = None  # filled from each email's own attachments
+        leftover = _leftover_literals(step, details)
+        if leftover:
+            raise ValueError(
+                f"Step {index} ({step.get('type')}) contains the planning email's {', '.join(leftover)} "
+                "in a form that cannot be templatized; it would be sent to every recipient"
+            )
+        template.append(step)
+    missing = [f for f in TEMPLATE_FIELDS if getattr(details, f) and f not in placed]
+    if missing:
+        raise ValueError(f"The planned send never entered the {', '.join(missing)} verbatim; the plan cannot be reused")
+    return template
+
+
+def _fill(text: Optional[str], details: EmailDetails) -> Optional[str]:
+    if not isinstance(text, str):
+        return text
+    for field in TEMPLATE_FIELDS:
+        text = text.replace(_placeholder(field), getattr(details, field) or "")
+    return text
+
+
+def render_steps(template: List[Dict[str, Any]], details: EmailDetails, handles: List[AttachmentHandle]) -> List[Dict[str, Any]]:
+    """Concrete steps for one email from a templatized plan"""
+    steps = []
+    for step in template:
+        step = dict(step)
+        if step.get("type") == "upload":
+            if not handles:
+                continue
+            step["files"] = [h.path for h in handles]
+        step["value"] = _fill(step.get("value"), details)
+        step["selector"] = _fill(step.get("selector"), details)
+        if step.get("expect"):
+            expect = dict(step["expect"])
+            expect["value"] = _fill(expect.get("value"), details)
+            expect["selector"] = _fill(expect.get("selector"), details)
+            step["expect"] = expect
+        steps.append(step)
+    return steps
+
+
+async def replay_steps(executor, steps: List[Dict[str, Any]], send: bool = True) -> Dict[str, Any]:
+    """
+    Execute a concrete plan without the planner; stops at the first failed action or postcondition.
+
+    With `send=False` the plan only composes (draft staging): it stops before any send step and
+    succeeds with `error` None.
+    """
+    for index, step in enumerate(steps, start=1):
+        if not send and executor.is_send(step):
+            return {"sent": False, "steps": index - 1, "error": None}
+        result = await executor.execute_action(step)
+        if not result["success"]:
+            return {"sent": False, "steps": index, "error": f"Step {index} ({step.get('type')}) failed: {result['error']}"}
+        if executor.is_send(step):
+            if await executor.confirm_sent():
+                return {"sent": True, "steps": index, "error": None}
+            return {"sent": False, "steps": index, "error": "Send was not confirmed by the mail client"}
+        if step.get("expect"):
+            holds, description = await executor.check_postcondition(step["expect"])
+            if not holds:
+                return {"sent": False, "steps": index, "error": f"Step {index}: expected {description} did not hold"}
+    if not send:
+        return {"sent": False, "steps": len(steps), "error": None}
+    return {"sent": False, "steps": len(steps), "error": "Plan finished without a confirmed send"}
@@ -38,17 +38,27 @@ Your role is to generate precise, step-by-step instructions for the Playwright A
 to execute in order to send an email based on the provided objective.
 
 Current Objective (Email Details): {objective}
-Current DOM Snapshot: {current_dom}
+Validated Attachments: {attachments}
+Current Page (summary and the most relevant elements, ranked): {current_dom}
 Previous Steps Taken: {previous_steps}
+Delivery: {delivery}
 
 Responsibilities:
 1. Analyze the current DOM to understand the state of the email composition interface (e.g., Gmail, Outlook web, etc.).
 2. Determine the next single actionable step needed to progress towards sending the email.
 3. Generate a structured Playwright action with:
-   - type: One of 'click', 'fill', 'type', 'press', 'wait', 'screenshot'
-   - selector: CSS selector for the target element (use DOM snapshot to identify)
+   - type: One of 'click', 'fill', 'type', 'press', 'wait', 'screenshot', 'upload'
+   - selector: CSS selector for the target element (copy it from the candidates above)
    - value: Value for fill, type, press, or wait actions
    - step: Optional identifier for screenshots
+   - expect: Optional expected result, checked with one quick query. A verified value_equals after fill/type
+     needs no new DOM snapshot; the other kinds are followed by one:
+     {{"kind": "visible" | "hidden", "selector": "..."}}, {{"kind": "value_equals", "selector": "...", "value": "..."}},
+     {{"kind": "dialog_closed"}} or {{"kind": "sent_toast"}} (use sent_toast on the Send click).
+   - recapture: true to see a fresh snapshot even after a verified value_equals.
+     After such a step, the DOM snapshot above may predate the latest typed values.
+   For attachments use a single 'upload' action (selector: the file input or the Attach button);
+   all validated attachments are uploaded together, so never click through file dialogs.
 4. Possible actions:
    - 'proceed': Provide a Playwright action to execute (e.g., {{"type": "click", "selector": "[aria-label='Compose']"}}).
    - 'ask_user': If critical information is missing or DOM is ambiguous.
@@ -58,9 +68,9 @@ Responsibilities:
 
 Constraints:
 - Generate ONLY one step per invocation.
-- Instructions for 'proceed' must include precise selectors from DOM.
+- Instructions for 'proceed' must include precise selectors from the candidates.
 - Escape quotes in strings with \\" and newlines with \\n.
-- If task complete, use 'finalize' with message confirming success.
+- If task complete, use 'finalize' with message confirming success. A confirmed send ends the task automatically.
 """
 
 playwright_prompt="""
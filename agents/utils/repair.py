@@ -0,0 +1,207 @@
+"""
+Local repair of malformed structured LLM output.
+
+The planner and user-agent prompts ask the model to escape quotes and newlines, and it
+regularly fails to. Most of those failures are mechanical: unescaped quotes, raw newlines,
+text around the JSON, enum values in the wrong case, trailing commas or a missing optional
+field. Fixing them here is far cheaper than another model round trip.
+
+Output that was cut off (max_tokens) or lacks a required field is never completed here: a
+truncated PROCEED would otherwise type and send a truncated body. Those fail and escalate.
+"""
+import json
+import typing
+from enum import Enum
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+# Wrapper keys some models put around the actual arguments
+_WRAPPER_KEYS = ("arguments", "parameters", "properties", "args", "input")
+
+
+def _next_significant(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def _is_closing_quote(text: str, i: int) -> bool:
+    """Decide whether the quote at text[i], seen inside a string, actually ends that string"""
+    j = _next_significant(text, i + 1)
+    if j >= len(text) or text[j] in "}]:":
+        return True
+    if text[j] == ",":
+        k = _next_significant(text, j + 1)
+        return k >= len(text) or text[k] in '"{[}]-0123456789' or text.startswith(("true", "false", "null"), k)
+    return False
+
+
+def repair_json_text(text: str) -> Any:
+    """Best-effort conversion of almost-JSON text into a Python object; raises ValueError if hopeless"""
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("No JSON object found in model output")
+    text = text[start:]
+
+    # Fast path: valid JSON, possibly followed by trailing text
+    try:
+        return json.JSONDecoder().raw_decode(text)[0]
+    except json.JSONDecodeError:
+        pass
+
+    out = []
+    stack = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            if c == "\\" and i + 1 < len(text):
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == '"':
+                if _is_closing_quote(text, i):
+                    in_string = False
+                    out.append(c)
+                else:
+                    out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\r":
+                out.append("\\r")
+            elif c == "\t":
+                out.append("\\t")
+            else:
+                out.append(c)
+        else:
+            if c == '"':
+                in_string = True
+            elif c in "{[":
+                stack.append("}" if c == "{" else "]")
+            elif c in "}]":
+                if not stack:
+                    break
+                stack.pop()
+                out.append(c)
+                if not stack:
+                    break  # anything after the outermost object is trailing text
+                i += 1
+                continue
+            elif c == ",":
+                j = _next_significant(text, i + 1)
+                if j < len(text) and text[j] in "}]":
+                    i += 1
+                    continue  # trailing comma
+            out.append(c)
+        i += 1
+
+    # A truncated response is not guessed at: the missing part may be half of the email body
+    if in_string or stack:
+        raise ValueError("Model output is truncated (unterminated string or object)")
+
+    repaired = "".join(out)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Could not repair model output: {e}") from e
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _normalize_enum(value: Any, enum_cls: Type[Enum]) -> Any:
+    if not isinstance(value, str):
+        return value
+    wanted = value.strip().lower().replace("-", "_").replace(" ", "_")
+    for member in enum_cls:
+        if wanted in (str(member.value).lower(), member.name.lower()):
+            return member.value
+    return value
+
+
+def normalize_for_model(data: Any, model_cls: Type[BaseModel]) -> Any:
+    """Coerce near-miss data (wrappers, enum case, 'null' strings, missing optional fields) towards model_cls"""
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        return data
+
+    fields = model_cls.model_fields
+    # {"PlannerDecision": {...}} or {"arguments": {...}}
+    if len(data) == 1:
+        (key, inner), = data.items()
+        if key not in fields and isinstance(inner, dict) and (key == model_cls.__name__ or key in _WRAPPER_KEYS):
+            data = inner
+
+    normalized: Dict[str, Any] = {}
+    lowered = {name.lower(): name for name in fields}
+    for key, value in data.items():
+        name = key if key in fields else lowered.get(key.lower())
+        if name is None:
+            continue  # unknown keys would only trip strict validation
+        if isinstance(value, str) and value.strip().lower() in ("null", "none") and not fields[name].is_required():
+            value = None
+        annotation = _unwrap_optional(fields[name].annotation)
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            value = _normalize_enum(value, annotation)
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            if isinstance(value, str):
+                try:
+                    value = repair_json_text(value)
+                except ValueError:
+                    pass
+            value = normalize_for_model(value, annotation)
+        normalized[name] = value
+
+    for name, field in fields.items():
+        if name in normalized or not field.is_required():
+            continue
+        # A missing required value (e.g. `message`) is left to fail validation
+        if _unwrap_optional(field.annotation) is not field.annotation:
+            normalized[name] = None
+    return normalized
+
+
+def parse_structured(candidate: Any, model_cls: Type[BaseModel]) -> BaseModel:
+    """Repair, normalize and validate a raw candidate; raises ValueError/ValidationError on failure"""
+    data = repair_json_text(candidate) if isinstance(candidate, str) else candidate
+    return model_cls.model_validate(normalize_for_model(data, model_cls))
+
+
+def extract_candidate(raw: Any = None, error: Optional[BaseException] = None) -> Any:
+    """Pull the model's raw structured output out of an AIMessage or a provider error"""
+    if raw is not None:
+        for call in getattr(raw, "tool_calls", None) or []:
+            if call.get("args"):
+                return call["args"]
+        for call in getattr(raw, "invalid_tool_calls", None) or []:
+            if call.get("args"):
+                return call["args"]
+        content = getattr(raw, "content", None)
+        if isinstance(content, str) and content.strip():
+            return content
+    # Groq rejects bad tool calls server-side and returns the text in `failed_generation`
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        failed = (body.get("error") or body).get("failed_generation")
+        if failed:
+            return failed
+    return None
+
+
+def try_repair(model_cls: Type[BaseModel], raw: Any = None, error: Optional[BaseException] = None):
+    """Return (parsed, None) on a successful local repair, else (None, the reason it failed)"""
+    candidate = extract_candidate(raw, error)
+    if candidate is None:
+        return None, error or ValueError("No model output to repair")
+    try:
+        return parse_structured(candidate, model_cls), None
+    except (ValueError, ValidationError) as e:
+        return None, e
@@ -0,0 +1,211 @@
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import groq
+from langchain.schema.messages import BaseMessage, HumanMessage
+from langchain_groq import ChatGroq
+from pydantic import BaseModel, ValidationError
+from rich.console import Console
+from rich.table import Table
+
+from agents.utils.repair import try_repair
+
+console = Console()
+
+
+@dataclass
+class ModelRoute:
+    model: str
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    escalate_to: Optional[str] = None  # route to retry on when the output fails validation
+
+
+# Triage and extraction are short, schema-bound calls: a small fast model is enough, and
+# low temperatures keep structured output valid. Failures escalate to a larger model.
+DEFAULT_ROUTES: Dict[str, ModelRoute] = {
+    "triage": ModelRoute("llama-3.1-8b-instant", temperature=0.0, max_tokens=512, escalate_to="planner"),
+    "extraction": ModelRoute("llama-3.1-8b-instant", temperature=0.0, max_tokens=1024, escalate_to="planner"),
+    "planner": ModelRoute("openai/gpt-oss-20b", temperature=0.2, max_tokens=2048, escalate_to="escalation"),
+    "escalation": ModelRoute("openai/gpt-oss-120b", temperature=0.2, max_tokens=4096),
+}
+
+# Estimated USD per million (input, output) tokens, used for the cost column only
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "openai/gpt-oss-20b": (0.10, 0.50),
+    "openai/gpt-oss-120b": (0.15, 0.75),
+}
+
+
+@dataclass
+class RouteStats:
+    calls: int = 0
+    failures: int = 0
+    escalations: int = 0
+    repairs: int = 0
+    latency: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    models: Dict[str, int] = field(default_factory=dict)
+
+
+# Groq rejects a generation that does not match the tool/JSON schema with a 400 and one of these codes
+OUTPUT_ERROR_CODES = ("tool_use_failed", "json_validate_failed")
+
+
+def is_output_error(error: Exception) -> bool:
+    """
+    True when the model answered but its output did not parse or validate.
+
+    Only these are worth a repair or a bigger model. Transport failures (network, 429, auth,
+    5xx) are not; ChatGroq already retries those with backoff, so they are re-raised.
+    """
+    if isinstance(error, (ValidationError, ValueError)):  # includes OutputParserException and JSON errors
+        return True
+    if isinstance(error, groq.BadRequestError):
+        body = error.body if isinstance(error.body, dict) else {}
+        details = body.get("error", body)
+        code = details.get("code") if isinstance(details, dict) else None
+        return code in OUTPUT_ERROR_CODES or any(c in str(error) for c in OUTPUT_ERROR_CODES)
+    return False
+
+
+class StructuredOutputError(Exception):
+    """Raised when a route (and its escalation chain) could not produce a valid structured output."""
+
+
+class ModelRouter:
+    """Routes each node's LLM calls to its own model settings and keeps per-route stats."""
+
+    def __init__(self, routes: Dict[str, ModelRoute], api_key: Optional[str] = None):
+        self.routes = routes
+        self.api_key = api_key
+        self.stats: Dict[str, RouteStats] = {name: RouteStats() for name in routes}
+        self._llms: Dict[str, ChatGroq] = {}
+        self._structured: Dict[Tuple[str, Type[BaseModel]], Any] = {}
+
+    def llm(self, route: str) -> ChatGroq:
+        if route not in self._llms:
+            config = self.routes[route]
+            self._llms[route] = ChatGroq(
+                model=config.model,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                api_key=self.api_key,
+            )
+        return self._llms[route]
+
+    def structured(self, route: str, schema: Type[BaseModel]):
+        """Structured-output runnable for (route, schema), built once and reused"""
+        key = (route, schema)
+        if key not in self._structured:
+            self._structured[key] = self.llm(route).with_structured_output(schema, include_raw=True)
+        return self._structured[key]
+
+    def prepare(self, bindings: List[Tuple[str, Type[BaseModel]]]):
+        """Build the structured-output runnables for known (route, schema) pairs ahead of the first call"""
+        for route, schema in bindings:
+            self.structured(route, schema)
+
+    def _record(self, route: str, raw: Any, elapsed: float, failed: bool):
+        stats = self.stats[route]
+        model = self.routes[route].model
+        stats.calls += 1
+        stats.failures += int(failed)
+        stats.latency += elapsed
+        stats.models[model] = stats.models.get(model, 0) + 1
+        usage = getattr(raw, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        stats.input_tokens += input_tokens
+        stats.output_tokens += output_tokens
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        stats.cost += (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+    async def ainvoke_structured(self, route: str, schema: Type[BaseModel], messages: List[BaseMessage]):
+        """
+        Invoke a route with structured output.
+
+        Malformed output is first repaired locally. Only if that fails is the escalation route
+        called, with the specific validation error appended so the model can correct itself.
+        Transport errors (see is_output_error) are recorded and re-raised without escalating.
+        """
+        current = route
+        last_error: Optional[Exception] = None
+        while current:
+            start = time.perf_counter()
+            raw = None
+            error: Optional[Exception] = None
+            try:
+                result = await self.structured(current, schema).ainvoke(messages)
+                raw = result.get("raw")
+                if result.get("parsed") is not None:
+                    self._record(current, raw, time.perf_counter() - start, failed=False)
+                    return result["parsed"]
+                error = result.get("parsing_error") or ValueError("Model returned no structured output")
+            except Exception as e:
+                if not is_output_error(e):
+                    self._record(current, None, time.perf_counter() - start, failed=True)
+                    raise
+                error = e
+
+            repaired, last_error = try_repair(schema, raw=raw, error=error)
+            self._record(current, raw, time.perf_counter() - start, failed=repaired is None)
+            if repaired is not None:
+                self.stats[current].repairs += 1
+                return repaired
+
+            next_route = self.routes[current].escalate_to
+            if next_route:
+                self.stats[route].escalations += 1
+                console.print(f"⚠️ {current} output failed validation ({last_error}); escalating to {next_route}", style="yellow")
+                messages = list(messages) + [HumanMessage(
+                    content=f"Your previous response was not valid {schema.__name__} output: {last_error}. "
+                            f"Respond again with only valid {schema.__name__} output."
+                )]
+            current = next_route
+        raise StructuredOutputError(f"{route}: {last_error}") from last_error
+
+    def total_tokens(self) -> int:
+        return sum(s.input_tokens + s.output_tokens for s in self.stats.values())
+
+    def report(self):
+        """Print per-route latency, token and estimated cost stats"""
+        table = Table(title="LLM routes")
+        for column in ("Route", "Models", "Calls", "Failures", "Repairs", "Escalations", "Avg latency", "Tokens in/out", "Est. cost"):
+            table.add_column(column)
+        for name, stats in self.stats.items():
+            if not stats.calls:
+                continue
+            table.add_row(
+                name,
+                ", ".join(stats.models),
+                str(stats.calls),
+                str(stats.failures),
+                str(stats.repairs),
+                str(stats.escalations),
+                f"{stats.latency / stats.calls:.2f}s",
+                f"{stats.input_tokens}/{stats.output_tokens}",
+                f"${stats.cost:.5f}",
+            )
+        console.print(table)
+
+
+def routes_from_env(get_value, base: Dict[str, ModelRoute] = DEFAULT_ROUTES) -> Dict[str, ModelRoute]:
+    """Apply EMAILBOT_<ROUTE>_MODEL / _TEMPERATURE / _MAX_TOKENS overrides to the default routes"""
+    routes = {}
+    for name, route in base.items():
+        prefix = f"EMAILBOT_{name.upper()}_"
+        model = get_value(prefix + "MODEL")
+        temperature = get_value(prefix + "TEMPERATURE")
+        max_tokens = get_value(prefix + "MAX_TOKENS")
+        routes[name] = replace(
+            route,
+            model=model or route.model,
+            temperature=float(temperature) if temperature else route.temperature,
+            max_tokens=int(max_tokens) if max_tokens else route.max_tokens,
+        )
+    return routes
@@ -0,0 +1,159 @@
+import difflib
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from agents.utils.initializer import get_dotenv_value
+
+# Actions that target an element and would otherwise wait out the locator timeout
+VALIDATED_ACTIONS = ("click", "fill", "type", "upload")
+
+# An element that is being rendered (e.g. the compose dialog opening) gets this long to attach;
+# every selector that really is wrong pays it, so it stays short (EMAILBOT_SELECTOR_GRACE_MS)
+ATTACH_GRACE_MS = 200
+
+_PAIRS = {"]": "[", ")": "("}
+_QUOTED_RE = re.compile(r"""['"]([^'"]+)['"]""")
+# Playwright engines whose unquoted body is matched literally, so quotes and brackets in it are just text
+_RAW_ENGINE_RE = re.compile(r"""^\s*(?:text|id|data-testid|data-test-id|data-test)=(?!\s*['"])""")
+
+
+def syntax_error(selector: Optional[str]) -> Optional[str]:
+    """Cheap local check for selectors that can never match: empty, unbalanced brackets or quotes"""
+    if not selector or not selector.strip():
+        return "selector is empty"
+    for part in _chain_parts(selector):
+        if not _RAW_ENGINE_RE.match(part):
+            error = _part_syntax_error(part)
+            if error:
+                return error
+    return None
+
+
+def _chain_parts(selector: str) -> List[str]:
+    """Split a `a >> b` chain at the `>>` separators that are outside quotes"""
+    parts, start, quote, index = [], 0, None, 0
+    while index < len(selector):
+        char = selector[index]
+        if quote:
+            if char == "\\":
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif selector.startswith(">>", index):
+            parts.append(selector[start:index])
+            start = index + 2
+            index += 1
+        index += 1
+    return parts + [selector[start:]]
+
+
+def _part_syntax_error(selector: str) -> Optional[str]:
+    stack: List[str] = []
+    quote: Optional[str] = None
+    escaped = False
+    for char in selector:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char in ("[", "("):
+            stack.append(char)
+        elif char in _PAIRS:
+            if not stack or stack.pop() != _PAIRS[char]:
+                return f"unbalanced '{char}'"
+    if quote:
+        return f"unterminated {quote} quote"
+    if stack:
+        return f"unclosed '{stack[-1]}'"
+    return None
+
+
+@dataclass
+class SelectorCheck:
+    valid: bool
+    reason: str = ""
+    suggestion: Optional[str] = None
+    matches: int = 0
+
+    def error(self, selector: str) -> str:
+        message = f"Selector {selector!r} rejected: {self.reason}"
+        if self.suggestion:
+            message += f". Did you mean {self.suggestion!r}?"
+        return message
+
+
+class SelectorValidator:
+    """
+    Rejects planner selectors before they reach a 5-second locator timeout.
+
+    Checks run cheapest first: local syntax, then one non-waiting `locator.count()` in the
+    page and, only on a miss, a short bounded wait for the element to attach. Failures carry
+    the closest known selector.
+    """
+
+    def __init__(self, attach_grace_ms: int = ATTACH_GRACE_MS):
+        self.attach_grace_ms = attach_grace_ms  # 0 rejects on the first miss
+        self.known: List[str] = []
+        self.labels: Dict[str, str] = {}  # lowercased text / aria-label -> selector
+
+    @classmethod
+    def from_env(cls) -> "SelectorValidator":
+        return cls(int(get_dotenv_value("EMAILBOT_SELECTOR_GRACE_MS") or ATTACH_GRACE_MS))
+
+    def update(self, snapshot: Dict[str, Any]):
+        """Remember the selectors (and their labels) from the latest DOM snapshot"""
+        self.known = []
+        self.labels = {}
+        for element in snapshot.get("input_fields", []) + snapshot.get("clickable_elements", []) + snapshot.get("buttons", []):
+            selector = element.get("selector")
+            if not selector:
+                continue
+            if selector not in self.known:
+                self.known.append(selector)
+            for label in (element.get("aria_label"), element.get("text"), element.get("placeholder")):
+                if label:
+                    self.labels.setdefault(label.strip().lower(), selector)
+
+    def suggest(self, selector: str) -> Optional[str]:
+        """Nearest snapshot selector, by quoted label first and then by string similarity"""
+        for quoted in _QUOTED_RE.findall(selector or ""):
+            quoted = quoted.strip().lower()
+            if quoted in self.labels:
+                return self.labels[quoted]
+            close = difflib.get_close_matches(quoted, list(self.labels), n=1, cutoff=0.6)
+            if close:
+                return self.labels[close[0]]
+        close = difflib.get_close_matches(selector or "", self.known, n=1, cutoff=0.5)
+        return close[0] if close else None
+
+    async def validate(self, page, selector: str) -> SelectorCheck:
+        error = syntax_error(selector)
+        if error:
+            return SelectorCheck(False, f"invalid syntax ({error})", self.suggest(selector))
+        try:
+            # count() does not auto-wait, so a miss costs one round trip instead of a timeout
+            matches = await page.locator(selector).count()
+        except Exception as e:
+            reason = str(e).splitlines()[0] if str(e) else type(e).__name__
+            return SelectorCheck(False, f"invalid selector ({reason})", self.suggest(selector))
+        if matches == 0 and self.attach_grace_ms > 0:
+            try:
+                # It may still be rendering; wait briefly rather than the full action timeout
+                await page.locator(selector).first.wait_for(state="attached", timeout=self.attach_grace_ms)
+                matches = await page.locator(selector).count()
+            except Exception:
+                matches = 0
+        if matches == 0:
+            reason = f"no element matches on the page within {self.attach_grace_ms} ms"
+            if self.known and selector not in self.known:
+                reason += " and it is not in the latest snapshot"
+            return SelectorCheck(False, reason, self.suggest(selector))
+        return SelectorCheck(True, matches=matches)
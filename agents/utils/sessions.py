@@ -0,0 +1,199 @@
+import contextlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Cookies that carry the login; if these are gone or expired the mailbox shows a sign-in page
+AUTH_COOKIES = {
+    "gmail": ("SID", "HSID", "SSID", "APISID", "SAPISID", "__Secure-1PSID", "__Secure-3PSID"),
+    "outlook": ("ESTSAUTH", "ESTSAUTHPERSISTENT", "RPSSecAuth", "MSPAuth", "MSPProf", "__Host-MSAAUTH"),
+}
+# The long-lived subset: short-lived ones (e.g. RPSSecAuth) are refreshed from these, so they decide expiry
+LOGIN_COOKIES = {
+    "gmail": ("SID", "__Secure-1PSID", "__Secure-3PSID"),
+    "outlook": ("ESTSAUTHPERSISTENT", "MSPAuth", "__Host-MSAAUTH"),
+}
+NEAR_EXPIRY_SECONDS = 3 * 24 * 3600
+
+SESSIONS_DIR = Path("sessions")
+
+
+def session_path(provider: str, account: Optional[str] = None, root: Path = SESSIONS_DIR) -> Path:
+    """Storage state file for a provider, one per account when several are used"""
+    if account:
+        return root / f"{provider}_{account}_auth.json"
+    return root / f"{provider}_auth.json"
+
+
+def parse_session_name(path: Path) -> Tuple[str, Optional[str]]:
+    """(provider, account) from a session file name written by session_path"""
+    stem = path.name[: -len("_auth.json")] if path.name.endswith("_auth.json") else path.stem
+    provider, _, account = stem.partition("_")
+    return provider, account or None
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on `<path>.lock`, so concurrent writers of one session queue up"""
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as handle:
+        if os.name == "nt":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_json(path: Path, data: Any, indent: Optional[int] = None):
+    """Write JSON to a temp file in the same directory and rename it over `path`"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+@dataclass
+class SessionStatus:
+    provider: str
+    account: Optional[str]
+    path: Path
+    state: str  # ok | expiring | expired | missing | invalid
+    reason: str = ""
+    expires_at: Optional[float] = None
+    auth_cookies: int = 0
+
+    @property
+    def usable(self) -> bool:
+        return self.state in ("ok", "expiring")
+
+
+class SessionRegistry:
+    """
+    Parses each storage_state file once and answers validity questions offline.
+
+    Entries are keyed by path and re-read only when the file's mtime or size changes.
+    Writes go through a lock file and an atomic rename, and are skipped when nothing changed.
+    """
+
+    def __init__(self, near_expiry_seconds: float = NEAR_EXPIRY_SECONDS):
+        self.near_expiry_seconds = near_expiry_seconds
+        self._cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+    def load(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Cached storage state, None if the file is missing; ValueError if it is not a storage state"""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._cache.pop(path, None)
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"not valid JSON ({e})") from e
+        if not isinstance(state, dict) or not isinstance(state.get("cookies"), list):
+            raise ValueError("Invalid storage state format")
+        self._cache[path] = (key, state)
+        return state
+
+    def status(self, provider: str, account: Optional[str] = None, path: Optional[Path] = None, now: Optional[float] = None) -> SessionStatus:
+        path = Path(path) if path else session_path(provider, account)
+        try:
+            state = self.load(path)
+        except ValueError as e:
+            return SessionStatus(provider, account, path, "invalid", str(e))
+        if state is None:
+            return SessionStatus(provider, account, path, "missing", "no session file")
+
+        names = AUTH_COOKIES.get(provider)
+        if names is None:
+            return SessionStatus(provider, account, path, "ok", "no auth cookie rules for this provider")
+        auth = [c for c in state["cookies"] if c.get("name") in names]
+        if not auth:
+            return SessionStatus(provider, account, path, "invalid", "no login cookies (signed out when saved?)")
+
+        now = time.time() if now is None else now
+        # The login lasts as long as its longest-lived cookie; session cookies (expires -1) last as long as the saved state
+        login = [c for c in auth if c.get("name") in LOGIN_COOKIES.get(provider, ())] or auth
+        expiries = [c.get("expires") for c in login]
+        if all(isinstance(e, (int, float)) and e > 0 for e in expiries):
+            expires_at = max(expiries)
+        else:
+            expires_at = None
+        if expires_at is not None and expires_at <= now:
+            expired = sorted({c["name"] for c in login})
+            return SessionStatus(provider, account, path, "expired", f"{', '.join(expired)} expired", expires_at, len(auth))
+        if expires_at is not None and expires_at - now < self.near_expiry_seconds:
+            hours = (expires_at - now) / 3600
+            return SessionStatus(provider, account, path, "expiring", f"login cookies expire in {hours:.0f}h", expires_at, len(auth))
+        return SessionStatus(provider, account, path, "ok", "", expires_at, len(auth))
+
+    def all_statuses(self, providers: List[str], root: Path = SESSIONS_DIR) -> List[SessionStatus]:
+        """Status of every saved session, plus 'missing' for providers with no default session"""
+        found = {}
+        for path in sorted(Path(root).glob("*_auth.json")):
+            provider, account = parse_session_name(path)
+            found[(provider, account)] = self.status(provider, account, path)
+        for provider in providers:
+            found.setdefault((provider, None), self.status(provider, None, session_path(provider, root=root)))
+        return list(found.values())
+
+    def save(self, path: Path, state: Dict[str, Any], indent: Optional[int] = None) -> bool:
+        """Atomically replace a session under its lock; returns False when the state is unchanged"""
+        path = Path(path)
+        with file_lock(path):
+            try:
+                if self.load(path) == state:
+                    return False
+            except ValueError:
+                pass
+            atomic_write_json(path, state, indent=indent)
+            stat = path.stat()
+            self._cache[path] = ((stat.st_mtime_ns, stat.st_size), state)
+        return True
+
+    def delete(self, path: Path):
+        path = Path(path)
+        with file_lock(path):
+            path.unlink(missing_ok=True)
+        self._cache.pop(path, None)
+
+
+_registry: Optional[SessionRegistry] = None
+
+
+def get_session_registry() -> SessionRegistry:
+    global _registry
+    if _registry is None:
+        _registry = SessionRegistry()
+    return _registry
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema.messages import AIMessage, BaseMessage
+
+from agents.utils.log import get_logger
+from agents.utils.tools import describe_action, is_send_action, keeps_snapshot, postcondition_description
+
+logger = get_logger("speculation")
+
+# Builds the planner call for a predicted state: (inputs fingerprint, the LLM call), or None
+PlannerCall = Callable[[Dict[str, Any]], Optional[Tuple[str, Awaitable[Any]]]]
+
+
+def speculation_enabled(get_value) -> bool:
+    return (get_value("EMAILBOT_SPECULATE") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def inputs_fingerprint(route: str, messages: List[BaseMessage]) -> str:
+    """Identity of one planner call: the route plus every message it sends"""
+    data = json.dumps([route] + [[m.type, m.content] for m in messages], default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def predict_after_action(state: Dict[str, Any], instruction: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The state the planner will see if `instruction` succeeds and its postcondition holds.
+
+    Only for steps that skip the DOM recapture (keeps_snapshot): then the snapshot is unchanged
+    and the step adds one predictable message. Sends end the run, so there is nothing to plan after them.
+    """
+    postcondition = instruction.get("expect") or {}
+    if hasattr(postcondition, "model_dump"):
+        postcondition = postcondition.model_dump()
+    if not keeps_snapshot(instruction) or is_send_action(instruction):
+        return None
+    action = describe_action(instruction)
+    if action is None:
+        return None
+    summary = f"Executed: {action}; verified {postcondition_description(postcondition)}"
+    return {
+        **state,
+        "messages": list(state["messages"]) + [AIMessage(content=summary)],
+        "executed_steps": list(state.get("executed_steps") or []) + [instruction],
+        "current_instruction": None,
+        "status": "planning",
+    }
+
+
+class Speculator:
+    """
+    Runs the next planner call while the current action executes.
+
+    The playwright node starts the call on the predicted post-action state; the planner node
+    takes the result only when the fingerprint of its real inputs matches, and otherwise
+    cancels it and plans as usual. Misses cost tokens, never correctness.
+    """
+
+    def __init__(self, planner_call: PlannerCall):
+        self.planner_call = planner_call
+        self._task: Optional[asyncio.Task] = None
+        self._fingerprint: Optional[str] = None
+        self._started = 0.0
+        self._finished: Optional[float] = None
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def speculate(self, predicted_state: Optional[Dict[str, Any]]):
+        self.discard()
+        if predicted_state is None:
+            return
+        call = self.planner_call(predicted_state)
+        if call is None:
+            return
+        self._fingerprint, coroutine = call
+        self._started, self._finished = time.perf_counter(), None
+        self._task = asyncio.ensure_future(coroutine)
+        self._task.add_done_callback(self._mark_finished)
+        self.launched += 1
+
+    def _mark_finished(self, task: asyncio.Task):
+        self._finished = time.perf_counter()
+        if not task.cancelled():
+            task.exception()  # retrieved here so a discarded failure is not reported as unhandled
+
+    async def take(self, fingerprint: str) -> Optional[Any]:
+        """The speculative result if it was computed from exactly these inputs, else None"""
+        task = self._task
+        if task is None:
+            return None
+        self._task = None
+        if fingerprint != self._fingerprint:
+            task.cancel()
+            self.misses += 1
+            logger.debug("Speculative planner call discarded: inputs differ from the prediction")
+            return None
+        asked = time.perf_counter()
+        try:
+            result = await task
+        except Exception as e:
+            self.misses += 1
+            logger.warning("Speculative planner call failed: %s", e)
+            return None
+        # Time the call had already been running (or its whole duration) when the planner needed it
+        saved = min(asked, self._finished or asked) - self._started
+        self.hits += 1
+        self.saved_seconds += saved
+        logger.debug("Speculative planner call hit, saved %.2fs", saved, extra={"fields": {"saved_seconds": round(saved, 3)}})
+        return result
+
+    def discard(self):
+        """Cancel a pending call whose prediction can no longer come true (failed action, send)"""
+        if self._task is not None:
+            if not self._task.done():
+                self._task.cancel()
+            self._task = None
+            self.misses += 1
+
+    def summary(self) -> Dict[str, Any]:
+        decided = self.hits + self.misses
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / decided, 2) if decided else None,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
@@ -0,0 +1,93 @@
+from agents.utils.budget import ESCALATIONS, BudgetLimits, RunBudget
+
+
+def _budget(**limits) -> RunBudget:
+    budget = RunBudget(BudgetLimits(**limits), token_counter=lambda: 0)
+    budget.start()
+    return budget
+
+
+def test_no_trip_within_limits():
+    budget = _budget(max_steps=5)
+    budget.record_planner_call()
+    budget.record_result("dom-1", "dom-2")
+    assert budget.check() == (None, False)
+
+
+def test_step_budget_counts_failed_planner_calls():
+    budget = _budget(max_steps=3, max_planner_errors=10)
+    budget.record_planner_call()
+    budget.record_planner_call(failed=True)
+    assert budget.check() == (None, False)
+    budget.record_planner_call(failed=True)
+    reason, hard = budget.check()
+    assert hard and "step budget of 3" in reason
+
+
+def test_consecutive_planner_errors_abort():
+    budget = _budget(max_steps=50, max_planner_errors=3)
+    for _ in range(2):
+        budget.record_planner_call(failed=True)
+    budget.record_planner_call()  # a success resets the streak
+    for _ in range(2):
+        budget.record_planner_call(failed=True)
+    assert budget.check() == (None, False)
+    budget.record_planner_call(failed=True)
+    reason, hard = budget.check()
+    assert hard and "3 consecutive planner calls failed" in reason
+
+
+def test_token_budget_is_measured_from_start():
+    used = [1000]
+    budget = RunBudget(BudgetLimits(max_tokens=500), token_counter=lambda: used[0])
+    budget.start()
+    used[0] = 1400
+    assert budget.check() == (None, False)
+    used[0] = 1500
+    reason, hard = budget.check()
+    assert hard and "token budget" in reason
+
+
+def test_no_progress_is_soft_and_verified_steps_count_as_progress():
+    budget = _budget(max_no_progress=2)
+    budget.record_result("dom-1", "dom-1")
+    budget.record_result("dom-1", None, verified=True)
+    budget.record_result("dom-1", "dom-1")
+    assert budget.check() == (None, False)
+    budget.record_result("dom-1", "dom-1")
+    reason, hard = budget.check()
+    assert not hard and "no visible effect" in reason
+
+
+def test_repeated_action_on_the_same_dom_is_reported():
+    budget = _budget(max_repeats=2)
+    click = {"type": "click", "selector": "[aria-label='Send']", "value": None}
+    assert budget.record_action("dom-1", click) is None
+    assert budget.record_action("dom-1", click) is None
+    assert budget.record_action("dom-2", click) is None  # a different page is a new attempt
+    assert "planned 3 times" in budget.record_action("dom-1", click)
+
+
+def test_escalation_ladder_resets_the_detectors():
+    budget = _budget(max_repeats=1, max_no_progress=1)
+    click = {"type": "click", "selector": "#send"}
+    budget.record_action("dom-1", click)
+    budget.record_result("dom-1", "dom-1")
+    assert budget.escalate() == "switch_model"
+    assert budget.planner_route == "escalation"
+    assert budget.no_progress == 0 and budget.record_action("dom-1", click) is None
+    assert [budget.escalate() for _ in range(3)] == list(ESCALATIONS[1:]) + ["abort"]
+    assert "escalation level 4" in budget.diagnosis("stuck")
+
+
+def test_recursion_limit_follows_the_step_budget():
+    assert BudgetLimits(max_steps=25).recursion_limit == 100
+    limits = BudgetLimits.from_env({"EMAILBOT_MAX_STEPS": "10", "EMAILBOT_MAX_SECONDS": "30"}.get)
+    assert (limits.max_steps, limits.max_seconds, limits.recursion_limit) == (10, 30.0, 40)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,83 @@
+import json
+
+from agents.utils.element_index import ElementIndex
+from agents.utils.models import EmailDetails
+
+DETAILS = EmailDetails(recipient="bob@example.com", subject="Invoice", body="Hi Bob")
+
+INBOX = {
+    "compose_open": False,
+    "input_fields": [{"type": "text", "aria_label": "Search mail", "selector": "input[aria-label=\"Search mail\"]"}],
+    "clickable_elements": [
+        {"text": "Inbox", "tag": "a", "selector": "a[aria-label=\"Inbox\"]"},
+        {"text": "Report spam", "tag": "div", "selector": "div[aria-label=\"Report spam\"]"},
+        {"text": "Compose", "tag": "div", "selector": "div[aria-label=\"Compose\"]"},
+    ],
+}
+
+
+def _compose(to: str = "", subject: str = "", body: str = "") -> dict:
+    return {
+        "compose_open": True,
+        "input_fields": [
+            {"type": "text", "aria_label": "To recipients", "value": to, "selector": "input[aria-label=\"To recipients\"]"},
+            {"type": "text", "name": "subjectbox", "value": subject, "selector": "[name=\"subjectbox\"]"},
+            {"type": "text", "aria_label": "Message Body", "value": body, "selector": "div[aria-label=\"Message Body\"]"},
+        ],
+        "clickable_elements": [
+            {"text": "Formatting options", "tag": "div", "selector": "div[aria-label=\"Formatting options\"]"},
+            {"text": "Attach files", "tag": "div", "selector": "div[aria-label=\"Attach files\"]"},
+            {"text": "Discard draft", "tag": "div", "selector": "div[aria-label=\"Discard draft\"]", "visible": False},
+            {"text": "Send", "tag": "div", "selector": "div[aria-label=\"Send\"]"},
+        ],
+    }
+
+
+def _selectors(elements) -> list:
+    return [e.selector for e in elements]
+
+
+def test_compose_button_ranks_first_in_the_inbox():
+    top = ElementIndex(INBOX).top_k(DETAILS, k=2)
+    assert top[0].selector == "div[aria-label=\"Compose\"]"
+
+
+def test_next_empty_field_ranks_first_in_compose():
+    assert ElementIndex(_compose()).top_k(DETAILS, k=1)[0].aria_label == "To recipients"
+    filled = ElementIndex(_compose(to="bob@example.com", subject="Invoice"))
+    assert filled.top_k(DETAILS, k=1)[0].aria_label == "Message Body"
+
+
+def test_send_ranks_first_once_everything_is_filled():
+    index = ElementIndex(_compose(to="bob@example.com", subject="Invoice", body="Hi Bob"))
+    assert index.top_k(DETAILS, k=1)[0].selector == "div[aria-label=\"Send\"]"
+    # Pending attachments come before Send
+    top = index.top_k(DETAILS, attachments_pending=True, k=2)
+    assert _selectors(top) == ["div[aria-label=\"Attach files\"]", "div[aria-label=\"Send\"]"]
+
+
+def test_k_bounds_the_result_and_hidden_elements_rank_last():
+    index = ElementIndex(_compose())
+    assert len(index.top_k(DETAILS, k=3)) == 3
+    everything = index.top_k(DETAILS, k=100)
+    assert len(everything) == len(index.elements)
+    assert everything[-1].selector == "div[aria-label=\"Discard draft\"]"
+
+
+def test_ties_keep_snapshot_order():
+    snapshot = {"compose_open": False, "clickable_elements": [
+        {"text": f"Label {i}", "tag": "a", "selector": f"a#label-{i}"} for i in range(5)
+    ]}
+    assert _selectors(ElementIndex(snapshot).top_k(DETAILS, k=5)) == [f"a#label-{i}" for i in range(5)]
+
+
+def test_from_snapshot_rejects_non_json():
+    assert ElementIndex.from_snapshot("<html>") is None
+    assert ElementIndex.from_snapshot(json.dumps(INBOX)).top_k(DETAILS, k=1)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,75 @@
+from agents.utils.models import AttachmentHandle, EmailDetails
+from agents.utils.plan_replay import render_steps, templatize_steps
+
+PLANNING_EMAIL = EmailDetails(recipient="alice@example.com", subject="Report", body="Hi Alice,\nthe report is attached.")
+OTHER_EMAIL = EmailDetails(recipient="bob@example.com", subject="Q3 numbers", body="Hi Bob,\nsee attached.")
+
+# The executed steps of one planned send, as the playwright node records them
+EXECUTED_STEPS = [
+    {"type": "click", "selector": "[aria-label='Compose']"},
+    {
+        "type": "fill",
+        "selector": "[name='to']",
+        "value": "alice@example.com",
+        "expect": {"kind": "value_equals", "selector": "[name='to']", "value": "alice@example.com"},
+    },
+    {"type": "fill", "selector": "[name='subjectbox']", "value": "Report"},
+    {"type": "type", "selector": "div[aria-label='Message Body']", "value": "Hi  Alice,\nthe report is attached."},
+    {"type": "upload", "selector": "input[type='file']", "files": ["/tmp/alice.pdf"]},
+    {"type": "click", "selector": "div[aria-label^='Send']", "expect": {"kind": "sent_toast"}},
+]
+
+
+def _raises_value_error(steps, details) -> bool:
+    try:
+        templatize_steps(steps, details)
+    except ValueError:
+        return True
+    return False
+
+
+def test_typed_values_become_placeholders():
+    template = templatize_steps(EXECUTED_STEPS, PLANNING_EMAIL)
+    assert template[1]["value"] == "{{ recipient }}"
+    assert template[1]["expect"]["value"] == "{{ recipient }}"
+    assert template[2]["value"] == "{{ subject }}"
+    # Matched with whitespace collapsed, as typed into the editor
+    assert template[3]["value"] == "{{ body }}"
+    assert template[4]["files"] is None
+    assert EXECUTED_STEPS[1]["value"] == "alice@example.com", "the executed steps must not be modified"
+
+
+def test_render_fills_each_email_and_its_attachments():
+    template = templatize_steps(EXECUTED_STEPS, PLANNING_EMAIL)
+    handles = [AttachmentHandle(path="/tmp/bob.pdf", name="bob.pdf", size=10, sha256="0" * 64, mime_type="application/pdf")]
+    steps = render_steps(template, OTHER_EMAIL, handles)
+    assert [s.get("value") for s in steps[1:4]] == ["bob@example.com", "Q3 numbers", OTHER_EMAIL.body]
+    assert steps[1]["expect"]["value"] == "bob@example.com"
+    assert steps[4]["files"] == ["/tmp/bob.pdf"]
+    # Without attachments the upload step is dropped
+    assert [s["type"] for s in render_steps(template, OTHER_EMAIL, [])] == ["click", "fill", "fill", "type", "click"]
+
+
+def test_selector_containing_a_planning_value_is_not_a_leftover():
+    # "Report" is the subject; a selector only locates an element and sends nothing
+    steps = [{"type": "click", "selector": "[aria-label='Report spam']"}] + EXECUTED_STEPS
+    template = templatize_steps(steps, PLANNING_EMAIL)
+    assert template[0]["selector"] == "[aria-label='Report spam']"
+
+
+def test_planning_value_left_in_a_typed_value_is_rejected():
+    steps = [dict(step) for step in EXECUTED_STEPS]
+    steps[3]["value"] = "Hi Alice, about the Report: see attached."
+    assert _raises_value_error(steps, PLANNING_EMAIL)
+
+
+def test_field_never_entered_verbatim_is_rejected():
+    steps = [step for step in EXECUTED_STEPS if step.get("value") != "Report"]
+    assert _raises_value_error(steps, PLANNING_EMAIL)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
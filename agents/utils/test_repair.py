@@ -0,0 +1,147 @@
+from langchain.schema.messages import AIMessage
+from agents.utils.models import DecisionAction, PlannerDecision, UserAgentDecision
+from agents.utils.repair import parse_structured, try_repair
+
+# (description, raw model output, schema, expected fields)
+MALFORMED_OUTPUTS = [
+    (
+        "unescaped quotes in message",
+        '{"action": "ask_user", "message": "Should the subject be "Q3 report" or "Quarterly report"?"}',
+        UserAgentDecision,
+        {"action": DecisionAction.ASK_USER, "message": 'Should the subject be "Q3 report" or "Quarterly report"?'},
+    ),
+    (
+        "unescaped quote followed by a comma",
+        '{"action": "ask_user", "message": "You said "hi", then what?"}',
+        UserAgentDecision,
+        {"message": 'You said "hi", then what?'},
+    ),
+    (
+        "raw newlines in message",
+        '{"action": "proceed", "message": "Recipient: bob@example.com\nSubject: Hello"}',
+        UserAgentDecision,
+        {"action": DecisionAction.PROCEED, "message": "Recipient: bob@example.com\nSubject: Hello"},
+    ),
+    (
+        "trailing prose after the object",
+        '{"action": "finalize", "message": "Email sent."} Let me know if you need anything else!',
+        PlannerDecision,
+        {"action": DecisionAction.FINALIZE, "message": "Email sent."},
+    ),
+    (
+        "leading prose and code fence",
+        'Here is my decision:\n```json\n{"action": "proceed", "message": "Open compose", "instruction": {"type": "click", "selector": "[aria-label=\'Compose\']"}}\n```',
+        PlannerDecision,
+        {"action": DecisionAction.PROCEED, "message": "Open compose"},
+    ),
+    (
+        "enum in upper case",
+        '{"action": "PROCEED", "message": "Filling recipient", "instruction": {"type": "fill", "selector": "[name=\'to\']", "value": "bob@example.com"}}',
+        PlannerDecision,
+        {"action": DecisionAction.PROCEED},
+    ),
+    (
+        "enum given by member name with spaces",
+        '{"action": "Ask User", "message": "Who should receive it?"}',
+        UserAgentDecision,
+        {"action": DecisionAction.ASK_USER},
+    ),
+    (
+        "missing optional instruction",
+        '{"action": "finalize", "message": "Email sent."}',
+        PlannerDecision,
+        {"action": DecisionAction.FINALIZE, "instruction": None},
+    ),
+    (
+        "trailing commas",
+        '{"action": "ask_user", "message": "Which account?",}',
+        UserAgentDecision,
+        {"action": DecisionAction.ASK_USER},
+    ),
+    (
+        "wrapped in the schema name",
+        '{"PlannerDecision": {"action": "error", "message": "Compose button not found"}}',
+        PlannerDecision,
+        {"action": DecisionAction.ERROR},
+    ),
+    (
+        "instruction encoded as a string, null as text",
+        '{"action": "proceed", "message": "Type body", "instruction": "{\\"type\\": \\"type\\", \\"selector\\": \\"div[aria-label=\'Message Body\']\\", \\"value\\": \\"Hi Bob\\", \\"step\\": \\"null\\"}"}',
+        PlannerDecision,
+        {"action": DecisionAction.PROCEED},
+    ),
+    (
+        "Groq function tag around the arguments",
+        '<function=UserAgentDecision>{"action": "proceed", "message": "Ready"}</function>',
+        UserAgentDecision,
+        {"action": DecisionAction.PROCEED},
+    ),
+]
+
+# (description, raw model output, schema): must fail so the router escalates or re-asks
+REJECTED_OUTPUTS = [
+    (
+        "planner output cut off inside the body",
+        '{"action":"proceed","message":"Typing body","instruction":{"type":"type","selector":"div[aria-label=\'Message Body\']","value":"Hi Bob, the Q3 rep',
+        PlannerDecision,
+    ),
+    (
+        "cut off after a complete value",
+        '{"action": "ask_user", "message": "What is the subject?"',
+        UserAgentDecision,
+    ),
+    (
+        "missing required message",
+        '{"action": "finalize"}',
+        PlannerDecision,
+    ),
+]
+
+
+def test_malformed_outputs_are_repaired():
+    for description, raw, schema, expected in MALFORMED_OUTPUTS:
+        parsed = parse_structured(raw, schema)
+        for field, value in expected.items():
+            assert getattr(parsed, field) == value, f"{description}: {field}={getattr(parsed, field)!r}"
+
+
+def test_truncated_or_incomplete_outputs_are_rejected():
+    for description, raw, schema in REJECTED_OUTPUTS:
+        parsed, error = try_repair(schema, raw=AIMessage(content=raw))
+        assert parsed is None and error is not None, f"{description}: repaired to {parsed!r}"
+
+
+def test_nested_instruction_is_repaired():
+    raw = next(raw for description, raw, _, _ in MALFORMED_OUTPUTS if description.startswith("instruction encoded"))
+    parsed = parse_structured(raw, PlannerDecision)
+    assert parsed.instruction.type == "type"
+    assert parsed.instruction.value == "Hi Bob"
+    assert parsed.instruction.step is None
+
+
+def test_candidate_from_invalid_tool_call():
+    raw = AIMessage(content="", invalid_tool_calls=[{
+        "name": "UserAgentDecision", "args": '{"action": "ASK_USER", "message": "Subject?"}', "id": "1", "error": None,
+    }])
+    parsed, error = try_repair(UserAgentDecision, raw=raw)
+    assert error is None and parsed.action == DecisionAction.ASK_USER
+
+
+def test_candidate_from_provider_error():
+    class ToolUseFailed(Exception):
+        body = {"error": {"code": "tool_use_failed", "failed_generation": '{"action": "finalize", "message": "Done"}'}}
+
+    parsed, error = try_repair(PlannerDecision, error=ToolUseFailed())
+    assert error is None and parsed.action == DecisionAction.FINALIZE
+
+
+def test_unrepairable_output_reports_error():
+    parsed, error = try_repair(UserAgentDecision, raw=AIMessage(content="I cannot help with that."))
+    assert parsed is None and error is not None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
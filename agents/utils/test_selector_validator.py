@@ -0,0 +1,56 @@
+import asyncio
+
+from agents.utils.selector_validator import SelectorValidator, syntax_error
+
+VALID_SELECTORS = [
+    "[aria-label='Compose']",
+    "div[role='dialog'] [aria-label^='Send']",
+    'input[name="subjectbox"]',
+    "div:has(> span[title='To'])",
+    "[aria-label='Say \\'hi\\'']",
+    "text=Don't send",  # raw engine body: the quote is just text
+    "div[role='dialog'] >> text=Send",
+    "[data-tooltip='a >> b']",
+]
+
+# (selector, expected error fragment)
+INVALID_SELECTORS = [
+    ("", "empty"),
+    ("   ", "empty"),
+    ("[aria-label='Compose'", "unclosed '['"),
+    ("div:has(span", "unclosed '('"),
+    ("div]", "unbalanced ']'"),
+    ("[aria-label='Compose]", "unterminated ' quote"),
+    ("div >> [name='to'", "unclosed '['"),
+]
+
+
+def test_valid_selectors_pass():
+    for selector in VALID_SELECTORS:
+        assert syntax_error(selector) is None, f"{selector!r}: {syntax_error(selector)}"
+
+
+def test_invalid_selectors_are_rejected_locally():
+    for selector, fragment in INVALID_SELECTORS:
+        error = syntax_error(selector)
+        assert error and fragment in error, f"{selector!r}: {error!r}"
+
+
+class _NoPage:
+    def locator(self, selector):
+        raise AssertionError("a syntax error must be rejected before any page query")
+
+
+def test_syntax_error_skips_the_page_and_suggests():
+    validator = SelectorValidator()
+    validator.update({"clickable_elements": [{"text": "Compose", "selector": "[aria-label='Compose']"}]})
+    check = asyncio.run(validator.validate(_NoPage(), "[aria-label='Compose'"))
+    assert not check.valid and "invalid syntax" in check.reason
+    assert check.suggestion == "[aria-label='Compose']"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,76 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from agents.utils.sessions import SessionRegistry, file_lock
+
+STATE = {"cookies": [{"name": "SID", "value": "a", "expires": -1}], "origins": []}
+
+
+def test_save_then_load_round_trips_and_skips_unchanged_writes():
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "gmail_auth.json"
+        registry = SessionRegistry()
+        assert registry.load(path) is None
+        assert registry.save(path, STATE) is True
+        assert registry.save(path, json.loads(json.dumps(STATE))) is False
+        assert SessionRegistry().load(path) == STATE  # a fresh registry reads the file itself
+        assert not list(Path(root).glob(".*.tmp")), "the atomic write must not leave temp files"
+
+
+def test_load_rereads_a_file_changed_by_another_writer():
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "gmail_auth.json"
+        registry = SessionRegistry()
+        registry.save(path, STATE)
+        updated = {**STATE, "cookies": STATE["cookies"] + [{"name": "HSID", "value": "b", "expires": -1}]}
+        SessionRegistry().save(path, updated)
+        assert registry.load(path) == updated
+
+
+def test_save_waits_for_the_lock():
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "gmail_auth.json"
+        registry = SessionRegistry()
+        saved = threading.Event()
+        with file_lock(path):
+            writer = threading.Thread(target=lambda: (registry.save(path, STATE), saved.set()))
+            writer.start()
+            time.sleep(0.2)
+            assert not saved.is_set() and not path.exists(), "save must not write while another holder has the lock"
+        writer.join(timeout=5)
+        assert saved.is_set() and SessionRegistry().load(path) == STATE
+
+
+def test_concurrent_saves_leave_one_complete_state():
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "gmail_auth.json"
+        states = [{"cookies": [{"name": "SID", "value": str(i) * 2000, "expires": -1}], "origins": []} for i in range(8)]
+        writers = [threading.Thread(target=SessionRegistry().save, args=(path, state)) for state in states]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join(timeout=5)
+        assert SessionRegistry().load(path) in states
+
+
+def test_invalid_file_is_reported_not_returned():
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "gmail_auth.json"
+        path.write_text("{not json", encoding="utf-8")
+        try:
+            SessionRegistry().load(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a corrupt session file must raise ValueError")
+        assert SessionRegistry().status("gmail", path=path).state == "invalid"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -1,26 +1,278 @@
+import contextlib
 import json
+import re
 from pathlib import Path
-from typing import Dict, Any, Optional
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page, TimeoutError
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from playwright.async_api import async_playwright, expect, Browser, BrowserContext, Page, TimeoutError
+
+from agents.utils.browser_daemon import read_daemon_endpoint
+from agents.utils.diagnostics import DiagnosticsRecorder
+from agents.utils.dom_capture import DEFAULT_MAX_ELEMENTS, capture_dom
+from agents.utils.lifecycle import LifecycleManager
+from agents.utils.log import get_logger, payload
+from agents.utils.selector_validator import VALIDATED_ACTIONS, SelectorValidator
+from agents.utils.sessions import atomic_write_json, get_session_registry, session_path
+
+# Page-level postconditions, evaluated in-page by a single wait_for_function call
+PAGE_POSTCONDITION_JS = """
+([kind, composeRoots, sentTexts]) => {
+    const visible = (el) => { if (!el) return false; const r = el.getBoundingClientRect(); return r.width > 0 && r.height > 0; };
+    if (kind === 'dialog_closed') {
+        return !composeRoots.some(sel => Array.from(document.querySelectorAll(sel)).some(visible));
+    }
+    if (kind === 'sent_toast') {
+        return Array.from(document.querySelectorAll('[role="alert"], [role="status"], [aria-live]'))
+            .some(el => sentTexts.some(t => (el.textContent || '').includes(t)));
+    }
+    return false;
+}
+"""
+
+# True when the open compose window holds the expected subject, recipient, start of the body and
+# attachment names (text, input values or attributes); whitespace is compared collapsed
+DRAFT_MATCH_JS = """
+([composeRoots, subject, recipient, bodyPrefix, attachmentNames]) => {
+    const root = composeRoots.map(sel => document.querySelector(sel)).find(Boolean);
+    if (!root) return false;
+    const text = (root.innerText + ' ' + Array.from(root.querySelectorAll('input, textarea')).map(el => el.value).join(' '))
+        .replace(/\\s+/g, ' ');
+    const inAttributes = (value) => Array.from(root.querySelectorAll('*'))
+        .some(el => Array.from(el.attributes).some(a => a.value === value));
+    return (!subject || text.includes(subject)) && (!recipient || text.includes(recipient) || inAttributes(recipient))
+        && (!bodyPrefix || text.includes(bodyPrefix))
+        && attachmentNames.every(name => text.includes(name) || inAttributes(name));
+}
+"""
+# Attachments are uploaded when no progress indicator is left and every file has its finished chip:
+# a short element in the compose window with the file name and its size ("(12K)", "1.2 MB"), which
+# providers only show once the upload is done. The name alone appears as soon as it starts.
+UPLOAD_DONE_JS = """
+([names, composeRoots, progressSelector]) => {
+    if (document.querySelector(progressSelector)) return false;
+    const size = /\\d+(?:[.,]\\d+)?\\s?(?:[KMG]B?|bytes)\\b/i;
+    const elements = composeRoots.flatMap(sel => Array.from(document.querySelectorAll(sel + ' *')));
+    return names.every(name => elements.some(el => {
+        const text = el.innerText || '';
+        return text.includes(name) && text.length <= name.length + 60 && size.test(text.replace(name, ''));
+    }));
+}
+"""
+
+# Enough of the body to tell two drafts to the same recipient and subject apart
+DRAFT_BODY_PREFIX_CHARS = 80
+
+logger = get_logger("executor")
+
+# An aria-label that is, or starts with, "Send" ("Send", "Send ‪(Ctrl-Enter)‬"), but not "Sender" or "Sent"
+SEND_LABEL = re.compile(r"""aria-label\s*[\^*]?=\s*['"]?Send(?![A-Za-z])""")
+
+
+def is_send_action(instruction: Dict[str, Any], send_selector: Optional[str] = None) -> bool:
+    """
+    A click on the Send control, or any action that expects the sent confirmation.
+
+    The control is the provider's `send_selector` or an element whose aria-label starts with
+    "Send"; selectors that merely contain "send" (e.g. "Sender", "sendmail") do not count.
+    """
+    postcondition = instruction.get("expect") or {}
+    kind = postcondition.get("kind") if isinstance(postcondition, dict) else getattr(postcondition, "kind", None)
+    if getattr(kind, "value", kind) == "sent_toast":
+        return True
+    if instruction.get("type") != "click":
+        return False
+    selector = (instruction.get("selector") or "").strip()
+    return bool(selector) and (selector == send_selector or bool(SEND_LABEL.search(selector)))
+
+def describe_action(action: Dict[str, Any]) -> Optional[str]:
+    """The executor's success message for an action; None when it depends on the page (screenshots)"""
+    action_type = action.get("type", "")
+    selector = action.get("selector", "")
+    value = action.get("value", "")
+    if action_type == "click":
+        return f"Clicked {selector}"
+    if action_type == "fill":
+        return f"Filled {selector} with {value}"
+    if action_type == "type":
+        return f"Typed {value} into {selector}"
+    if action_type == "press":
+        return f"Pressed {value}"
+    if action_type == "wait":
+        return f"Waited {value}ms"
+    if action_type == "upload" and action.get("files"):
+        names = [Path(f).name for f in action["files"]]
+        return f"Uploaded {len(names)} file(s): {', '.join(names)}"
+    return None
+
+def postcondition_description(postcondition: Dict[str, Any]) -> str:
+    kind = postcondition.get("kind")
+    kind = getattr(kind, "value", kind)
+    return f"{kind} {postcondition.get('selector') or ''} {postcondition.get('value') or ''}".strip()
+
+def keeps_snapshot(instruction: Dict[str, Any]) -> bool:
+    """
+    Whether the DOM snapshot may be reused once the step's expectation holds: only for a
+    value_equals after fill/type, which changes a field's value but not the page structure.
+    Visibility and dialog expectations mean elements appeared or went away, so they recapture.
+    """
+    postcondition = instruction.get("expect") or {}
+    if hasattr(postcondition, "model_dump"):
+        postcondition = postcondition.model_dump()
+    kind = postcondition.get("kind")
+    return (
+        getattr(kind, "value", kind) == "value_equals"
+        and instruction.get("type") in ("fill", "type")
+        and not instruction.get("recapture")
+    )
+
+BUILTIN_PROVIDERS = ("gmail", "outlook")
+# Providers added at runtime, e.g. the local fixture mail client of the benchmarks (benchmarks/fixtures.py)
+EXTRA_PROVIDERS: Dict[str, Dict[str, Any]] = {}
+
+
+def register_provider(name: str, config: Dict[str, Any]):
+    """Make a provider config available to executors created afterwards in this process"""
+    EXTRA_PROVIDERS[name] = config
+
+
+def provider_names() -> Tuple[str, ...]:
+    return BUILTIN_PROVIDERS + tuple(EXTRA_PROVIDERS)
+
+def draft_body_prefix(body: Optional[str]) -> Optional[str]:
+    """The start of a body as DRAFT_MATCH_JS compares it: whitespace collapsed, cut to a prefix"""
+    return " ".join(body.split())[:DRAFT_BODY_PREFIX_CHARS] if body else None
+
+
+def har_steps_path(har_path: Path) -> Path:
+    """Where a HAR recording keeps the steps that were executed during it"""
+    return Path(har_path).with_name(Path(har_path).stem + ".steps.json")
 
 class PlaywrightExecutor:
-    def __init__(self, provider: str = "gmail", headless: bool = False):
+    def __init__(
+        self,
+        provider: str = "gmail",
+        headless: bool = False,
+        max_dom_elements: int = DEFAULT_MAX_ELEMENTS,
+        diagnostics: Optional[DiagnosticsRecorder] = None,
+        use_daemon: bool = True,
+        account: Optional[str] = None,
+        har_mode: Optional[str] = None,
+        har_path: Optional[Path] = None,
+    ):
+        if provider not in provider_names():
+            raise ValueError(f"Unknown provider {provider!r}; expected one of {', '.join(provider_names())}")
+        if har_mode not in (None, "record", "replay"):
+            raise ValueError(f"Unknown HAR mode: {har_mode}")
+        if har_mode and not har_path:
+            raise ValueError("A HAR path is required for HAR record/replay")
         self.provider = provider
+        self.account = account
+        # record: save the traffic (and the executed steps) of a real run; replay: serve pages from it offline
+        self.har_mode = har_mode
+        self.har_path = Path(har_path) if har_path else None
+        self.har_steps: List[Dict[str, Any]] = []
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.session_file = Path("sessions") / f"{provider}_auth.json"
+        self.session_file = session_path(provider, account)
+        self.sessions = get_session_registry()
+        self.selector_validator = SelectorValidator.from_env()
         self.provider_config = {
-            "gmail": {"url": "https://mail.google.com", "compose_selector": "[aria-label='Compose']"},
-            "outlook": {"url": "https://outlook.live.com/mail/0/", "compose_selector": "[aria-label='New message']"}
+            "gmail": {
+                "url": "https://mail.google.com",
+                "compose_selector": "[aria-label='Compose']",
+                "compose_root_selectors": ['div[role="dialog"]'],
+                "toolbar_selectors": ['[role="banner"]', '[gh="mtb"]', '[role="navigation"]'],
+                "attach_selector": "input[type='file'][name='Filedata']",
+                "upload_progress_selector": "div[role='dialog'] [role='progressbar']",
+                "sent_texts": ["Message sent"],
+                "send_selector": "div[role='dialog'] [role='button'][aria-label^='Send']",
+                "close_compose_selector": "div[role='dialog'] [aria-label^='Save & close']",
+                "drafts_url": "https://mail.google.com/mail/u/0/#drafts",
+                "draft_row_selector": "[role='main'] tr[role='row']",
+                "draft_url": "https://mail.google.com/mail/u/0/#drafts?compose={draft_ref}",
+                "draft_ref_pattern": r"[#&?]compose=([\w-]+)",
+            },
+            "outlook": {
+                "url": "https://outlook.live.com/mail/0/",
+                "compose_selector": "[aria-label='New message']",
+                "compose_root_selectors": ['div[role="dialog"]', '[role="main"]:has([aria-label="Message body"])'],
+                "toolbar_selectors": ['[role="toolbar"]', '[role="banner"]'],
+                "attach_selector": "input[type='file']",
+                "upload_progress_selector": (
+                    "div[role='dialog'] [role='progressbar'], "
+                    "[role='main']:has([aria-label='Message body']) [role='progressbar']"
+                ),
+                "sent_texts": ["Message sent", "Your message has been sent"],
+                "send_selector": "[aria-label='Send']",
+                "close_compose_selector": None,  # drafts autosave; leaving the compose view keeps them
+                "drafts_url": "https://outlook.live.com/mail/0/drafts",
+                "draft_row_selector": "[role='listbox'] [role='option']",
+                "draft_url": "https://outlook.live.com/mail/0/drafts/id/{draft_ref}",
+                "draft_ref_pattern": r"/drafts/id/([^/?#]+)",
+            },
+            **EXTRA_PROVIDERS,
         }
         self.headless = headless
+        self.max_dom_elements = max_dom_elements
+        self.postcondition_timeout = 3000
+        self.sent_timeout = 10000  # the "Message sent" toast can lag the click by a few seconds
+        self.use_daemon = use_daemon
+        self.attached = False  # True when borrowing a page from the browser daemon
+        self.lifecycle = LifecycleManager(self)
+        self.diagnostics = diagnostics or DiagnosticsRecorder.from_env()
+        config = self.provider_config.get(provider, self.provider_config["gmail"])
+        self.diagnostics.compose_selector = ", ".join(config["compose_root_selectors"])
         self.playwright = None
 
+    def is_send(self, instruction: Dict[str, Any]) -> bool:
+        """is_send_action with this provider's Send selector"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        return is_send_action(instruction, config.get("send_selector"))
+
+    async def attach_to_daemon(self, endpoint: Dict[str, Any]) -> bool:
+        """
+        Open a page of our own in the daemon's logged-in, warm browser over CDP instead of launching one.
+
+        The daemon's mailbox tabs are never used directly, so concurrent runs cannot drive the
+        same compose window; the page is closed again in cleanup.
+        """
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        try:
+            self.browser = await self.playwright.chromium.connect_over_cdp(endpoint["endpoint"], timeout=5000)
+            self.context = self.browser.contexts[0]
+            self.page = await self.context.new_page()
+            await self.page.goto(config["url"], timeout=60000)
+            await self.page.wait_for_selector(config["compose_selector"], state="visible", timeout=30000)
+        except Exception as e:
+            logger.warning("Could not attach to browser daemon at %s: %s. Launching a browser instead.", endpoint["endpoint"], e)
+            if self.page:
+                with contextlib.suppress(Exception):
+                    await self.page.close()
+            self.browser = self.context = self.page = None
+            return False
+        self.attached = True
+        await self.diagnostics.start(self.context)
+        logger.info("Attached to browser daemon at %s for %s: %s", endpoint["endpoint"], self.provider, self.page.url)
+        return True
+
     async def setup(self) -> bool:
         """Initialize browser and load session with better error handling"""
         try:
             self.playwright = await async_playwright().start()
+            # The daemon holds the default session only
+            endpoint = read_daemon_endpoint() if self.use_daemon and not self.account and not self.har_mode else None
+            if endpoint and self.provider in endpoint.get("providers", [self.provider]):
+                if await self.attach_to_daemon(endpoint):
+                    return True
+
+            # Offline cookie check: an expired login fails here instead of after a compose-selector timeout
+            status = self.sessions.status(self.provider, self.account, self.session_file)
+            if status.state == "expired" and self.har_mode != "replay":
+                logger.error("Session %s has expired (%s). Run 'start' to log in again.", self.session_file, status.reason)
+                return False
+            if status.state == "expiring":
+                logger.warning("Session %s is about to expire: %s", self.session_file, status.reason)
+
             self.browser = await self.playwright.chromium.launch(
                 headless=self.headless,
                 timeout=30000
@@ -31,23 +283,32 @@ class PlaywrightExecutor:
                 'bypass_csp': True
             }
             
-            if self.session_file.exists():
-                try:
-                    with open(self.session_file, 'r') as f:
-                        storage_state = json.load(f)
-                    if not isinstance(storage_state, dict) or 'cookies' not in storage_state:
-                        raise ValueError("Invalid storage state format")
+            try:
+                storage_state = self.sessions.load(self.session_file)
+                if storage_state is not None:
                     context_options['storage_state'] = storage_state
-                    print(f"Loaded valid session from {self.session_file}")
-                except (json.JSONDecodeError, ValueError) as e:
-                    print(f"Invalid session file: {e}. Deleting and proceeding without.")
-                    self.session_file.unlink()
+                    logger.info("Loaded valid session from %s", self.session_file)
+            except ValueError as e:
+                logger.warning("Invalid session file: %s. Deleting and proceeding without.", e)
+                self.sessions.delete(self.session_file)
             
+            if self.har_mode:
+                # Service workers would answer requests outside both the recorder and the router
+                context_options['service_workers'] = 'block'
+            if self.har_mode == "record":
+                self.har_path.parent.mkdir(parents=True, exist_ok=True)
+                context_options['record_har_path'] = str(self.har_path)
+
             self.context = await self.browser.new_context(**context_options)
+            if self.har_mode == "replay":
+                # Anything not in the recording is aborted, so a replayed run never touches the network
+                await self.context.route_from_har(self.har_path, not_found="abort")
+                logger.info("Replaying %s from %s", self.provider, self.har_path)
+            await self.diagnostics.start(self.context)
             self.page = await self.context.new_page()
             
             config = self.provider_config.get(self.provider, self.provider_config["gmail"])
-            print(f"Navigating to {config['url']} for provider {self.provider}")
+            logger.info("Navigating to %s for provider %s", config["url"], self.provider)
             await self.page.goto(config["url"], timeout=60000)
             
             # Wait for Outlook UI to be fully loaded
@@ -59,135 +320,98 @@ class PlaywrightExecutor:
                     state="visible",
                     timeout=30000
                 )
-                print(f"UI element {config['compose_selector']} is visible")
+                logger.debug("UI element %s is visible", config["compose_selector"])
             except TimeoutError:
-                print(f"Timeout waiting for {config['compose_selector']}. Taking screenshot for debugging.")
-                Path("screenshots").mkdir(exist_ok=True)
-                await self.page.screenshot(path=f"screenshots/{self.provider}_setup_failure.png")
+                logger.warning("Timeout waiting for %s. Taking screenshot for debugging.", config["compose_selector"])
+                self.diagnostics.capture(self.page, f"{self.provider}_setup_failure", clip_to_compose=False)
                 # Check if on login page
                 current_url = self.page.url
                 if "login.live.com" in current_url:
-                    print(f"Detected login page: {current_url}. Session may be invalid.")
+                    logger.error("Detected login page: %s. Session may be invalid.", current_url)
                     return False
             
             title = await self.page.title()
             if not title:
                 raise RuntimeError("Page loaded but title is empty - possible initialization failure")
             
-            print(f"Setup successful for {self.provider}. Page title: {title}")
+            logger.info("Setup successful for %s. Page title: %s", self.provider, title)
             return True
         except TimeoutError as e:
-            print(f"Timeout during setup for {self.provider}: {e}")
+            logger.error("Timeout during setup for %s: %s", self.provider, e)
             return False
         except Exception as e:
-            print(f"Setup failed for {self.provider}: {e}")
+            logger.error("Setup failed for %s: %s", self.provider, e)
             return False
 
     async def cleanup(self):
         """Clean up browser and save session"""
         try:
+            await self.diagnostics.close()
+            if self.attached:
+                # The daemon owns the browser and its profile; close our page and drop the CDP connection
+                if self.page:
+                    await self.page.close()
+                if self.playwright:
+                    await self.playwright.stop()
+                return
             if self.context:
-                storage_state = await self.context.storage_state()
-                self.session_file.parent.mkdir(exist_ok=True)
-                with open(self.session_file, 'w') as f:
-                    json.dump(storage_state, f)
-                await self.context.close()
+                if self.har_mode != "replay":
+                    storage_state = await self.context.storage_state()
+                    self.sessions.save(self.session_file, storage_state)
+                await self.context.close()  # also writes the HAR in record mode
+                if self.har_mode == "record":
+                    self._save_har_steps()
             if self.browser:
                 await self.browser.close()
             if self.playwright:
                 await self.playwright.stop()
         except Exception as e:
-            print(f"Cleanup failed: {e}")
+            logger.warning("Cleanup failed: %s", e)
         finally:
+            self.attached = False
             self.page = None
             self.context = None
             self.browser = None
             self.playwright = None
 
     async def get_dom(self) -> str:
-        """Get simplified DOM for planner analysis"""
+        """Get simplified DOM of the compose dialog (or visible toolbars) for planner analysis"""
         if not self.page:
-            print(f"Error: Page not initialized for {self.provider}")
+            logger.error("Page not initialized for %s", self.provider)
             return "Error: Page not initialized"
         
-        dom_js = """
-        () => {
-            const snapshot = {
-                url: window.location.href,
-                title: document.title,
-                compose_open: false,
-                clickable_elements: [],
-                input_fields: [],
-                buttons: []
-            };
-            
-            // Check if compose is open
-            const composeSelectors = [
-                'div[role="dialog"]',
-                '[aria-label*="compose" i], [aria-label*="new message" i]',
-                '[data-testid*="compose"]'
-            ];
-            snapshot.compose_open = composeSelectors.some(sel => document.querySelector(sel));
-            
-            // Get clickable elements
-            document.querySelectorAll('button, [role="button"], a, [data-tooltip], [aria-label]').forEach(el => {
-                const text = el.textContent?.trim() || el.getAttribute('aria-label') || el.getAttribute('data-tooltip') || '';
-                if (text.length > 0 && text.length < 100) {
-                    snapshot.clickable_elements.push({
-                        text: text,
-                        tag: el.tagName.toLowerCase(),
-                        selector: el.id ? `#${el.id}` : (el.className ? `.${el.className.split(' ')[0]}` : el.tagName.toLowerCase()),
-                        visible: el.offsetParent !== null
-                    });
-                }
-            });
-            
-            // Get input fields
-            document.querySelectorAll('input, textarea, [contenteditable="true"], [role="textbox"]').forEach(el => {
-                snapshot.input_fields.push({
-                    type: el.type || 'text',
-                    placeholder: el.placeholder || '',
-                    aria_label: el.getAttribute('aria-label') || '',
-                    name: el.name || '',
-                    value: el.value || el.textContent || '',
-                    selector: el.id ? `#${el.id}` : (el.name ? `[name="${el.name}"]` : (el.className ? `.${el.className.split(' ')[0]}` : el.tagName.toLowerCase())),
-                    visible: el.offsetParent !== null
-                });
-            });
-            
-            // Get buttons with specific text
-            ['Send', 'New message', 'Attach', 'To', 'Subject'].forEach(text => {
-                const selector = `[aria-label*="${text}" i], [data-tooltip*="${text}" i], [title*="${text}" i]`;
-                const elements = document.querySelectorAll(selector);
-                elements.forEach(el => {
-                    if (!snapshot.buttons.some(b => b.text === text)) {
-                        snapshot.buttons.push({
-                            text: text,
-                            selector: el.id ? `#${el.id}` : `[aria-label*="${text}" i]`,
-                            available: el.offsetParent !== null
-                        });
-                    }
-                });
-            });
-            
-            return snapshot;
-        }
-        """
-        
         try:
-            result = await self.page.evaluate(dom_js)
-            print(f"DOM captured successfully for {self.provider}")
-            return json.dumps(result, indent=2)
+            config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+            result = await capture_dom(
+                self.page,
+                compose_root_selectors=config["compose_root_selectors"],
+                toolbar_selectors=config["toolbar_selectors"] + [config["compose_selector"]],
+                max_elements=self.max_dom_elements,
+            )
+            self.selector_validator.update(result)
+            dom = json.dumps(result, indent=2)
+            logger.debug("DOM captured for %s: %s", self.provider, payload(dom, "dom"))
+            return dom
         except Exception as e:
-            print(f"DOM capture failed for {self.provider}: {str(e)}")
-            Path("screenshots").mkdir(exist_ok=True)
-            await self.page.screenshot(path=f"screenshots/{self.provider}_dom_failure.png")
+            logger.error("DOM capture failed for %s: %s", self.provider, e)
+            self.diagnostics.capture(self.page, f"{self.provider}_dom_failure", clip_to_compose=False)
             return f"DOM capture failed: {str(e)}"
 
+    def _save_har_steps(self):
+        """Store the successful steps of a recorded run next to the HAR, for offline replay harnesses"""
+        atomic_write_json(har_steps_path(self.har_path), {"provider": self.provider, "steps": self.har_steps}, indent=2)
+        logger.info("Recorded %d steps and traffic to %s", len(self.har_steps), self.har_path)
+
     async def execute_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a single action based on planner instruction"""
+        result = await self._execute_action(action)
+        if result["success"] and self.har_mode == "record":
+            self.har_steps.append(action)
+        return result
+
+    async def _execute_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         if not self.page:
-            print(f"Error: Page not initialized for {self.provider}")
+            logger.error("Page not initialized for %s", self.provider)
             return {"success": False, "error": "Page not initialized"}
         
         try:
@@ -195,42 +419,281 @@ class PlaywrightExecutor:
             selector = action.get("selector", "")
             value = action.get("value", "")
             
-            print(f"Executing action: {action_type} on {selector} with value '{value}'")
+            logger.debug("Executing action: %s on %s with value %s", action_type, selector, payload(value, "value"))
+
+            # Upload falls back to the provider's attach input when no selector is given
+            if action_type in VALIDATED_ACTIONS and (selector or action_type != "upload"):
+                check = await self.selector_validator.validate(self.page, selector)
+                if not check.valid:
+                    logger.warning("%s", check.error(selector))
+                    return {"success": False, "error": check.error(selector)}
             
             if action_type == "click":
                 await self.page.locator(selector).first.click(timeout=5000)
                 await self.page.wait_for_timeout(1000)
-                return {"success": True, "action": f"Clicked {selector}"}
+                return {"success": True, "action": describe_action(action)}
             
             elif action_type == "fill":
                 element = self.page.locator(selector).first
                 await element.click(timeout=5000)
                 await element.fill(value)
-                return {"success": True, "action": f"Filled {selector} with {value}"}
+                return {"success": True, "action": describe_action(action)}
             
             elif action_type == "type":
                 element = self.page.locator(selector).first
                 await element.click(timeout=5000)
                 await element.type(value, delay=50)
-                return {"success": True, "action": f"Typed {value} into {selector}"}
+                return {"success": True, "action": describe_action(action)}
             
             elif action_type == "press":
                 await self.page.keyboard.press(value)
-                return {"success": True, "action": f"Pressed {value}"}
+                return {"success": True, "action": describe_action(action)}
             
             elif action_type == "wait":
                 await self.page.wait_for_timeout(int(value))
-                return {"success": True, "action": f"Waited {value}ms"}
+                return {"success": True, "action": describe_action(action)}
+            
+            elif action_type == "upload":
+                files = action.get("files") or []
+                if not files:
+                    return {"success": False, "error": "Upload action has no files"}
+                names = await self.upload_files(selector, files)
+                return {"success": True, "action": f"Uploaded {len(names)} file(s): {', '.join(names)}"}
             
             elif action_type == "screenshot":
-                path = f"screenshots/step_{action.get('step', 'current')}.png"
-                Path("screenshots").mkdir(exist_ok=True)
-                await self.page.screenshot(path=path)
+                path = await self.diagnostics.capture_now(self.page, f"step_{action.get('step', 'current')}")
+                if path is None:
+                    # Diagnostics only; the send can go on without it
+                    return {"success": True, "action": "Screenshot failed (see log); nothing saved"}
                 return {"success": True, "action": f"Screenshot saved to {path}"}
             
             else:
                 return {"success": False, "error": f"Unknown action type: {action_type}"}
                 
         except Exception as e:
-            print(f"Action execution failed: {str(e)}")
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            logger.warning("Action execution failed: %s", e)
+            return {"success": False, "error": str(e)}
+
+    async def upload_files(self, selector: Optional[str], files: List[str], timeout_ms: int = 30000) -> List[str]:
+        """Attach all files in one operation and wait for the provider to finish uploading them"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        target = self.page.locator(selector or config["attach_selector"]).first
+        is_file_input = await target.evaluate("el => el.tagName === 'INPUT' && el.type === 'file'", timeout=5000)
+        if is_file_input:
+            await target.set_input_files(files, timeout=5000)
+        else:
+            # An "Attach" button: intercept the native file chooser instead of driving the OS dialog
+            async with self.page.expect_file_chooser(timeout=5000) as chooser_info:
+                await target.click(timeout=5000)
+            chooser = await chooser_info.value
+            await chooser.set_files(files, timeout=5000)
+
+        names = [Path(f).name for f in files]
+        total_mb = sum(Path(f).stat().st_size for f in files) / (1024 * 1024)
+        await self.page.wait_for_function(
+            UPLOAD_DONE_JS,
+            arg=[names, config["compose_root_selectors"], config["upload_progress_selector"]],
+            polling=250,
+            timeout=timeout_ms + int(total_mb * 1000),
+        )
+        return names
+
+    async def check_postcondition(self, postcondition: Dict[str, Any]) -> Tuple[bool, str]:
+        """Verify an action's expected outcome with one targeted query; returns (holds, description)"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        kind = postcondition.get("kind")
+        kind = getattr(kind, "value", kind)
+        selector = postcondition.get("selector")
+        value = postcondition.get("value")
+        timeout = self.postcondition_timeout
+        description = postcondition_description(postcondition)
+        try:
+            if kind in ("visible", "hidden"):
+                await self.page.locator(selector).first.wait_for(state=kind, timeout=timeout)
+            elif kind == "value_equals":
+                locator = self.page.locator(selector).first
+                if await locator.evaluate("el => typeof el.value === 'string'", timeout=timeout):
+                    await expect(locator).to_have_value(value or "", timeout=timeout)
+                else:
+                    await expect(locator).to_have_text(value or "", timeout=timeout)
+            elif kind in ("dialog_closed", "sent_toast"):
+                await self.page.wait_for_function(
+                    PAGE_POSTCONDITION_JS,
+                    arg=[kind, config["compose_root_selectors"], config["sent_texts"]],
+                    polling=100,
+                    timeout=timeout,
+                )
+            else:
+                return False, f"unknown postcondition {kind}"
+            return True, description
+        except (TimeoutError, AssertionError) as e:
+            logger.info("Postcondition failed (%s): %s", description, e)
+            return False, description
+        except Exception as e:
+            logger.warning("Postcondition check error (%s): %s", description, e)
+            return False, description
+
+    async def confirm_sent(self) -> bool:
+        """Wait up to `sent_timeout` for the provider's 'message sent' confirmation after a send click"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        try:
+            await self.page.wait_for_function(
+                PAGE_POSTCONDITION_JS,
+                arg=["sent_toast", config["compose_root_selectors"], config["sent_texts"]],
+                polling=100,
+                timeout=self.sent_timeout,
+            )
+            return True
+        except TimeoutError:
+            logger.warning("No sent confirmation from %s within %d ms", self.provider, self.sent_timeout)
+            return False
+        except Exception as e:
+            logger.warning("Sent confirmation check error: %s", e)
+            return False
+
+    async def recycle(self, scope: str = "context") -> bool:
+        """
+        Replace the page, or the whole context restored from the session, to shed leaked memory.
+
+        The replacement is opened and checked for the compose button before the old one is closed;
+        if that fails, the old page and context are kept and False is returned.
+        """
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        if self.har_mode:
+            scope = "page"  # the HAR recorder / router is attached to the context
+        try:
+            if scope == "context":
+                storage_state = await self.context.storage_state()
+                self.sessions.save(self.session_file, storage_state)
+                context = await self.browser.new_context(ignore_https_errors=True, bypass_csp=True, storage_state=storage_state)
+            else:
+                context = self.context
+            page = None
+            try:
+                page = await context.new_page()
+                await page.goto(config["url"], timeout=60000)
+                await page.wait_for_selector(config["compose_selector"], state="visible", timeout=30000)
+            except Exception:
+                if context is not self.context:
+                    await context.close()
+                elif page:
+                    await page.close()
+                raise
+        except Exception as e:
+            logger.error("Recycling the %s failed for %s, keeping the old one: %s", scope, self.provider, e)
+            return False
+
+        old = self.context if scope == "context" else self.page
+        self.context, self.page = context, page
+        try:
+            await old.close()
+        except Exception as e:
+            logger.warning("Closing the recycled %s failed: %s", scope, e)
+        return True
+
+    async def save_draft(
+        self,
+        subject: Optional[str] = None,
+        recipient: Optional[str] = None,
+        known_refs: Iterable[str] = (),
+        attempts: int = 3,
+        body: Optional[str] = None,
+        attachments: Iterable[str] = (),
+    ) -> Optional[str]:
+        """
+        Leave the composed email in Drafts and return the provider's draft id.
+
+        Closes the compose window (the provider saves it), opens the newest draft listed with
+        this subject and recipient, and reads the id from its URL. The id is only returned once
+        the opened draft is verified to hold this subject, recipient, start of `body` and
+        `attachments` (file names) and is not one of `known_refs` (drafts already recorded);
+        providers save asynchronously, so the list is re-read a few times before giving up.
+        """
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        if not config.get("drafts_url"):
+            logger.error("Draft staging is not supported for %s", self.provider)
+            return None
+        known_refs = set(known_refs)
+        match_args = [config["compose_root_selectors"], subject, recipient, draft_body_prefix(body), [Path(a).name for a in attachments]]
+        pattern = re.compile(config["draft_ref_pattern"])
+        try:
+            if config["close_compose_selector"]:
+                await self.page.locator(config["close_compose_selector"]).first.click(timeout=5000)
+                holds, _ = await self.check_postcondition({"kind": "dialog_closed"})
+                if not holds:
+                    return None
+            draft_ref = None
+            for attempt in range(attempts):
+                if attempt:
+                    await self.page.wait_for_timeout(2000)
+                await self.page.goto(config["drafts_url"], timeout=60000)
+                rows = self.page.locator(config["draft_row_selector"])
+                if subject:
+                    rows = rows.filter(has_text=subject)
+                # Lists often show a contact name instead of the address; then the check below decides
+                if recipient and await rows.filter(has_text=recipient).count():
+                    rows = rows.filter(has_text=recipient)
+                await rows.first.click(timeout=15000)
+                await self.page.wait_for_url(pattern, timeout=15000)
+                candidate = pattern.search(self.page.url).group(1)
+                if candidate in known_refs:
+                    logger.info("Newest matching draft %s is already recorded; waiting for the new one to be saved", candidate)
+                    continue
+                try:
+                    await self.page.wait_for_function(DRAFT_MATCH_JS, arg=match_args, polling=250, timeout=10000)
+                except TimeoutError:
+                    logger.info("Draft %s does not hold the composed email to %r (%r); retrying", candidate, recipient, subject)
+                    continue
+                draft_ref = candidate
+                break
+            await self.page.goto(config["url"], timeout=60000)
+            await self.page.wait_for_selector(config["compose_selector"], state="visible", timeout=30000)
+            if draft_ref is None:
+                logger.error("Could not find the saved %s draft for %s (%r)", self.provider, recipient, subject)
+                self.diagnostics.capture(self.page, f"{self.provider}_draft_not_found", clip_to_compose=False)
+                return None
+            logger.info("Saved %s draft %s", self.provider, draft_ref)
+            return draft_ref
+        except Exception as e:
+            logger.error("Saving the draft failed for %s: %s", self.provider, e)
+            self.diagnostics.capture(self.page, f"{self.provider}_draft_failure", clip_to_compose=False)
+            return None
+
+    async def open_draft(
+        self,
+        draft_ref: str,
+        subject: Optional[str] = None,
+        recipient: Optional[str] = None,
+        body: Optional[str] = None,
+        attachments: Iterable[str] = (),
+    ) -> Tuple[bool, str]:
+        """Open a saved draft in a compose window and check it is the expected email; returns (ok, error)"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        if not config.get("draft_url"):
+            return False, f"Drafts are not supported for {self.provider}"
+        try:
+            await self.page.goto(config["draft_url"].format(draft_ref=draft_ref), timeout=60000)
+            await self.page.wait_for_function(
+                DRAFT_MATCH_JS,
+                arg=[config["compose_root_selectors"], subject, recipient, draft_body_prefix(body), [Path(a).name for a in attachments]],
+                polling=250,
+                timeout=30000,
+            )
+            return True, ""
+        except TimeoutError:
+            self.diagnostics.capture(self.page, f"{self.provider}_draft_mismatch", clip_to_compose=False)
+            return False, (
+                f"Draft {draft_ref} did not open with subject {subject!r}, recipient {recipient!r}, "
+                "the staged body and its attachments"
+            )
+        except Exception as e:
+            return False, f"Could not open draft {draft_ref}: {e}"
+
+    async def refresh(self):
+        """Reload the mailbox and wait for it to be usable again"""
+        config = self.provider_config.get(self.provider, self.provider_config["gmail"])
+        await self.page.reload(timeout=60000)
+        try:
+            await self.page.wait_for_selector(config["compose_selector"], state="visible", timeout=30000)
+        except TimeoutError:
+            logger.warning("Timeout waiting for %s after refresh", config["compose_selector"])
@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.utils.log import init_worker_logging, start_worker_log_relay
+from agents.utils.models import EmailDetails
+from agents.utils.tools import provider_names, register_provider
+
+ShardKey = Tuple[str, Optional[str]]  # (provider, account)
+Shard = List[Tuple[ShardKey, List[Tuple[int, Dict[str, Any]]]]]
+
+DETAIL_FIELDS = ("recipient", "subject", "body", "attachments", "priority")
+
+
+def job_key(job: Dict[str, Any], default_provider: str = "gmail") -> ShardKey:
+    provider = job.get("provider") or default_provider
+    if provider not in provider_names():
+        raise ValueError(f"Unknown provider {provider!r} for {job.get('recipient')}; expected one of {', '.join(provider_names())}")
+    return provider, job.get("account") or None
+
+
+def job_details(job: Dict[str, Any]) -> EmailDetails:
+    values = {field: job[field] for field in DETAIL_FIELDS if job.get(field)}
+    if isinstance(values.get("attachments"), str):
+        values["attachments"] = [a.strip() for a in values["attachments"].split(";") if a.strip()]
+    return EmailDetails(**values)
+
+
+def shard_jobs(jobs: List[Dict[str, Any]], workers: int, default_provider: str = "gmail") -> List[Shard]:
+    """
+    Split jobs across workers so every (provider, account) pair has exactly one owner.
+
+    A session's storage state is then only ever read and written by one process. Groups are
+    placed largest first on the least loaded worker.
+    """
+    groups: "OrderedDict[ShardKey, List[Tuple[int, Dict[str, Any]]]]" = OrderedDict()
+    for index, job in enumerate(jobs):
+        groups.setdefault(job_key(job, default_provider), []).append((index, job))
+    shards: List[Shard] = [[] for _ in range(max(1, min(workers, len(groups))))]
+    loads = [0] * len(shards)
+    for key, items in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        target = loads.index(min(loads))
+        shards[target].append((key, items))
+        loads[target] += len(items)
+    return [shard for shard in shards if shard]
+
+
+async def _send_shard(shard: Shard, plan: Optional[List[Dict[str, Any]]], headless: bool) -> List[Tuple[int, Dict[str, Any]]]:
+    from agents.merge import send_emails
+
+    results = []
+    for (provider, account), items in shard:
+        emails = [job_details(job) for _, job in items]
+        # Each worker runs its own browser; the shared daemon would serialize them again
+        sent = await send_emails(provider, emails, account=account, plan=plan, headless=headless, use_daemon=False)
+        for (index, _), result in zip(items, sent):
+            results.append((index, {**result, "provider": provider, "account": account, "worker": os.getpid()}))
+    return results
+
+
+def run_shard(shard: Shard, plan: Optional[List[Dict[str, Any]]] = None, headless: bool = True) -> List[Tuple[int, Dict[str, Any]]]:
+    """Worker process entry point: one event loop, one browser and one LLM client per process"""
+    return asyncio.run(_send_shard(shard, plan, headless))
+
+
+def _init_worker(log_records: Any, providers: Dict[str, Dict[str, Any]]):
+    init_worker_logging(log_records)
+    for name, config in providers.items():
+        register_provider(name, config)
+
+
+def run_supervisor(
+    jobs: List[Dict[str, Any]],
+    workers: int,
+    plan: Optional[List[Dict[str, Any]]] = None,
+    headless: bool = True,
+    default_provider: str = "gmail",
+    providers: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Send all jobs with up to `workers` spawned processes; results are returned in job order.
+
+    `providers` are extra provider configs (see tools.register_provider), registered here and in
+    every worker. Jobs for any other unknown provider are rejected before a worker starts.
+    """
+    providers = providers or {}
+    for name, config in providers.items():
+        register_provider(name, config)
+    shards = shard_jobs(jobs, workers, default_provider)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+    # spawn, not fork: Playwright and the LLM clients hold threads and sockets that must not be shared
+    context = multiprocessing.get_context("spawn")
+    # Workers log through the parent's sinks, so only this process writes the log file
+    log_records = context.Queue()
+    relay = start_worker_log_relay(log_records)
+    with contextlib.ExitStack() as stack:
+        stack.callback(relay.stop)
+        pool = stack.enter_context(ProcessPoolExecutor(
+            max_workers=len(shards), mp_context=context, initializer=_init_worker, initargs=(log_records, providers),
+        ))
+        futures = {pool.submit(run_shard, shard, plan, headless): shard for shard in shards}
+        for future in as_completed(futures):
+            try:
+                for index, result in future.result():
+                    results[index] = result
+            except Exception as e:
+                for (provider, account), items in futures[future]:
+                    for index, job in items:
+                        results[index] = {
+                            "recipient": job.get("recipient"), "sent": False, "seconds": 0.0,
+                            "error": f"Worker failed: {e}", "provider": provider, "account": account, "worker": None,
+                        }
+    return results
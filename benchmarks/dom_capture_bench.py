@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: full-document DOM capture vs the scoped capture engine on a large fixture inbox.
+
+Usage:
+    python -m benchmarks.dom_capture_bench --rows 5000 --runs 20
+"""
+import asyncio
+import statistics
+import time
+import typer
+from playwright.async_api import async_playwright
+from rich.console import Console
+from rich.table import Table
+
+from agents.utils.dom_capture import DEFAULT_MAX_ELEMENTS, capture_dom
+from benchmarks.fixtures import large_inbox_html
+from benchmarks.stats import percentile
+
+console = Console()
+
+# The previous whole-document capture, kept here only as the baseline for comparison
+LEGACY_DOM_JS = """
+() => {
+    const snapshot = { url: window.location.href, title: document.title, compose_open: false,
+                       clickable_elements: [], input_fields: [], buttons: [] };
+    const composeSelectors = ['div[role="dialog"]', '[aria-label*="compose" i], [aria-label*="new message" i]', '[data-testid*="compose"]'];
+    snapshot.compose_open = composeSelectors.some(sel => document.querySelector(sel));
+    document.querySelectorAll('button, [role="button"], a, [data-tooltip], [aria-label]').forEach(el => {
+        const text = el.textContent?.trim() || el.getAttribute('aria-label') || el.getAttribute('data-tooltip') || '';
+        if (text.length > 0 && text.length < 100) {
+            snapshot.clickable_elements.push({ text: text, tag: el.tagName.toLowerCase(),
+                selector: el.id ? `#${el.id}` : (el.className ? `.${el.className.split(' ')[0]}` : el.tagName.toLowerCase()),
+                visible: el.offsetParent !== null });
+        }
+    });
+    document.querySelectorAll('input, textarea, [contenteditable="true"], [role="textbox"]').forEach(el => {
+        snapshot.input_fields.push({ type: el.type || 'text', placeholder: el.placeholder || '',
+            aria_label: el.getAttribute('aria-label') || '', name: el.name || '', value: el.value || el.textContent || '',
+            selector: el.id ? `#${el.id}` : (el.name ? `[name="${el.name}"]` : (el.className ? `.${el.className.split(' ')[0]}` : el.tagName.toLowerCase())),
+            visible: el.offsetParent !== null });
+    });
+    ['Send', 'New message', 'Attach', 'To', 'Subject'].forEach(text => {
+        const selector = `[aria-label*="${text}" i], [data-tooltip*="${text}" i], [title*="${text}" i]`;
+        document.querySelectorAll(selector).forEach(el => {
+            if (!snapshot.buttons.some(b => b.text === text)) {
+                snapshot.buttons.push({ text: text, selector: el.id ? `#${el.id}` : `[aria-label*="${text}" i]`, available: el.offsetParent !== null });
+            }
+        });
+    });
+    return snapshot;
+}
+"""
+
+
+async def _time_capture(page, capture, runs: int):
+    timings = []
+    size = 0
+    for _ in range(runs):
+        # Invalidate layout between runs so each capture pays for its own layout work, as after a real action
+        await page.evaluate("() => { document.body.style.paddingTop = document.body.style.paddingTop ? '' : '1px'; }")
+        start = time.perf_counter()
+        result = await capture()
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(result["clickable_elements"]) + len(result["input_fields"])
+    return timings, size
+
+
+async def run_benchmark(rows: int, runs: int, max_elements: int):
+    table = Table(title=f"DOM capture, {rows} inbox rows, {runs} runs")
+    for column in ("Page state", "Engine", "Median ms", "p95 ms", "Elements"):
+        table.add_column(column)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page(viewport={"width": 1366, "height": 768})
+        for compose_open in (False, True):
+            await page.set_content(large_inbox_html(rows, compose_open=compose_open))
+            engines = {
+                "legacy (whole document)": lambda: page.evaluate(LEGACY_DOM_JS),
+                "scoped": lambda: capture_dom(
+                    page,
+                    toolbar_selectors=['[role="banner"]', '[gh="mtb"]', '[role="navigation"]'],
+                    max_elements=max_elements,
+                ),
+            }
+            for name, capture in engines.items():
+                timings, size = await _time_capture(page, capture, runs)
+                table.add_row(
+                    "compose open" if compose_open else "inbox",
+                    name,
+                    f"{statistics.median(timings):.1f}",
+                    f"{percentile(timings, 0.95):.1f}",
+                    str(size),
+                )
+        await browser.close()
+
+    console.print(table)
+
+
+def main(
+    rows: int = typer.Option(5000, help="Number of messages in the fixture inbox"),
+    runs: int = typer.Option(20, help="Captures per engine"),
+    max_elements: int = typer.Option(DEFAULT_MAX_ELEMENTS, help="Element cap for the scoped engine"),
+):
+    asyncio.run(run_benchmark(rows, runs, max_elements))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,142 @@
+"""
+Local fixture pages that mimic a webmail client, used by the benchmarks.
+"""
+import html
+
+
+def large_inbox_html(rows: int = 5000, compose_open: bool = False) -> str:
+    """Build a mailbox page with `rows` messages, each carrying several clickable/labelled elements."""
+    toolbar = """
+    <header role="banner">
+        <button aria-label="Main menu">Menu</button>
+        <input type="search" aria-label="Search mail" placeholder="Search mail">
+        <a href="#settings" aria-label="Settings">Settings</a>
+    </header>
+    <div gh="mtb" role="toolbar">
+        <div role="button" aria-label="Compose">Compose</div>
+        <div role="button" data-tooltip="Refresh">Refresh</div>
+        <div role="button" data-tooltip="More">More</div>
+    </div>
+    """
+    items = []
+    for i in range(rows):
+        sender = html.escape(f"Sender {i}")
+        items.append(f"""
+        <tr class="zA row-{i}" role="row">
+            <td><div role="checkbox" aria-label="Select message {i}"></div></td>
+            <td><span role="button" aria-label="Star message {i}" data-tooltip="Not starred"></span></td>
+            <td><span class="yP" email="sender{i}@example.com">{sender}</span></td>
+            <td><a href="#inbox/{i}" class="bog">Subject line number {i} - quarterly report follow-up</a></td>
+            <td>
+                <button aria-label="Archive" data-tooltip="Archive"></button>
+                <button aria-label="Delete" data-tooltip="Delete"></button>
+                <button aria-label="Mark as read" data-tooltip="Mark as read"></button>
+                <button aria-label="Snooze" data-tooltip="Snooze"></button>
+            </td>
+        </tr>""")
+    compose = ""
+    if compose_open:
+        compose = """
+        <div role="dialog" aria-label="New Message" style="position:fixed;bottom:0;right:0;width:500px;background:#fff">
+            <input aria-label="To recipients" name="to" type="text">
+            <input aria-label="Subject" name="subjectbox" type="text">
+            <div contenteditable="true" role="textbox" aria-label="Message Body"></div>
+            <div role="button" aria-label="Send ‪(Ctrl-Enter)‬" data-tooltip="Send">Send</div>
+            <div role="button" aria-label="Attach files" data-tooltip="Attach files"></div>
+            <img aria-label="Save &amp; close" alt="Close">
+        </div>"""
+    return f"""<!DOCTYPE html>
+<html>
+<head><title>Inbox (fixture) - Mail</title></head>
+<body>
+    {toolbar}
+    <div role="navigation" aria-label="Folders">
+        <a href="#inbox" aria-label="Inbox">Inbox</a>
+        <a href="#sent" aria-label="Sent">Sent</a>
+        <a href="#drafts" aria-label="Drafts">Drafts</a>
+    </div>
+    <div role="main">
+        <table role="grid"><tbody>{''.join(items)}</tbody></table>
+    </div>
+    {compose}
+</body>
+</html>"""
+
+
+def mail_app_html(rows: int = 200) -> str:
+    """Interactive fixture client: Compose opens a dialog, Send closes it and shows a 'Message sent' toast."""
+    page = large_inbox_html(rows, compose_open=False)
+    script = """
+    <template id="compose-template">
+        <div role="dialog" aria-label="New Message" style="position:fixed;bottom:0;right:0;width:500px;background:#fff">
+            <input aria-label="To recipients" name="to" type="text">
+            <input aria-label="Subject" name="subjectbox" type="text">
+            <div contenteditable="true" role="textbox" aria-label="Message Body"></div>
+            <input type="file" multiple style="display:none">
+            <div role="button" aria-label="Send ‪(Ctrl-Enter)‬" data-tooltip="Send">Send</div>
+        </div>
+    </template>
+    <div aria-live="polite" id="toast"></div>
+    <script>
+        document.querySelector('[aria-label="Compose"]').addEventListener('click', () => {
+            if (document.querySelector('div[role="dialog"]')) return;
+            const dialog = document.getElementById('compose-template').content.firstElementChild.cloneNode(true);
+            dialog.querySelector('[data-tooltip="Send"]').addEventListener('click', () => {
+                const to = dialog.querySelector('[name="to"]').value;
+                if (!to.includes('@')) return;
+                dialog.remove();
+                const toast = document.getElementById('toast');
+                toast.textContent = 'Message sent';
+                setTimeout(() => { toast.textContent = ''; }, 1500);
+            });
+            document.body.appendChild(dialog);
+        });
+    </script>"""
+    return page.replace("</body>", script + "\n</body>")
+
+
+# Replay plan for the fixture client, with the placeholders used by plan_replay.templatize_steps
+FIXTURE_PLAN = [
+    {"type": "click", "selector": "[aria-label='Compose']", "expect": {"kind": "visible", "selector": "div[role='dialog']"}},
+    {"type": "fill", "selector": "[name='to']", "value": "{{ recipient }}"},
+    {"type": "fill", "selector": "[name='subjectbox']", "value": "{{ subject }}"},
+    {"type": "fill", "selector": "div[aria-label='Message Body']", "value": "{{ body }}"},
+    {"type": "click", "selector": "div[data-tooltip='Send']", "expect": {"kind": "sent_toast"}},
+]
+
+
+def fixture_provider(url: str) -> dict:
+    """Provider config for the fixture client served at `url`, for tools.register_provider"""
+    return {
+        "url": url,
+        "compose_selector": "[aria-label='Compose']",
+        "compose_root_selectors": ['div[role="dialog"]'],
+        "toolbar_selectors": ['[role="banner"]', '[gh="mtb"]', '[role="navigation"]'],
+        "attach_selector": "input[type='file']",
+        "upload_progress_selector": "div[role='dialog'] [role='progressbar']",
+        "sent_texts": ["Message sent"],
+        "send_selector": "div[data-tooltip='Send']",
+    }
+
+
+def serve_fixture(content: str, port: int = 0):
+    """Serve `content` at / from a background thread; returns (server, url). Call server.shutdown() when done."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = content.encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
@@ -0,0 +1,136 @@
+"""
+Offline benchmark on production markup: replay a recorded provider UI from a HAR file and time
+the executor (setup, DOM capture, actions, postconditions) or a full agent run against it.
+
+Record once with a real send:
+    python cli.py run --provider gmail --details details.json --record-har recordings/gmail.har
+
+Then, without network access:
+    python -m benchmarks.har_replay --har recordings/gmail.har --runs 5
+    python -m benchmarks.har_replay --har recordings/gmail.har --agent --details details.json
+"""
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from agents.utils.log import setup_logging
+from agents.utils.tools import PlaywrightExecutor, har_steps_path
+from benchmarks.stats import percentile
+
+console = Console()
+
+PHASES = ("setup", "get_dom", "actions", "postconditions", "confirm_sent", "total")
+
+
+async def _replay_once(provider: str, har: Path, steps: List[Dict], headless: bool) -> Dict[str, Any]:
+    """One scripted pass over the recorded steps; returns milliseconds per phase (and the failure, if any)"""
+    timings = {phase: 0.0 for phase in PHASES}
+    executor = PlaywrightExecutor(provider, headless=headless, use_daemon=False, har_mode="replay", har_path=har)
+
+    def elapsed(start: float) -> float:
+        return (time.perf_counter() - start) * 1000
+
+    run_start = time.perf_counter()
+    try:
+        start = time.perf_counter()
+        if not await executor.setup():
+            return {**timings, "error": "setup failed"}
+        timings["setup"] = elapsed(start)
+
+        start = time.perf_counter()
+        await executor.get_dom()
+        timings["get_dom"] += elapsed(start)
+
+        for index, step in enumerate(steps, start=1):
+            if step.get("type") == "screenshot":
+                continue
+            start = time.perf_counter()
+            result = await executor.execute_action(step)
+            timings["actions"] += elapsed(start)
+            if not result["success"]:
+                return {**timings, "error": f"step {index} ({step.get('type')} {step.get('selector')}): {result['error']}"}
+            if executor.is_send(step):
+                start = time.perf_counter()
+                await executor.confirm_sent()
+                timings["confirm_sent"] += elapsed(start)
+                break
+            if step.get("expect"):
+                start = time.perf_counter()
+                await executor.check_postcondition(step["expect"])
+                timings["postconditions"] += elapsed(start)
+            if not step.get("expect") or step.get("recapture"):
+                # Same recapture rule as the agent: a verified postcondition skips the snapshot
+                start = time.perf_counter()
+                await executor.get_dom()
+                timings["get_dom"] += elapsed(start)
+        timings["total"] = elapsed(run_start)
+        return timings
+    finally:
+        await executor.cleanup()
+
+
+async def run_steps_benchmark(har: Path, runs: int, headless: bool):
+    recorded = json.loads(har_steps_path(har).read_text())
+    provider, steps = recorded["provider"], recorded["steps"]
+
+    results = [await _replay_once(provider, har, steps, headless) for _ in range(runs)]
+    failures = [r["error"] for r in results if "error" in r]
+    ok = [r for r in results if "error" not in r]
+
+    table = Table(title=f"HAR replay: {provider}, {len(steps)} recorded steps, {len(ok)}/{runs} clean runs")
+    for column in ("Phase", "Median ms", "p95 ms"):
+        table.add_column(column)
+    for phase in PHASES:
+        values = [r[phase] for r in ok]
+        if values:
+            table.add_row(phase, f"{statistics.median(values):.0f}", f"{percentile(values, 0.95):.0f}")
+    console.print(table)
+    for failure in dict.fromkeys(failures):
+        console.print(f"[red]❌ {failure}[/red]")
+    return not failures
+
+
+async def run_agent_benchmark(har: Path, provider: Optional[str], details_file: Path) -> bool:
+    from agents.agent import run_email_agent
+    from agents.utils.models import EmailDetails
+
+    provider = provider or json.loads(har_steps_path(har).read_text())["provider"]
+    details = EmailDetails.model_validate_json(details_file.read_text())
+    start = time.perf_counter()
+    state = await run_email_agent(provider, details=details, har_mode="replay", har_path=har)
+    elapsed = time.perf_counter() - start
+    status = state.status if state else "error"
+    console.print(
+        f"[bold]Agent against replayed {provider}: {status} in {elapsed:.1f}s, "
+        f"{len(state.current_plan) if state else 0} planned steps[/bold]"
+    )
+    return bool(state and state.done)
+
+
+def main(
+    har: Path = typer.Option(..., exists=True, dir_okay=False, help="HAR recorded with 'run --record-har'"),
+    runs: int = typer.Option(5, help="Scripted replays of the recorded steps"),
+    agent: bool = typer.Option(False, help="Run the full agent (LLM planner) against the replayed UI instead"),
+    details: Optional[Path] = typer.Option(None, exists=True, dir_okay=False, help="EmailDetails JSON for --agent"),
+    provider: Optional[str] = typer.Option(None, help="Provider for --agent (default: from the steps file)"),
+    headless: bool = typer.Option(True, help="Run the browser headless"),
+):
+    if agent:
+        if not details:
+            raise typer.BadParameter("--agent needs --details")
+        setup_logging()
+        ok = asyncio.run(run_agent_benchmark(har, provider, details))
+    else:
+        ok = asyncio.run(run_steps_benchmark(har, runs, headless))
+    raise typer.Exit(code=0 if ok else 1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
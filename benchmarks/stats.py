@@ -0,0 +1,13 @@
+"""
+Summary statistics shared by the benchmarks.
+"""
+import math
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], fraction: float) -> float:
+    """Nearest-rank percentile: the smallest value with at least `fraction` of the values at or below it"""
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile of no values")
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
@@ -0,0 +1,83 @@
+"""
+Throughput benchmark: emails/minute against the local fixture mail client as the worker count grows.
+
+Every send replays FIXTURE_PLAN (no LLM calls), so the numbers measure browser work and
+process scaling only. Jobs are spread over `--accounts` fake accounts; each account is owned
+by one worker, so at most that many workers can run in parallel.
+
+Usage:
+    python -m benchmarks.worker_throughput_bench --emails 60 --workers 1,2,4
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def main(
+    emails: int = typer.Option(60, help="Emails sent per worker count"),
+    workers: str = typer.Option("1,2,4", help="Comma-separated worker counts to compare"),
+    accounts: int = typer.Option(0, help="Fake accounts to spread jobs over (default: the largest worker count)"),
+    rows: int = typer.Option(200, help="Inbox rows in the fixture page"),
+):
+    # Spawned workers inherit sys.path, so they can import the repo from the scratch dir below
+    sys.path.insert(0, str(REPO_ROOT))
+    from agents.workers import run_supervisor
+    from benchmarks.fixtures import FIXTURE_PLAN, fixture_provider, mail_app_html, serve_fixture
+
+    counts = [int(n) for n in workers.split(",") if n.strip()]
+    accounts = accounts or max(counts)
+    server, url = serve_fixture(mail_app_html(rows))
+    providers = {"fixture": fixture_provider(url)}  # registered in every worker
+
+    table = Table(title=f"Fixture sends: {emails} emails over {accounts} accounts")
+    for column in ("Workers", "Sent", "Seconds", "Emails/min", "Speed-up"):
+        table.add_column(column)
+
+    cwd = os.getcwd()
+    baseline = None
+    with tempfile.TemporaryDirectory() as scratch:
+        # Fixture sessions and screenshots land here, not in the real sessions/ folder
+        os.chdir(scratch)
+        try:
+            for count in counts:
+                jobs = [
+                    {
+                        "provider": "fixture",
+                        "account": f"bench{i % accounts}",
+                        "recipient": f"user{i}@example.com",
+                        "subject": f"Benchmark message {i}",
+                        "body": f"Hello user {i}, this is a throughput benchmark message.",
+                    }
+                    for i in range(emails)
+                ]
+                start = time.perf_counter()
+                results = run_supervisor(jobs, count, plan=FIXTURE_PLAN, headless=True, providers=providers)
+                elapsed = time.perf_counter() - start
+                sent = sum(1 for r in results if r and r["sent"])
+                rate = sent / elapsed * 60
+                if baseline is None:
+                    baseline = rate  # the first worker count; nothing sent there leaves no speed-up to show
+                speed_up = f"{rate / baseline:.2f}x" if baseline else "n/a"
+                table.add_row(str(count), f"{sent}/{emails}", f"{elapsed:.1f}", f"{rate:.1f}", speed_up)
+                failures = [r["error"] for r in results if r and not r["sent"]]
+                if failures:
+                    console.print(f"[yellow]{count} worker(s): {len(failures)} failed, e.g. {failures[0]}[/yellow]")
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -2,16 +2,23 @@
 Command Line Interface for the Email Agent System.
 """
 import asyncio
+import contextlib
 import enum
+import json
+import os
+import sys
+import time
 import typer
 from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
-from typing import Dict
+from typing import Any, Dict, Optional, Tuple
 
 from agents.agent import run_email_agent
 from agents.actions.playwright_execution import PlaywrightExecutor
+from agents.utils.log import setup_logging
+from agents.utils.sessions import get_session_registry, session_path
 
 app = typer.Typer(
     name="emailing-agent",
@@ -21,6 +28,11 @@ app = typer.Typer(
 
 console = Console()
 
+@app.callback()
+def configure_logging():
+    # Log sinks belong to the process, so only the CLI sets them up, never a module import
+    setup_logging()
+
 class Provider(str, enum.Enum):
     gmail = "gmail"
     outlook = "outlook"
@@ -32,7 +44,16 @@ PROVIDER_CONFIG = {
     "outlook": {"url": "https://outlook.live.com", "session_file": "sessions/outlook_auth.json", "compose_selector": "[aria-label*='New message']"}
 }
 
-async def setup_session(provider: str) -> bool:
+def session_problem(provider: str, account: Optional[str] = None) -> Optional[str]:
+    """Why a saved session cannot be used (checked offline from its cookies), or None if it can."""
+    status = get_session_registry().status(provider, account)
+    if status.usable:
+        return None
+    if status.state == "missing":
+        return f"No session found for {provider} at {status.path}. Run 'start' first."
+    return f"The {provider} session at {status.path} is {status.state}: {status.reason}. Run 'start' to log in again."
+
+async def setup_session(provider: str, account: Optional[str] = None) -> bool:
     """Set up authentication session for a given provider."""
     from playwright.async_api import async_playwright
     import json
@@ -66,10 +87,7 @@ async def setup_session(provider: str) -> bool:
             
             # Save the session
             storage_state = await context.storage_state()
-            session_file = Path(config["session_file"])
-            session_file.parent.mkdir(exist_ok=True)
-            with open(session_file, "w") as f:
-                json.dump(storage_state, f, indent=2)
+            get_session_registry().save(session_path(provider, account), storage_state, indent=2)
             
             await browser.close()
             console.print(f"[green]✅ {provider.capitalize()} session saved successfully![/green]")
@@ -84,18 +102,24 @@ async def setup_session(provider: str) -> bool:
             await browser.close()
             return False
 
-async def handle_session(provider: str) -> bool:
+async def handle_session(provider: str, account: Optional[str] = None) -> bool:
     """Check if session exists, ask user, and either reuse or setup a new session."""
     config = PROVIDER_CONFIG.get(provider)
     if not config:
         console.print(f"[bold red]❌ Invalid provider: {provider}[/bold red]")
         return False
     
-    session_file = Path(config["session_file"])
+    status = get_session_registry().status(provider, account)
+    session_file = status.path
     
-    if session_file.exists():
+    if status.state in ("expired", "invalid"):
+        console.print(f"[yellow]⚠️ Existing {provider} session at {session_file} is {status.state} ({status.reason}).[/yellow]")
+        console.print(f"[cyan]🔄 Setting up new {provider} session...[/cyan]")
+        return await setup_session(provider, account)
+    elif status.state != "missing":
+        note = f" ({status.reason})" if status.state == "expiring" else ""
         use_existing = typer.confirm(
-            f"Existing {provider} session found at {session_file}. Do you want to use it?",
+            f"Existing {provider} session found at {session_file}{note}. Do you want to use it?",
             default=True
         )
         if use_existing:
@@ -103,14 +127,15 @@ async def handle_session(provider: str) -> bool:
             return True
         else:
             console.print(f"[cyan]🔄 Setting up new {provider} session...[/cyan]")
-            return await setup_session(provider)
+            return await setup_session(provider, account)
     else:
         console.print(f"[cyan]🔄 No existing {provider} session found. Setting up new session...[/cyan]")
-        return await setup_session(provider)
+        return await setup_session(provider, account)
 
 @app.command("start")
 def start_sessions(
-    provider: Provider = typer.Option(Provider.gmail, help="Email provider to set up (gmail, outlook, or both)")
+    provider: Provider = typer.Option(Provider.gmail, help="Email provider to set up (gmail, outlook, or both)"),
+    account: Optional[str] = typer.Option(None, help="Account name, for keeping several sessions per provider (used by send-batch)"),
 ):
     """Set up pre-authenticated browser sessions for Gmail and/or Outlook."""
     async def async_start():
@@ -129,9 +154,9 @@ def start_sessions(
         try:
             success = True
             if provider in [Provider.gmail, Provider.both]:
-                success &= await handle_session(Provider.gmail.value)
+                success &= await handle_session(Provider.gmail.value, account)
             if provider in [Provider.outlook, Provider.both]:
-                success &= await handle_session(Provider.outlook.value)
+                success &= await handle_session(Provider.outlook.value, account)
             
             if success:
                 console.print("\n[bold green]✅ Session setup completed![/bold green]")
@@ -143,11 +168,87 @@ def start_sessions(
     
     asyncio.run(async_start())
 
+def scripted_result(provider: str, final_state, elapsed: float, error: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+    """Machine-readable result and exit code for a non-interactive run (0 sent, 2 needs input, 1 failed)."""
+    status = final_state.status if final_state else "error"
+    # Only a send confirmed by the mail client counts; a FINALIZE from the conversation does not
+    sent = bool(final_state and final_state.sent_confirmed)
+    result = {
+        "provider": provider,
+        "status": status,
+        "sent": sent,
+        "result": final_state.result if final_state else None,
+        "error": error or (final_state.error_message if final_state else "Agent run failed"),
+        "email_details": final_state.email_details.model_dump() if final_state and final_state.email_details else None,
+        "steps": len(final_state.current_plan) if final_state else 0,
+        "elapsed_seconds": round(elapsed, 2),
+    }
+    if sent:
+        return result, 0
+    return result, 2 if status == "needs_input" else 1
+
+async def run_scripted(
+    provider: str,
+    task: Optional[str],
+    details_file: Optional[Path],
+    on_question: str,
+    answer: str,
+    har: Tuple[Optional[str], Optional[Path]] = (None, None),
+) -> int:
+    """Run a single send without prompts and print a JSON result as the only stdout output."""
+    from agents.utils.models import EmailDetails
+
+    start = time.monotonic()
+    final_state = None
+    error = None
+    # Progress output goes to stderr so stdout carries only the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            problem = session_problem(provider) if har[0] != "replay" else None
+            if problem:
+                raise RuntimeError(problem)
+            details = EmailDetails.model_validate_json(details_file.read_text()) if details_file else None
+            final_state = await run_email_agent(
+                provider=provider,
+                task=task,
+                details=details,
+                auto_answer=answer if on_question == "auto" else None,
+                har_mode=har[0],
+                har_path=har[1],
+            )
+        except Exception as e:
+            error = str(e)
+    result, code = scripted_result(provider, final_state, time.monotonic() - start, error)
+    print(json.dumps(result))
+    return code
+
 @app.command("run")
 def run_agent(
-    provider: Provider = typer.Option(Provider.gmail, help="Email provider to use (gmail or outlook)")
+    provider: Provider = typer.Option(Provider.gmail, help="Email provider to use (gmail or outlook)"),
+    task: Optional[str] = typer.Option(None, "--task", help="Natural-language request to run without prompts"),
+    details: Optional[Path] = typer.Option(None, "--details", exists=True, dir_okay=False, help="JSON file with recipient, subject, body, attachments"),
+    on_question: str = typer.Option("fail", "--on-question", help="Non-interactive runs: 'fail' fast or 'auto' answer agent questions"),
+    answer: str = typer.Option(
+        "Use your best judgement with the details given and proceed.",
+        "--answer",
+        help="Reply used for --on-question auto",
+    ),
+    record_har: Optional[Path] = typer.Option(None, "--record-har", dir_okay=False, help="Record the browser traffic and executed steps of this run to a HAR file"),
+    replay_har: Optional[Path] = typer.Option(None, "--replay-har", exists=True, dir_okay=False, help="Serve the mail UI from a recorded HAR, fully offline"),
 ):
     """Run the email agent for the specified provider."""
+    if record_har and replay_har:
+        raise typer.BadParameter("Use only one of --record-har and --replay-har")
+    har = ("record", record_har) if record_har else ("replay", replay_har) if replay_har else (None, None)
+
+    if task or details:
+        if provider == Provider.both:
+            print(json.dumps({"provider": provider.value, "status": "error", "sent": False, "error": "The 'both' option is not supported for running the agent"}))
+            raise typer.Exit(code=1)
+        if on_question not in ("fail", "auto"):
+            raise typer.BadParameter("--on-question must be 'fail' or 'auto'")
+        raise typer.Exit(code=asyncio.run(run_scripted(provider.value, task, details, on_question, answer, har)))
+
     async def async_run():
         console.print(Panel(
             Text(f"🤖 Starting Email Agent for {provider.value.capitalize()}", style="bold cyan"),
@@ -159,9 +260,9 @@ def run_agent(
             console.print("[bold red]❌ The 'both' option is not supported for running the agent. Please choose 'gmail' or 'outlook'.[/bold red]")
             raise typer.Exit(code=1)
         
-        session_file = Path(PROVIDER_CONFIG[provider.value]["session_file"])
-        if not session_file.exists():
-            console.print(f"[bold yellow]⚠️ No session found for {provider.value}. Please run 'start' to set up a session first.[/bold yellow]")
+        problem = session_problem(provider.value) if har[0] != "replay" else None
+        if problem:
+            console.print(f"[bold yellow]⚠️ {problem}[/bold yellow]")
             if typer.confirm(f"Do you want to set up a {provider.value} session now?", default=True):
                 if await handle_session(provider.value):
                     console.print(f"[green]✅ Session setup complete. Starting email agent...[/green]")
@@ -173,7 +274,7 @@ def run_agent(
                 raise typer.Exit(code=1)
         
         try:
-            await run_email_agent(provider=provider.value)
+            await run_email_agent(provider=provider.value, har_mode=har[0], har_path=har[1])
             console.print(f"\n[bold green]✅ Email agent execution completed for {provider.value}.[/bold green]")
         except KeyboardInterrupt:
             console.print("\n[bold yellow]⚠️ Agent execution interrupted by user.[/bold yellow]")
@@ -184,6 +285,217 @@ def run_agent(
     
     asyncio.run(async_run())
 
+@app.command("merge")
+def mail_merge(
+    recipients: Path = typer.Option(..., "--recipients", exists=True, dir_okay=False, help="CSV, JSON or JSONL file with one row per recipient"),
+    subject: str = typer.Option(..., "--subject", help="Jinja2 template for the subject, e.g. 'Invoice for {{ name }}'"),
+    body_file: Path = typer.Option(..., "--body-file", exists=True, dir_okay=False, help="Jinja2 template file for the body"),
+    provider: Provider = typer.Option(Provider.gmail, help="Email provider to use (gmail or outlook)"),
+    recipient_field: str = typer.Option("email", help="Column holding the recipient address"),
+    result_file: Optional[Path] = typer.Option(None, help="Write per-recipient results as JSON"),
+):
+    """Send one templated email per recipient; the LLM plans only the first send."""
+    from agents.merge import run_mail_merge
+    from agents.utils.mail_merge import MailMergeTemplate, load_recipients
+
+    if provider == Provider.both:
+        console.print("[bold red]❌ The 'both' option is not supported for mail merge. Please choose 'gmail' or 'outlook'.[/bold red]")
+        raise typer.Exit(code=1)
+    problem = session_problem(provider.value)
+    if problem:
+        console.print(f"[bold red]❌ {problem}[/bold red]")
+        raise typer.Exit(code=1)
+
+    try:
+        template = MailMergeTemplate(subject, body_file.read_text(encoding="utf-8"), recipient_field=recipient_field)
+        rows = load_recipients(recipients)
+        template.render_all(rows)
+    except Exception as e:
+        console.print(f"[bold red]❌ Invalid template or recipients: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+    console.print(Panel(
+        Text(f"📬 Mail merge: {len(rows)} recipients via {provider.value.capitalize()}", style="bold cyan"),
+        title="[bold blue]Mail Merge[/bold blue]",
+        border_style="blue"
+    ))
+    start = time.monotonic()
+    results = asyncio.run(run_mail_merge(provider.value, template, rows))
+    elapsed = time.monotonic() - start
+
+    sent = sum(1 for r in results if r["sent"])
+    for r in results:
+        if r["error"]:
+            console.print(f"[red]❌ {r['recipient']}: {r['error']}[/red]")
+    console.print(f"\n[bold]{sent}/{len(results)} sent in {elapsed:.0f}s ({sent / max(elapsed, 1e-9) * 60:.1f} emails/min)[/bold]")
+    if result_file:
+        result_file.write_text(json.dumps(results, indent=2))
+    if sent < len(results):
+        raise typer.Exit(code=1)
+
+@app.command("send-batch")
+def send_batch(
+    jobs_file: Path = typer.Option(..., "--jobs", exists=True, dir_okay=False, help="CSV, JSON or JSONL file with one email per row"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes; each owns its own browser and LLM client"),
+    provider: Provider = typer.Option(Provider.gmail, help="Provider for rows without a 'provider' column"),
+    headless: bool = typer.Option(True, help="Run the workers' browsers headless"),
+    result_file: Optional[Path] = typer.Option(None, help="Write per-email results as JSON"),
+):
+    """Send a batch of emails with several worker processes, sharded by provider and account."""
+    from agents.utils.mail_merge import load_recipients
+    from agents.workers import job_key, run_supervisor
+
+    if provider == Provider.both:
+        console.print("[bold red]❌ The 'both' option is not supported as a default provider. Please choose 'gmail' or 'outlook'.[/bold red]")
+        raise typer.Exit(code=1)
+    try:
+        jobs = load_recipients(jobs_file)
+        keys = {job_key(job, provider.value) for job in jobs}
+    except Exception as e:
+        console.print(f"[bold red]❌ Invalid jobs file: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+    problems = [session_problem(p, a) for p, a in keys]
+    if any(problems):
+        for problem in filter(None, problems):
+            console.print(f"[bold red]❌ {problem}[/bold red]")
+        raise typer.Exit(code=1)
+
+    console.print(Panel(
+        Text(f"📦 Batch: {len(jobs)} emails over {len(keys)} session(s), up to {workers} workers", style="bold cyan"),
+        title="[bold blue]Batch Send[/bold blue]",
+        border_style="blue"
+    ))
+    start = time.monotonic()
+    results = run_supervisor(jobs, workers, headless=headless, default_provider=provider.value)
+    elapsed = time.monotonic() - start
+
+    sent = sum(1 for r in results if r["sent"])
+    for r in results:
+        if r["error"]:
+            console.print(f"[red]❌ {r['recipient']} ({r['provider']}/{r['account'] or 'default'}): {r['error']}[/red]")
+    console.print(f"\n[bold]{sent}/{len(results)} sent in {elapsed:.0f}s ({sent / max(elapsed, 1e-9) * 60:.1f} emails/min)[/bold]")
+    if result_file:
+        result_file.write_text(json.dumps(results, indent=2))
+    if sent < len(results):
+        raise typer.Exit(code=1)
+
+@app.command("stage-drafts")
+def stage_drafts(
+    jobs_file: Path = typer.Option(..., "--jobs", exists=True, dir_okay=False, help="CSV, JSON or JSONL file with one email per row"),
+    send_at: Optional[str] = typer.Option(None, help="Send time (ISO 8601) for rows without a 'send_at' column"),
+    provider: Provider = typer.Option(Provider.gmail, help="Provider for rows without a 'provider' column"),
+    headless: bool = typer.Option(False, help="Run the browser headless"),
+    result_file: Optional[Path] = typer.Option(None, help="Write per-email results as JSON"),
+):
+    """Compose emails ahead of time and save them as drafts to be sent by 'send-drafts'."""
+    from agents.drafts import stage_drafts as run_staging
+    from agents.utils.drafts import DraftStore, parse_due
+    from agents.utils.mail_merge import load_recipients
+    from agents.workers import job_key
+
+    if provider == Provider.both:
+        console.print("[bold red]❌ The 'both' option is not supported as a default provider. Please choose 'gmail' or 'outlook'.[/bold red]")
+        raise typer.Exit(code=1)
+    try:
+        jobs = load_recipients(jobs_file)
+        due_times = [parse_due(job.get("send_at") or send_at) if (job.get("send_at") or send_at) else None for job in jobs]
+        keys = {job_key(job, provider.value) for job in jobs}
+    except Exception as e:
+        console.print(f"[bold red]❌ Invalid jobs file: {e}[/bold red]")
+        raise typer.Exit(code=1)
+    if None in due_times:
+        console.print("[bold red]❌ Every row needs a send time: add a 'send_at' column or pass --send-at.[/bold red]")
+        raise typer.Exit(code=1)
+
+    problems = [session_problem(p, a) for p, a in keys]
+    if any(problems):
+        for problem in filter(None, problems):
+            console.print(f"[bold red]❌ {problem}[/bold red]")
+        raise typer.Exit(code=1)
+
+    console.print(Panel(
+        Text(f"📝 Staging {len(jobs)} drafts over {len(keys)} session(s)", style="bold cyan"),
+        title="[bold blue]Draft Staging[/bold blue]",
+        border_style="blue"
+    ))
+    results = asyncio.run(run_staging(jobs, due_times, DraftStore(), default_provider=provider.value, headless=headless))
+
+    staged = sum(1 for r in results if r["draft_id"])
+    for r in results:
+        if r["error"]:
+            console.print(f"[red]❌ {r['recipient']} ({r['provider']}/{r['account'] or 'default'}): {r['error']}[/red]")
+    console.print(f"\n[bold]{staged}/{len(results)} drafts staged. Run 'send-drafts --watch' to send them on time.[/bold]")
+    if result_file:
+        result_file.write_text(json.dumps(results, indent=2))
+    if staged < len(results):
+        raise typer.Exit(code=1)
+
+@app.command("send-drafts")
+def send_drafts(
+    watch: bool = typer.Option(False, help="Keep running and send each draft at its due time"),
+    lead_seconds: float = typer.Option(60.0, help="Open and verify a draft this many seconds before it is due"),
+    max_late_minutes: float = typer.Option(15.0, help="Mark drafts this far past their due time as missed instead of sending them"),
+    headless: bool = typer.Option(True, help="Run the browser headless"),
+):
+    """Send staged drafts that are due: open each one, verify it, then click Send and confirm."""
+    from agents.drafts import run_scheduler
+    from agents.utils.drafts import DraftStore
+
+    store = DraftStore()
+    next_due = store.next_due()
+    if next_due is None:
+        console.print("[yellow]⚠️ No staged drafts. Run 'stage-drafts' first.[/yellow]")
+        return
+    console.print(Panel(
+        Text(f"⏰ Draft scheduler: {store.counts()}, next due {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_due))}", style="bold cyan"),
+        title="[bold blue]Send Drafts[/bold blue]",
+        border_style="blue"
+    ))
+    try:
+        results = asyncio.run(run_scheduler(
+            store, watch=watch, lead_seconds=lead_seconds, headless=headless, max_late_seconds=max_late_minutes * 60
+        ))
+    except KeyboardInterrupt:
+        console.print("\n⚠️ Scheduler stopped; remaining drafts stay staged.", style="bold yellow")
+        return
+    sent = sum(1 for r in results if r["sent"])
+    console.print(f"\n[bold]{sent}/{len(results)} drafts sent; store: {store.counts()}[/bold]")
+    if sent < len(results):
+        raise typer.Exit(code=1)
+
+@app.command("browser-daemon")
+def browser_daemon(
+    provider: Provider = typer.Option(Provider.both, help="Mailboxes to keep open (gmail, outlook, or both)"),
+    port: int = typer.Option(9222, help="Chrome remote debugging port that runs attach to"),
+    headless: bool = typer.Option(False, help="Run the daemon's browser headless"),
+    profile_dir: Path = typer.Option(Path("sessions/daemon_profile"), help="Persistent browser profile directory"),
+):
+    """Keep a browser running with the mailboxes open so runs attach instantly over CDP."""
+    from agents.utils.browser_daemon import read_daemon_endpoint, run_daemon
+
+    existing = read_daemon_endpoint()
+    if existing:
+        console.print(f"[bold yellow]⚠️ A browser daemon is already running at {existing['endpoint']} (pid {existing['pid']}).[/bold yellow]")
+        raise typer.Exit(code=1)
+
+    providers = [p.value for p in (Provider.gmail, Provider.outlook) if provider in (p, Provider.both)]
+    for name in providers:
+        problem = session_problem(name)
+        if problem:
+            console.print(f"[yellow]⚠️ {problem} Or log in from the daemon window.[/yellow]")
+
+    console.print(Panel(
+        Text(f"🌐 Browser daemon for {', '.join(p.capitalize() for p in providers)} on port {port}", style="bold cyan"),
+        title="[bold blue]Browser Daemon[/bold blue]",
+        border_style="blue"
+    ))
+    try:
+        asyncio.run(run_daemon(providers, port=port, headless=headless, profile_dir=profile_dir))
+    except KeyboardInterrupt:
+        pass
+    console.print("[green]✅ Browser daemon stopped.[/green]")
+
 @app.command("check-sessions")
 def check_sessions():
     """Check available authentication sessions."""
@@ -197,13 +509,18 @@ def check_sessions():
     sessions_dir.mkdir(exist_ok=True)
     
     found = False
-    for provider, config in PROVIDER_CONFIG.items():
-        session_file = Path(config["session_file"])
-        if session_file.exists():
-            console.print(f"[green]✅ {provider.capitalize()} session found at {session_file}[/green]")
-            found = True
-        else:
-            console.print(f"[yellow]⚠️ No {provider.capitalize()} session found at {session_file}[/yellow]")
+    styles = {"ok": ("green", "✅"), "expiring": ("yellow", "⏳"), "expired": ("red", "❌"), "invalid": ("red", "❌"), "missing": ("yellow", "⚠️")}
+    for status in get_session_registry().all_statuses(list(PROVIDER_CONFIG), sessions_dir):
+        color, icon = styles[status.state]
+        name = status.provider.capitalize() + (f" ({status.account})" if status.account else "")
+        if status.state == "missing":
+            console.print(f"[{color}]{icon} No {name} session found at {status.path}[/{color}]")
+            continue
+        found = True
+        verb = "expired" if status.state == "expired" else "expires"
+        expiry = f", login {verb} {time.strftime('%Y-%m-%d %H:%M', time.localtime(status.expires_at))}" if status.expires_at else ""
+        detail = f" – {status.reason}" if status.reason and status.state != "ok" else ""
+        console.print(f"[{color}]{icon} {name} session at {status.path}: {status.state}{expiry}{detail}[/{color}]")
     
     if not found:
         console.print("\n[bold yellow]⚠️ No sessions found. Run 'start' to set up new sessions.[/bold yellow]")